@@ -1,7 +1,11 @@
 from flask import Flask
 from routes.embeddings import embeddings_bp
 from routes.token_calculation import token_calculation_bp
+from routes.health import health_bp
 from qdrant.routes import qdrant_bp
+from utils.metrics import metrics_bp
+from utils.log import request_logging_bp
+from utils.authentication import rate_limit_bp
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -12,7 +16,11 @@ app = Flask(__name__)
 # Register blueprint
 app.register_blueprint(embeddings_bp)
 app.register_blueprint(token_calculation_bp)
+app.register_blueprint(health_bp)
 app.register_blueprint(qdrant_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(request_logging_bp)
+app.register_blueprint(rate_limit_bp)
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,3 @@
+"""
+Offline benchmark and load-test suite. See benchmarks/run.py.
+"""
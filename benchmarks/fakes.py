@@ -0,0 +1,326 @@
+"""
+Offline stand-ins for the embedding model, the RunPod endpoint and Qdrant.
+
+`install()` must run before `app` is imported: it points the service at fake
+models, patches `fastembed.TextEmbedding` and swaps the Qdrant client.
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+FAKE_MODELS = ["fake/minilm-384", "fake/base-768"]
+FAKE_DIMENSIONS = {"fake/minilm-384": 384, "fake/base-768": 768}
+HIDDEN_SIZE = 64
+MAX_LENGTH = 512
+
+# Set by install() when tiktoken encodings could not be loaded (no network)
+TIKTOKEN_FAKED = False
+
+
+def _build_tokenizer():
+    tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, "[PAD]": 1}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.enable_truncation(max_length=MAX_LENGTH)
+    tokenizer.enable_padding(pad_id=1, pad_token="[PAD]")
+    return tokenizer
+
+
+def fake_vector(text, dim):
+    """
+    Deterministic unit vector for a text, so results can be checked across runs.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeTextEmbedding:
+    """
+    Mimics fastembed.TextEmbedding. The CPU cost of a batch grows with
+    batch size x longest text, like a padded transformer forward pass.
+    """
+
+    def __init__(self, model_name, cache_dir=None, threads=None, **kwargs):
+        self.model_name = model_name
+        self.dim = FAKE_DIMENSIONS.get(model_name, 384)
+        self.threads = threads
+        self.model = SimpleNamespace(tokenizer=_build_tokenizer(), _model_dir=None)
+        rng = np.random.default_rng(0)
+        self._projection = rng.standard_normal((HIDDEN_SIZE, self.dim)).astype(np.float32)
+
+    @staticmethod
+    def list_supported_models():
+        return [{"model": name, "dim": dim, "model_file": "model.onnx"} for name, dim in FAKE_DIMENSIONS.items()]
+
+    def embed(self, documents, batch_size=256, parallel=None, **kwargs):
+        if isinstance(documents, str):
+            documents = [documents]
+        documents = list(documents)
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            encodings = self.model.tokenizer.encode_batch(batch)
+            padded_length = len(encodings[0].ids) if encodings else 0
+            # Simulated forward pass over the padded batch
+            hidden = np.ones((len(batch), max(1, padded_length), HIDDEN_SIZE), dtype=np.float32)
+            _ = hidden @ self._projection
+            for text in batch:
+                yield fake_vector(text, self.dim)
+
+
+class FakeEncoding:
+    """
+    Whitespace stand-in for a tiktoken encoding, used when encodings cannot be downloaded.
+    """
+
+    name = "fake"
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def encode_batch(self, texts, num_threads=8, **kwargs):
+        return [text.split() for text in texts]
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        return [text.split() for text in texts]
+
+
+# === Qdrant ===
+def _not_found(collection_name):
+    from qdrant_client.http.exceptions import UnexpectedResponse
+    content = json.dumps({"status": {"error": f"Collection `{collection_name}` doesn't exist!"}}).encode()
+    return UnexpectedResponse(404, "Not Found", content, httpx.Headers())
+
+
+def _matches(payload, query_filter):
+    if query_filter is None:
+        return True
+    for condition in query_filter.must or []:
+        value = payload.get(condition.key)
+        if condition.match is not None and value != condition.match.value:
+            return False
+        if condition.range is not None:
+            bounds = condition.range
+            if value is None:
+                return False
+            if bounds.gte is not None and not value >= bounds.gte:
+                return False
+            if bounds.lte is not None and not value <= bounds.lte:
+                return False
+            if bounds.gt is not None and not value > bounds.gt:
+                return False
+            if bounds.lt is not None and not value < bounds.lt:
+                return False
+    return True
+
+
+class FakeQdrantClient:
+    """
+    In-process brute-force stand-in for the subset of QdrantClient the service uses.
+    """
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+        self.uploads = []  # arguments of upload_points calls
+
+    def get_collections(self):
+        return SimpleNamespace(collections=[SimpleNamespace(name=name) for name in self._collections])
+
+    def get_collection(self, collection_name):
+        from qdrant_client.http.models import VectorParams, Distance
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise _not_found(collection_name)
+        vectors = VectorParams(size=collection["size"], distance=Distance.COSINE)
+        info = {"points_count": len(collection["points"]), "config": {"params": {"vectors": vectors.model_dump()}}}
+        return SimpleNamespace(config=SimpleNamespace(params=SimpleNamespace(vectors=vectors)), dict=lambda: info)
+
+    def create_collection(self, collection_name, vectors_config, **kwargs):
+        with self._lock:
+            self._collections[collection_name] = {"size": vectors_config.size, "points": {}}
+        return True
+
+    def delete_collection(self, collection_name):
+        with self._lock:
+            self._collections.pop(collection_name, None)
+        return True
+
+    def upsert(self, collection_name, points, wait=True, **kwargs):
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise _not_found(collection_name)
+        if hasattr(points, "ids"):
+            records = zip(points.ids, points.vectors, points.payloads or [{}] * len(points.ids))
+        else:
+            records = (
+                (point["id"], point["vector"], point.get("payload") or {}) if isinstance(point, dict)
+                else (point.id, point.vector, point.payload or {})
+                for point in points
+            )
+        with self._lock:
+            for point_id, vector, payload in records:
+                vector = np.asarray(vector, dtype=np.float32)
+                collection["points"][str(point_id)] = (vector / (np.linalg.norm(vector) or 1.0), payload)
+        return SimpleNamespace(status="completed")
+
+    def upload_points(self, collection_name, points, batch_size=64, parallel=1, wait=False, **kwargs):
+        self.uploads.append({"batch_size": batch_size, "parallel": parallel, "wait": wait})
+        points = list(points)
+        for start in range(0, len(points), batch_size):
+            self.upsert(collection_name, points[start:start + batch_size], wait=wait)
+
+    def delete(self, collection_name, points_selector, **kwargs):
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise _not_found(collection_name)
+        with self._lock:
+            for point_id in points_selector.points:
+                collection["points"].pop(str(point_id), None)
+
+    def query_points(self, collection_name, query, limit=10, query_filter=None, with_payload=True,
+                     with_vectors=False, search_params=None, **kwargs):
+        from qdrant_client.http.models import ScoredPoint
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise _not_found(collection_name)
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            candidates = [
+                (point_id, vector, payload)
+                for point_id, (vector, payload) in collection["points"].items()
+                if _matches(payload, query_filter)
+            ]
+        if not candidates:
+            return SimpleNamespace(points=[])
+        scores = np.stack([vector for _, vector, _ in candidates]) @ query
+        order = np.argsort(-scores)[:limit]
+        points = [
+            ScoredPoint(
+                id=candidates[i][0] if _is_uuid(candidates[i][0]) else int(candidates[i][0]),
+                version=0,
+                score=float(scores[i]),
+                payload=candidates[i][2] if with_payload else None,
+                vector=candidates[i][1].tolist() if with_vectors else None,
+            )
+            for i in order
+        ]
+        return SimpleNamespace(points=points)
+
+    def query_batch_points(self, collection_name, requests, **kwargs):
+        return [
+            self.query_points(
+                collection_name, request.query, request.limit, request.filter,
+                request.with_payload, request.with_vector, request.params,
+            )
+            for request in requests
+        ]
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+# === RunPod ===
+class FakeRunPodServer:
+    """
+    Local HTTP server speaking the RunPod `openai_route` payload format.
+    `latency` adds a fixed delay per request to mimic the network round trip.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        model = FakeTextEmbedding(FAKE_MODELS[0])
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                openai_input = body["input"]["openai_input"]
+                texts = openai_input["input"]
+                texts = texts if isinstance(texts, list) else [texts]
+                server.requests += 1
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                data = [
+                    {"object": "embedding", "embedding": vector.tolist(), "index": i}
+                    for i, vector in enumerate(model.embed(texts))
+                ]
+                output = json.dumps({"output": [{"data": data, "model": openai_input.get("model")}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(output)))
+                self.end_headers()
+                self.wfile.write(output)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/run"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def install(runpod_url=None, env=None):
+    """
+    Configure the environment and patch dependencies so `import app` runs offline.
+    Returns the FakeQdrantClient in use.
+    """
+    global TIKTOKEN_FAKED
+    settings = {
+        "AVAILABLE_MODELS": ",".join(FAKE_MODELS),
+        "DEFAULT_MODEL": FAKE_MODELS[0],
+        "MAX_CACHED_MODELS": str(len(FAKE_MODELS)),
+        "API_KEYS": "bench",
+        "QDRANT_ENABLE": "false",
+        "RUNPOD_ENABLE": "true" if runpod_url else "false",
+        "RUNPOD_URL": runpod_url or "",
+        "RUNPOD_API_KEY": "bench" if runpod_url else "",
+        "EMBEDDING_CACHE_ENABLE": "false",
+        "QUERY_CACHE_MAX_BYTES": "0",
+    }
+    settings.update(env or {})
+    os.environ.update(settings)
+
+    import fastembed
+    fastembed.TextEmbedding = FakeTextEmbedding
+
+    import tiktoken
+    try:
+        tiktoken.encoding_for_model("gpt-4")
+    except Exception:
+        tiktoken.encoding_for_model = lambda model: FakeEncoding()
+        TIKTOKEN_FAKED = True
+
+    import qdrant.client
+    import qdrant.utils
+    client = FakeQdrantClient()
+    qdrant.client.qdrant_client = client
+    qdrant.utils.qdrant_client = client
+    return client
@@ -0,0 +1,113 @@
+"""
+Load generator driving the Flask app in-process at fixed concurrency levels.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.micro import make_texts
+from benchmarks.results import result
+
+CONCURRENCY_LEVELS = (1, 4, 16)
+AUTH_HEADERS = {"Authorization": "Bearer bench"}
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def run_load(app, make_request, concurrency, requests_per_worker):
+    """
+    Fire `concurrency * requests_per_worker` requests from `concurrency` threads.
+    `make_request(client, i)` performs one request and returns the response.
+    Returns (throughput of successful requests in req/s, their latencies in seconds,
+    rejected (429) count, error count). Rejections are fast and would otherwise
+    inflate throughput and flatter the latency percentiles.
+    """
+    local = threading.local()
+    latencies, rejected, errors = [], 0, 0
+    lock = threading.Lock()
+
+    def worker(i):
+        nonlocal rejected, errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.perf_counter()
+        response = make_request(client, i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            if response.status_code == 429:
+                rejected += 1
+            elif response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+
+    total = concurrency * requests_per_worker
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(total)))
+    wall = time.perf_counter() - started
+    return len(latencies) / wall, latencies, rejected, errors
+
+
+def _report(name, concurrency, throughput, latencies, rejected, errors):
+    prefix = f"load.{name}.c{concurrency}"
+    return [
+        result(f"{prefix}.throughput", throughput, "req/s", "higher"),
+        result(f"{prefix}.p50", percentile(latencies, 50) * 1000, "ms", "lower"),
+        result(f"{prefix}.p95", percentile(latencies, 95) * 1000, "ms", "lower"),
+        result(f"{prefix}.p99", percentile(latencies, 99) * 1000, "ms", "lower"),
+        result(f"{prefix}.rejected", rejected, "count", "lower"),
+        result(f"{prefix}.errors", errors, "count", "lower"),
+    ]
+
+
+def bench_embeddings(app, model_name, levels=CONCURRENCY_LEVELS, requests_per_worker=20, texts_per_request=8):
+    texts = make_texts(texts_per_request * 64, 32)
+
+    def make_request(client, i):
+        offset = (i * texts_per_request) % len(texts)
+        return client.post("/v1/embeddings", headers=AUTH_HEADERS, json={
+            "input": texts[offset:offset + texts_per_request],
+            "model": model_name,
+        })
+
+    results = []
+    for concurrency in levels:
+        results += _report("embeddings", concurrency, *run_load(app, make_request, concurrency, requests_per_worker))
+    return results
+
+
+def bench_vectors(app, dim, levels=CONCURRENCY_LEVELS, requests_per_worker=20, collection="bench"):
+    """
+    Upsert and search against the (fake) Qdrant client through /vector/upsert and /vector/search.
+    """
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((512, dim)).astype(np.float32).tolist()
+
+    def upsert(client, i):
+        return client.post("/vector/upsert", headers=AUTH_HEADERS, json={
+            "collection_name": collection,
+            "vector": vectors[i % len(vectors)],
+            "payload": {"i": i},
+            "point_id": str(uuid.uuid4()),
+        })
+
+    def search(client, i):
+        return client.post("/vector/search", headers=AUTH_HEADERS, json={
+            "collection_name": collection,
+            "vector": vectors[(i * 7) % len(vectors)],
+            "top_k": 10,
+        })
+
+    results = []
+    for concurrency in levels:
+        results += _report("vector_upsert", concurrency, *run_load(app, upsert, concurrency, requests_per_worker))
+    for concurrency in levels:
+        results += _report("vector_search", concurrency, *run_load(app, search, concurrency, requests_per_worker))
+    return results
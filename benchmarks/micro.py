@@ -0,0 +1,93 @@
+"""
+Microbenchmarks for the pieces of the embeddings path that run in-process.
+Every function returns a list of result entries (see benchmarks.results.result).
+"""
+import json
+import time
+
+import numpy as np
+
+from benchmarks.results import result
+
+TEXT_WORDS = (8, 64, 256)
+BATCH_SIZES = (1, 16, 64, 256)
+
+
+def make_texts(count, words, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return [" ".join(rng.choice(vocabulary, words)) for _ in range(count)]
+
+
+def best_of(func, repeat):
+    """
+    Run `func` `repeat` times and return the fastest wall time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench_model_embed(model, repeat=3, total_texts=256):
+    """
+    Texts per second of model.embed for each batch size and text length.
+    """
+    results = []
+    for words in TEXT_WORDS:
+        texts = make_texts(total_texts, words)
+        for batch_size in BATCH_SIZES:
+            seconds = best_of(lambda: list(model.embed(texts, batch_size=batch_size)), repeat)
+            results.append(result(
+                f"embed.words{words}.batch{batch_size}", total_texts / seconds, "texts/s", "higher"
+            ))
+    return results
+
+
+def bench_serialization(app, dim=384, count=256, repeat=5):
+    """
+    Time to serialize `count` embeddings in each response format.
+    """
+    from flask import jsonify
+    from utils.encoding import to_matrix, encode_base64_rows, encode_npy
+
+    rng = np.random.default_rng(0)
+    embeddings = list(rng.standard_normal((count, dim)).astype(np.float32))
+
+    def as_json():
+        with app.app_context():
+            jsonify({"data": [{"embedding": e.tolist(), "index": i} for i, e in enumerate(embeddings)]}).get_data()
+
+    def as_base64():
+        rows = encode_base64_rows(to_matrix(embeddings))
+        json.dumps({"data": [{"embedding": row, "index": i} for i, row in enumerate(rows)]})
+
+    def as_npy():
+        encode_npy(to_matrix(embeddings))
+
+    def as_int8():
+        encode_npy(to_matrix(embeddings, "int8"))
+
+    return [
+        result(f"serialize.{name}.n{count}", best_of(func, repeat) * 1000, "ms", "lower")
+        for name, func in (("json", as_json), ("base64", as_base64), ("npy", as_npy), ("npy_int8", as_int8))
+    ]
+
+
+def bench_token_count(repeat=5, count=256):
+    """
+    Time to count tokens one text at a time versus in a single batch.
+    """
+    from utils.utils import calculate_token_count, calculate_token_counts
+
+    texts = make_texts(count, 64)
+    results = []
+    for model in ("gpt-4", "fake/minilm-384"):
+        label = model.replace("/", "_")
+        single = best_of(lambda: [calculate_token_count(text, model) for text in texts], repeat)
+        batched = best_of(lambda: calculate_token_counts(texts, model), repeat)
+        results.append(result(f"token_count.{label}.single.n{count}", single * 1000, "ms", "lower"))
+        results.append(result(f"token_count.{label}.batch.n{count}", batched * 1000, "ms", "lower"))
+    return results
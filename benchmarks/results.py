@@ -0,0 +1,61 @@
+"""
+Result entries, the results file format and baseline comparison.
+"""
+import json
+import platform
+import time
+
+
+def result(name, value, unit, better):
+    """
+    One measurement. `better` is "higher" or "lower" and decides which direction is a regression.
+    """
+    return {"name": name, "value": round(float(value), 4), "unit": unit, "better": better}
+
+
+def write_results(path, results, metadata=None):
+    document = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "metadata": metadata or {},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compare results against a baseline. Returns a list of regressions, each a dict with
+    name, baseline, value and change (relative, positive means worse).
+    Results missing from either side are ignored.
+    """
+    baseline_by_name = {entry["name"]: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        reference = baseline_by_name.get(entry["name"])
+        if reference is None:
+            continue
+        if not reference["value"]:
+            # e.g. an error count that used to be zero
+            change = float("inf") if entry["better"] == "lower" and entry["value"] > 0 else 0.0
+        else:
+            change = (entry["value"] - reference["value"]) / reference["value"]
+        if entry["better"] == "higher":
+            change = -change
+        if change > tolerance:
+            regressions.append({
+                "name": entry["name"],
+                "baseline": reference["value"],
+                "value": entry["value"],
+                "unit": entry["unit"],
+                "change": round(change, 4),
+            })
+    return regressions
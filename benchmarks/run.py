@@ -0,0 +1,100 @@
+"""
+Run the benchmark suite offline and compare against a saved baseline.
+
+    python -m benchmarks.run --output benchmarks/results/latest.json
+    python -m benchmarks.run --save-baseline benchmarks/results/baseline.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json --tolerance 0.2
+
+Exits with status 1 when any result is worse than the baseline by more than the tolerance.
+"""
+import argparse
+import os
+import sys
+
+from benchmarks import fakes
+from benchmarks.load import CONCURRENCY_LEVELS
+from benchmarks.results import compare, read_results, write_results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark and load-test suite")
+    parser.add_argument("--output", default="benchmarks/results/latest.json", help="Where to write results")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before a result counts as a regression")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+    parser.add_argument("--suite", choices=["all", "micro", "load"], default="all")
+    parser.add_argument("--quick", action="store_true", help="Fewer repetitions, for smoke runs")
+    parser.add_argument("--runpod", action="store_true",
+                        help="Start a fake RunPod endpoint and split large requests to it")
+    parser.add_argument("--runpod-latency", type=float, default=0.01,
+                        help="Simulated RunPod round trip in seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    runpod = None
+    # Every load-test thread may wait for inference, so none of them is rejected with 429
+    env = {"INFERENCE_QUEUE_DEPTH": str(max(CONCURRENCY_LEVELS))}
+    if args.runpod:
+        runpod = fakes.FakeRunPodServer(latency=args.runpod_latency).start()
+        env["MAX_TEXTS_FOR_LOCAL_PROCESSING"] = "4"
+    fakes.install(runpod_url=runpod.url if runpod else None, env=env)
+
+    from app import app
+    from routes.embeddings import DEFAULT_MODEL, get_or_load_model
+    from benchmarks import load, micro
+
+    repeat = 1 if args.quick else 3
+    per_worker = 5 if args.quick else 20
+    model = get_or_load_model(DEFAULT_MODEL)
+
+    results = []
+    try:
+        if args.suite in ("all", "micro"):
+            results += micro.bench_model_embed(model, repeat=repeat)
+            results += micro.bench_serialization(app, dim=model.dim, repeat=repeat)
+            results += micro.bench_token_count(repeat=repeat)
+        if args.suite in ("all", "load"):
+            results += load.bench_embeddings(app, DEFAULT_MODEL, requests_per_worker=per_worker)
+            results += load.bench_vectors(app, model.dim, requests_per_worker=per_worker)
+    finally:
+        if runpod:
+            runpod.stop()
+
+    metadata = {
+        "suite": args.suite,
+        "quick": args.quick,
+        "runpod": args.runpod,
+        "tiktoken_faked": fakes.TIKTOKEN_FAKED,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        write_results(path, results, metadata)
+
+    width = max(len(entry["name"]) for entry in results)
+    for entry in results:
+        print(f"{entry['name']:<{width}}  {entry['value']:>12.3f} {entry['unit']}")
+
+    if not args.baseline:
+        return 0
+
+    regressions = compare(results, read_results(args.baseline), args.tolerance)
+    if not regressions:
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 0
+
+    print(f"\n{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+    for entry in regressions:
+        print(
+            f"  {entry['name']}: {entry['baseline']} -> {entry['value']} {entry['unit']} "
+            f"({entry['change']:+.0%} worse)",
+            file=sys.stderr,
+        )
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
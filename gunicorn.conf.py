@@ -0,0 +1,123 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Gunicorn loads this file automatically from the working directory.
+# Metrics from every worker are written to PROMETHEUS_MULTIPROC_DIR and aggregated by /metrics.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+# Shared inference server processes started alongside the workers (see utils/inference_server.py)
+INFERENCE_SERVERS = []
+# Set on shutdown so the supervisor stops restarting servers
+_STOPPING = threading.Event()
+
+
+def on_starting(server):
+    # Start from a clean directory so counters from a previous run are not reported
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    # Rate limit counters are shared by the workers of this run only
+    rate_limit_file = os.getenv("RATE_LIMIT_FILE", "/tmp/fastembed-ratelimit.bin")
+    if os.path.exists(rate_limit_file):
+        os.remove(rate_limit_file)
+
+    if os.getenv("CALIBRATE_ON_STARTUP", "False").lower() == "true":
+        calibrate(server)
+
+    if os.getenv("INFERENCE_SERVER_ENABLE", "False").lower() == "true":
+        start_inference_servers(server)
+
+
+def calibrate(server):
+    from utils.calibration import load_profile
+
+    model_path = os.getenv("MODEL_PATH", "./models")
+    profile_path = os.getenv("CALIBRATION_PROFILE") or os.path.join(model_path, "calibration.json")
+    models = [name for name in os.getenv("AVAILABLE_MODELS", "").split(",") if name]
+    if all(name in load_profile(profile_path) for name in models):
+        return
+    # In a separate process, so the master does not keep the models and ONNX threads around
+    server.log.info("Calibrating thread count and batch size for this host...")
+    subprocess.run([sys.executable, "-m", "utils.calibration", "--output", profile_path], check=False)
+
+
+def start_inference_servers(server):
+    from utils.inference_server import socket_paths
+
+    paths = socket_paths(
+        os.getenv("INFERENCE_SERVER_SOCKET", "/tmp/fastembed-inference.sock"),
+        int(os.getenv("INFERENCE_SERVER_PROCESSES", 1)),
+    )
+    for index, path in enumerate(paths):
+        INFERENCE_SERVERS.append(spawn_inference_server(index, path))
+    threading.Thread(
+        target=supervise_inference_servers, args=(server, paths), name="inference-supervisor", daemon=True
+    ).start()
+
+    # Workers start once every server has loaded the default model and opened its socket
+    deadline = time.monotonic() + float(os.getenv("INFERENCE_SERVER_START_TIMEOUT", 300))
+    while not all(os.path.exists(path) for path in paths):
+        if any(process.poll() is not None for process in INFERENCE_SERVERS):
+            raise RuntimeError("Inference server exited during startup")
+        if time.monotonic() > deadline:
+            server.log.warning("Inference server is not ready yet; starting workers anyway")
+            return
+        time.sleep(0.1)
+    server.log.info(f"Inference server ready on {', '.join(paths)}")
+
+
+def spawn_inference_server(index, path):
+    if os.path.exists(path):
+        os.unlink(path)  # left behind by a server that crashed
+    return subprocess.Popen([sys.executable, "-m", "utils.inference_server", "--index", str(index)])
+
+
+def supervise_inference_servers(server, paths):
+    """
+    Restart inference servers that exit, with exponential backoff. Runs in a master thread;
+    workers see the server as unready (/readyz) until its socket is back.
+    """
+    started = [time.monotonic()] * len(paths)
+    failures = [0] * len(paths)
+    while not _STOPPING.wait(1):
+        for index, process in enumerate(INFERENCE_SERVERS):
+            code = process.poll()
+            if code is None:
+                continue
+            # A server that ran for a while before exiting starts a fresh backoff
+            failures[index] = 0 if time.monotonic() - started[index] > 60 else failures[index] + 1
+            delay = min(60, 2 ** failures[index] - 1)
+            server.log.error(f"Inference server {index} exited with code {code}; restarting in {delay}s")
+            if _STOPPING.wait(delay):
+                return
+            INFERENCE_SERVERS[index] = spawn_inference_server(index, paths[index])
+            started[index] = time.monotonic()
+
+
+def on_exit(server):
+    _STOPPING.set()
+    for process in INFERENCE_SERVERS:
+        process.terminate()
+    for process in INFERENCE_SERVERS:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    from utils.rate_limit import release_process_slots
+
+    multiprocess.mark_process_dead(worker.pid)
+    # A worker killed mid-request (e.g. by the timeout) never released its API keys' concurrency slots
+    release_process_slots(os.getenv("RATE_LIMIT_FILE", "/tmp/fastembed-ratelimit.bin"), worker.pid)
@@ -1,22 +1,61 @@
 import logging
+import threading
+import time
 from qdrant_client import QdrantClient
-from .config import QDRANT_ENABLE, QDRANT_HOST, QDRANT_PORT, QDRANT_API_KEY, PREFER_GRPC
+from utils.log import setup_logging
+from .config import QDRANT_ENABLE, QDRANT_HOST, QDRANT_PORT, QDRANT_API_KEY, PREFER_GRPC, QDRANT_HEALTH_TTL
 
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 qdrant_client = None
+qdrant_url = None
+
+# Last connectivity check, shared by /readyz requests
+_HEALTH = {"ok": False, "checked": None, "error": None}
+_HEALTH_LOCK = threading.Lock()
+
+def check_qdrant(max_age: float = QDRANT_HEALTH_TTL) -> bool:
+    """
+    Whether Qdrant answered a recent `get_collections`. The check is repeated when the
+    last result is older than `max_age`; callers arriving during a check reuse the last result.
+    """
+    if qdrant_client is None:
+        return False
+    checked = _HEALTH["checked"]
+    if checked is not None and time.monotonic() - checked < max_age:
+        return _HEALTH["ok"]
+    if not _HEALTH_LOCK.acquire(blocking=False):
+        return _HEALTH["ok"]
+    try:
+        try:
+            qdrant_client.get_collections()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        if ok and not _HEALTH["ok"]:
+            logger.info(f"✅ Connected to Qdrant at {qdrant_url}")
+        elif not ok and (_HEALTH["ok"] or checked is None):
+            logger.error(f"❌ Failed to connect to Qdrant: {error}")
+        _HEALTH.update(ok=ok, checked=time.monotonic(), error=error)
+        return ok
+    finally:
+        _HEALTH_LOCK.release()
+
+def qdrant_health():
+    return dict(_HEALTH)
 
 if QDRANT_ENABLE:
+    qdrant_url = QDRANT_HOST if QDRANT_HOST.startswith("http") else f"http://{QDRANT_HOST}:{QDRANT_PORT}"
     try:
-        qdrant_url = QDRANT_HOST if QDRANT_HOST.startswith("http") else f"http://{QDRANT_HOST}:{QDRANT_PORT}"
+        # The client connects lazily; the first check runs in the background so imports do not block
         qdrant_client = QdrantClient(
             url=qdrant_url,
             api_key=QDRANT_API_KEY or None,
             prefer_grpc=PREFER_GRPC,
+            check_compatibility=False,  # the version check is a blocking request
         )
-        qdrant_client.get_collections()
-        logger.info(f"✅ Connected to Qdrant at {qdrant_url}")
+        threading.Thread(target=check_qdrant, name="qdrant-check", daemon=True).start()
     except Exception as e:
-        logger.error(f"❌ Failed to connect to Qdrant: {e}")
+        logger.error(f"❌ Failed to create Qdrant client: {e}")
         qdrant_client = None
@@ -9,3 +9,15 @@ QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)
 DEFAULT_COLLECTION = os.getenv("DEFAULT_COLLECTION", "qdrant_default")
 PREFER_GRPC = os.getenv("PREFER_GRPC", "False").lower() == "true"
+UPSERT_CHUNK_SIZE = int(os.getenv("UPSERT_CHUNK_SIZE", 256))
+UPSERT_PARALLEL = int(os.getenv("UPSERT_PARALLEL", 1))  # Upload processes per bulk upsert (see QdrantClient.upload_points)
+UPSERT_WAIT = os.getenv("UPSERT_WAIT", "True").lower() == "true"  # Report points as saved only once Qdrant applied them
+QDRANT_HEALTH_TTL = float(os.getenv("QDRANT_HEALTH_TTL", 5))  # Seconds a /readyz Qdrant check is reused
+
+# Embedded vector store (qdrant/local_store.py)
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "./data/vectors")
+# Collections served by the local store even when Qdrant is enabled (comma-separated)
+LOCAL_COLLECTIONS = {name.strip() for name in os.getenv("LOCAL_COLLECTIONS", "").split(",") if name.strip()}
+LOCAL_INDEX_THRESHOLD = int(os.getenv("LOCAL_INDEX_THRESHOLD", 20000))  # Points before an ANN index is built (0 = always exact)
+LOCAL_INDEX_PROBES = int(os.getenv("LOCAL_INDEX_PROBES", 8))  # Index lists scanned per search
+LOCAL_COMPACT_ROWS = int(os.getenv("LOCAL_COMPACT_ROWS", 1024))  # Pending writes before the delta log is compacted (0 = never)
@@ -0,0 +1,682 @@
+"""
+Embedded vector store for collections served in-process instead of by Qdrant.
+
+Each collection is a directory under LOCAL_STORE_PATH. Its points live in one
+generation directory: a contiguous vector matrix (float32, or int8 with a scale per
+row) opened with np.load(mmap_mode="r"), plus the point ids and payloads as JSON.
+Writes take an fcntl lock and append to the generation's delta log (delta.jsonl, with
+the vectors in delta.bin), so a write costs the size of the batch, not the collection.
+Readers apply new log records incrementally. Once the delta grows past
+LOCAL_COMPACT_ROWS (or a quarter of the base), a background thread writes a new
+generation and switches the CURRENT pointer atomically, so every Gunicorn worker reads
+the same data and searches never wait for a writer.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.dimensions import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+DISTANCES = ("Cosine", "Dot", "Euclid", "Manhattan")
+CONFIG_FILE = "collection.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "lock"
+DELTA_LOG = "delta.jsonl"
+DELTA_VECTORS = "delta.bin"
+MAX_CACHED_MASKS = 128
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _lookup(payload, key):
+    """
+    Values at a dotted payload path; lists are flattened like Qdrant does.
+    """
+    values = [payload]
+    for part in key.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                found.extend(item if isinstance(item, list) else [item])
+        values = found
+    return values
+
+
+def _equals(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a is b
+    return a == b
+
+
+def _in_range(value, bounds):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    for operator, bound in bounds.items():
+        if operator == "gte" and not value >= bound:
+            return False
+        if operator == "lte" and not value <= bound:
+            return False
+        if operator == "gt" and not value > bound:
+            return False
+        if operator == "lt" and not value < bound:
+            return False
+    return True
+
+
+def payload_matches(payload, dynamic_filter):
+    """
+    Apply the same `{"must": [{key: value | {"gte"|"lte"|"gt"|"lt": number}}]}` filter
+    that build_filter translates for Qdrant.
+    """
+    for condition in dynamic_filter.get("must", []):
+        if not isinstance(condition, dict):
+            continue
+        for key, expected in condition.items():
+            values = _lookup(payload or {}, key)
+            if isinstance(expected, dict):
+                if not any(_in_range(value, expected) for value in values):
+                    return False
+            elif not any(_equals(value, expected) for value in values):
+                return False
+    return True
+
+
+def top_k(scores, k):
+    """
+    Positions of the `k` highest scores, best first.
+    """
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class IvfIndex:
+    """
+    Inverted file index: rows are grouped by their nearest k-means centroid, and a
+    search only scores the rows in the lists closest to the query.
+    """
+
+    def __init__(self, vectors, lists, iterations=10, seed=0):
+        rng = np.random.default_rng(seed)
+        vectors = normalize_rows(vectors)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=lists)
+            centroids = np.where(counts[:, None] > 0, sums, centroids)
+            centroids = normalize_rows(centroids)
+        self.centroids = centroids
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(lists + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(lists)]
+
+    def candidates(self, query, probes):
+        nearest = np.argsort(-(self.centroids @ query))[:probes]
+        return np.sort(np.concatenate([self.lists[i] for i in nearest]))
+
+
+class _Segment:
+    """
+    Rows scored together: the base matrix of a generation, or the rows appended to its
+    delta log. Never modified after creation.
+    """
+
+    def __init__(self, ids, payloads, matrix, scales=None):
+        self.ids = ids
+        self.payloads = payloads
+        self.matrix = matrix
+        self.scales = scales  # per-row scales of an int8 matrix, or None
+        self.index = None
+        self.masks = {}  # filter JSON -> boolean row mask
+        self.lock = threading.Lock()
+
+    def vectors(self, rows=slice(None)):
+        matrix = self.matrix[rows]
+        if self.scales is None:
+            return np.asarray(matrix, dtype=np.float32)
+        return matrix.astype(np.float32) * self.scales[rows][:, None]
+
+
+class _View:
+    """
+    What one search sees: the base and delta segments of a generation, with masks of
+    their live rows (None when every row is live), up to `offset` bytes of the delta log.
+    """
+
+    def __init__(self, generation, offset, base, base_live, delta, delta_live):
+        self.generation = generation
+        self.offset = offset
+        self.base = base
+        self.base_live = base_live
+        self.delta = delta
+        self.delta_live = delta_live
+        live = [len(segment.ids) if mask is None else int(mask.sum()) for segment, mask in self.segments()]
+        self.count = sum(live)
+        # Delta rows plus deleted or overwritten base rows, which compaction reclaims
+        self.pending = len(delta.ids) + len(base.ids) - live[0]
+
+    def segments(self):
+        return ((self.base, self.base_live), (self.delta, self.delta_live))
+
+    def points(self):
+        """
+        (ids, payloads, float32 vectors) of the live rows.
+        """
+        ids, payloads, vectors = [], [], []
+        for segment, mask in self.segments():
+            rows = np.arange(len(segment.ids)) if mask is None else np.flatnonzero(mask)
+            ids.extend(segment.ids[row] for row in rows)
+            payloads.extend(segment.payloads[row] for row in rows)
+            vectors.append(segment.vectors(rows))
+        return ids, payloads, np.concatenate(vectors)
+
+
+class LocalCollection:
+    def __init__(self, path, config, index_threshold, index_probes, compact_rows=0):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = config["size"]
+        self.distance = config["distance"]
+        self.quantization = config.get("quantization")
+        self.index_threshold = index_threshold
+        self.index_probes = index_probes
+        self.compact_rows = compact_rows
+        self._stamp = None
+        self._view = None
+        self._compacting = False
+        self._lock = threading.Lock()
+
+    def _directory(self, generation):
+        return os.path.join(self.path, f"{generation:08d}")
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.path, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # === Reading ===
+    def _current(self):
+        try:
+            stat = os.stat(os.path.join(self.path, CURRENT_FILE))
+        except FileNotFoundError:
+            raise ValueError(f"Collection '{self.name}' not found")
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._stamp:
+                for attempt in range(3):
+                    try:
+                        self._load()
+                        break
+                    except FileNotFoundError:
+                        # A writer replaced the generation while it was being opened
+                        if attempt == 2:
+                            raise ValueError(f"Collection '{self.name}' not found")
+                self._stamp = stamp
+            self._catch_up()
+            if self._view is None:
+                count = self._delta_count
+                self._view = _View(
+                    self._generation, self._offset,
+                    self._base, self._base_live if len(self._base_positions) < len(self._base.ids) else None,
+                    _Segment(self._delta_ids[:count], self._delta_payloads[:count], self._delta_matrix[:count]),
+                    self._delta_live[:count].copy() if len(self._delta_positions) < count else None,
+                )
+            return self._view
+
+    def _load(self):
+        with open(os.path.join(self.path, CURRENT_FILE)) as f:
+            generation = int(f.read().strip())
+        directory = self._directory(generation)
+        with open(os.path.join(directory, "points.json")) as f:
+            points = json.load(f)
+        ids, payloads = points["ids"], points["payloads"]
+        dtype = np.int8 if self.quantization else np.float32
+        if ids:
+            matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+            scales = np.load(os.path.join(directory, "scales.npy")) if self.quantization else None
+        else:
+            # An empty matrix cannot be memory-mapped
+            matrix = np.zeros((0, self.size), dtype=dtype)
+            scales = np.zeros(0, dtype=np.float32) if self.quantization else None
+
+        self._generation = generation
+        self._base = _Segment(ids, payloads, matrix, scales)
+        self._base_positions = {point_id: row for row, point_id in enumerate(ids)}
+        self._base_live = np.ones(len(ids), dtype=bool)
+        self._offset = 0
+        self._delta_matrix = np.zeros((0, self.size), dtype=np.float32)
+        self._delta_live = np.zeros(0, dtype=bool)
+        self._delta_count = 0
+        self._delta_ids, self._delta_payloads = [], []
+        self._delta_positions = {}
+        self._view = None
+
+    def _read_vectors(self, directory, record):
+        count = len(record["ids"])
+        with open(os.path.join(directory, DELTA_VECTORS), "rb") as f:
+            f.seek(record["row"] * self.size * 4)
+            vectors = np.frombuffer(f.read(count * self.size * 4), dtype=np.float32)
+        return vectors.reshape(count, self.size)
+
+    def _catch_up(self):
+        """
+        Apply the records appended to the delta log since the last call.
+        """
+        directory = self._directory(self._generation)
+        try:
+            with open(os.path.join(directory, DELTA_LOG), "rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Only whole lines are committed; a trailing partial line is a write in progress
+            data = data[:data.rfind(b"\n") + 1]
+            records = [json.loads(line) for line in data.splitlines()]
+            vectors = [self._read_vectors(directory, r) if r["op"] == "upsert" else None for r in records]
+        except FileNotFoundError:
+            return  # the generation was replaced; the next call loads the new one
+        if not records:
+            return
+
+        base_killed = []
+        for record, rows in zip(records, vectors):
+            for point_id in record["ids"]:
+                row = self._base_positions.pop(point_id, None)
+                if row is not None:
+                    base_killed.append(row)
+                row = self._delta_positions.pop(point_id, None)
+                if row is not None:
+                    self._delta_live[row] = False
+            if rows is None:
+                continue
+            start = self._delta_count
+            if start + len(rows) > len(self._delta_matrix):
+                # Grow geometrically; views keep slices of the old buffers, which are never written again
+                capacity = max(64, 2 * len(self._delta_matrix), start + len(rows))
+                matrix = np.empty((capacity, self.size), dtype=np.float32)
+                matrix[:start] = self._delta_matrix[:start]
+                live = np.zeros(capacity, dtype=bool)
+                live[:start] = self._delta_live[:start]
+                self._delta_matrix, self._delta_live = matrix, live
+            self._delta_matrix[start:start + len(rows)] = rows
+            self._delta_live[start:start + len(rows)] = True
+            for offset, (point_id, payload) in enumerate(zip(record["ids"], record["payloads"])):
+                previous = self._delta_positions.get(point_id)
+                if previous is not None:
+                    self._delta_live[previous] = False  # repeated id in one batch: the last one wins
+                self._delta_positions[point_id] = start + offset
+                self._delta_ids.append(point_id)
+                self._delta_payloads.append(payload)
+            self._delta_count += len(rows)
+
+        if base_killed:
+            # Views share the base mask, so it is copied instead of changed in place
+            self._base_live = self._base_live.copy()
+            self._base_live[base_killed] = False
+        self._offset += len(data)
+        self._view = None
+
+    def count(self):
+        return self._current().count
+
+    # === Writing ===
+    def _append(self, directory, record, vectors=None):
+        """
+        Append a record (and its vectors) to a generation's delta log. The log line is
+        written last, so a record is only visible once its vectors are on disk.
+        Callers hold the collection's file lock.
+        """
+        if vectors is not None:
+            row_bytes = self.size * 4
+            with open(os.path.join(directory, DELTA_VECTORS), "ab") as f:
+                end = os.fstat(f.fileno()).st_size
+                record = dict(record, row=-(-end // row_bytes))  # skip a partial row left by a failed write
+                f.write(b"\0" * (record["row"] * row_bytes - end))
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(os.path.join(directory, DELTA_LOG), "ab") as f:
+            f.write((json.dumps(record) + "\n").encode())
+
+    def _write(self, record, vectors=None):
+        with self._locked():
+            view = self._current()
+            directory = self._directory(view.generation)
+            log_path = os.path.join(directory, DELTA_LOG)
+            if os.path.exists(log_path) and os.path.getsize(log_path) > view.offset:
+                # Drop a partial line left by a failed write
+                os.truncate(log_path, view.offset)
+            self._append(directory, record, vectors)
+            view = self._current()
+        if self.compact_rows and view.pending >= max(self.compact_rows, len(view.base.ids) // 4):
+            self._compact_in_background()
+
+    def _write_generation(self, directory, ids, payloads, vectors):
+        os.makedirs(directory, exist_ok=True)
+        if self.quantization:
+            scales = np.abs(vectors).max(axis=1) / 127 if len(vectors) else np.zeros(0, dtype=np.float32)
+            safe = np.where(scales > 0, scales, 1)
+            np.save(os.path.join(directory, "vectors.npy"), np.round(vectors / safe[:, None]).astype(np.int8))
+            np.save(os.path.join(directory, "scales.npy"), scales.astype(np.float32))
+        else:
+            np.save(os.path.join(directory, "vectors.npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(os.path.join(directory, "points.json"), "w") as f:
+            json.dump({"ids": ids, "payloads": payloads}, f)
+
+    def _publish(self, generation):
+        _write_atomic(os.path.join(self.path, CURRENT_FILE), f"{generation:08d}")
+
+        # Keep the previous generation for readers that are still opening it
+        for entry in os.listdir(self.path):
+            if entry.isdigit() and int(entry) < generation - 1:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def _prepare(self, vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[1] != self.size:
+            raise ValueError(f"Vector size must be {self.size} for collection '{self.name}'")
+        return normalize_rows(matrix) if self.distance == "Cosine" else matrix
+
+    def upsert(self, ids, vectors, payloads):
+        ids = [str(point_id) for point_id in ids]
+        vectors = self._prepare(vectors)
+        if len(vectors) != len(ids):
+            raise ValueError("ids and vectors must have the same length")
+        if ids:
+            self._write({"op": "upsert", "ids": ids, "payloads": list(payloads)}, vectors)
+
+    def delete(self, ids):
+        ids = [str(point_id) for point_id in ids]
+        if ids:
+            self._write({"op": "delete", "ids": ids})
+
+    # === Compaction ===
+    def _compact_in_background(self):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Compaction of local collection '{self.name}' failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        threading.Thread(target=run, name=f"compact-{self.name}", daemon=True).start()
+
+    def compact(self):
+        """
+        Fold the delta log into a new generation. The live rows are written without the
+        file lock; records appended meanwhile are copied to the new generation's log
+        before it is published, so writers only wait for that copy.
+        """
+        view = self._current()
+        if not view.pending:
+            return
+        tmp_path = os.path.join(self.path, f".tmp-{uuid.uuid4().hex}")
+        try:
+            self._write_generation(tmp_path, *view.points())
+            with self._locked():
+                latest = self._current()
+                if latest.generation != view.generation:
+                    return  # another worker compacted first
+                old_directory = self._directory(view.generation)
+                with open(os.path.join(old_directory, DELTA_LOG), "rb") as f:
+                    f.seek(view.offset)
+                    data = f.read(latest.offset - view.offset)
+                for line in data.splitlines():
+                    record = json.loads(line)
+                    vectors = self._read_vectors(old_directory, record) if record["op"] == "upsert" else None
+                    record.pop("row", None)
+                    self._append(tmp_path, record, vectors)
+                directory = self._directory(view.generation + 1)
+                shutil.rmtree(directory, ignore_errors=True)  # left over from a failed compaction
+                os.rename(tmp_path, directory)
+                self._publish(view.generation + 1)
+            logger.info(f"Compacted local collection '{self.name}' to {latest.count} points")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    # === Search ===
+    def _mask(self, segment, filters):
+        if not filters:
+            return None
+        key = json.dumps(filters, sort_keys=True)
+        with segment.lock:
+            mask = segment.masks.get(key)
+        if mask is None:
+            mask = np.fromiter((payload_matches(p, filters) for p in segment.payloads), dtype=bool,
+                               count=len(segment.payloads))
+            with segment.lock:
+                if len(segment.masks) >= MAX_CACHED_MASKS:
+                    segment.masks.clear()
+                segment.masks[key] = mask
+        return mask
+
+    def _index(self, segment):
+        if (not self.index_threshold or len(segment.ids) < self.index_threshold
+                or self.distance not in ("Cosine", "Dot")):
+            return None
+        with segment.lock:
+            if segment.index is None:
+                lists = max(1, int(np.sqrt(len(segment.ids))))
+                segment.index = IvfIndex(segment.vectors(), lists)
+                logger.info(f"Built {lists}-list index for local collection '{self.name}'")
+            return segment.index
+
+    def _similarity(self, segment, queries, rows=slice(None)):
+        """
+        Scores of every row (or `rows`) for each query, higher is better.
+        Distances are negated so Euclid and Manhattan sort like Cosine and Dot.
+        """
+        if self.distance in ("Cosine", "Dot"):
+            scores = queries @ np.asarray(segment.matrix[rows], dtype=np.float32).T
+            return scores if segment.scales is None else scores * segment.scales[rows]
+        vectors = segment.vectors(rows)
+        if self.distance == "Euclid":
+            squared = (vectors ** 2).sum(axis=1) + (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T
+            return -np.sqrt(np.maximum(squared, 0))
+        return -np.stack([np.abs(vectors - query).sum(axis=1) for query in queries])
+
+    def _search_segment(self, segment, live, indexed, vectors, i, query, full_scores):
+        """
+        (scores, rows) of the best live rows of one segment for query `i`, best first.
+        """
+        limit = int(query.get("top_k", 3))
+        mask = self._mask(segment, query.get("filters"))
+        if live is not None:
+            mask = live if mask is None else mask & live
+        index = None if query.get("exact") or not indexed else self._index(segment)
+
+        rows = None
+        if index is not None:
+            rows = index.candidates(vectors[i], self.index_probes)
+            if mask is not None:
+                rows = rows[mask[rows]]
+            if len(rows) < limit:
+                rows = None  # too few candidates; fall back to an exact scan
+        if rows is not None:
+            scores = self._similarity(segment, vectors[i:i + 1], rows)[0]
+        else:
+            if id(segment) not in full_scores:
+                full_scores[id(segment)] = self._similarity(segment, vectors)
+            scores = full_scores[id(segment)][i]
+            if mask is not None:
+                rows = np.flatnonzero(mask)
+                scores = scores[rows]
+
+        order = top_k(scores, limit)
+        return scores[order], (order if rows is None else rows[order])
+
+    def search(self, queries):
+        """
+        Run queries shaped like search_vectors_batch's ({"vector", "top_k", "filters",
+        "include_vector", "exact"}). Returns one result list per query.
+        """
+        if not queries:
+            return []
+        view = self._current()
+        vectors = self._prepare([query["vector"] for query in queries])
+        distance_score = self.distance in ("Euclid", "Manhattan")
+        full_scores = {}
+        results = []
+        for i, query in enumerate(queries):
+            found = []
+            for segment, live in view.segments():
+                if segment.ids:
+                    # Only the base is indexed; the delta stays small and is scanned exactly
+                    scores, rows = self._search_segment(
+                        segment, live, segment is view.base, vectors, i, query, full_scores
+                    )
+                    found.extend((score, segment, row) for score, row in zip(scores, rows))
+            found.sort(key=lambda item: -item[0])
+            include_vector = bool(query.get("include_vector", False))
+            results.append([{
+                "id": segment.ids[row],
+                "score": float(-score if distance_score else score),
+                "payload": segment.payloads[row],
+                **({"vector": segment.vectors([row])[0].tolist()} if include_vector else {}),
+            } for score, segment, row in found[:int(query.get("top_k", 3))]])
+        return results
+
+    def info(self):
+        count = self.count()
+        return {
+            "backend": "local",
+            "status": "green",
+            "points_count": count,
+            "vectors_count": count,
+            "config": {
+                "params": {"vectors": {"size": self.size, "distance": self.distance}},
+                "quantization_config": self.quantization,
+            },
+        }
+
+
+class LocalStore:
+    """
+    Directory of local collections. Instances are per process; all state is on disk.
+    """
+
+    def __init__(self, root, index_threshold=0, index_probes=8, compact_rows=1024):
+        self.root = root
+        self.index_threshold = index_threshold
+        self.index_probes = index_probes
+        self.compact_rows = compact_rows
+        self._collections = {}  # name -> (config file inode, LocalCollection)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        if not isinstance(name, str) or not _NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name '{name}' for the local backend")
+        return os.path.join(self.root, name)
+
+    def exists(self, name):
+        try:
+            return os.path.exists(os.path.join(self._path(name), CONFIG_FILE))
+        except ValueError:
+            return False
+
+    def get(self, name):
+        """
+        Return the LocalCollection, or raise ValueError if it does not exist.
+        """
+        path = self._path(name)
+        try:
+            inode = os.stat(os.path.join(path, CONFIG_FILE)).st_ino
+        except FileNotFoundError:
+            raise ValueError(f"Collection '{name}' not found")
+        with self._lock:
+            cached = self._collections.get(name)
+            if cached is not None and cached[0] == inode:
+                return cached[1]
+        with open(os.path.join(path, CONFIG_FILE)) as f:
+            config = json.load(f)
+        collection = LocalCollection(path, config, self.index_threshold, self.index_probes, self.compact_rows)
+        with self._lock:
+            self._collections[name] = (inode, collection)
+        return collection
+
+    def list(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if self.exists(name))
+
+    def create(self, name, size, distance="Cosine", quantization=None):
+        path = self._path(name)
+        distance = getattr(distance, "value", distance)
+        if distance not in DISTANCES:
+            raise ValueError(f"Invalid distance '{distance}'. Allowed: {list(DISTANCES)}")
+        if isinstance(size, bool) or not isinstance(size, int) or size < 1:
+            raise ValueError("vector_size must be a positive integer")
+        if quantization and quantization.get("type", "scalar") != "scalar":
+            raise ValueError("The local backend only supports scalar (int8) quantization")
+        if self.exists(name):
+            raise ValueError(f"Collection '{name}' already exists")
+
+        # Build the collection in a temporary directory and move it into place in one rename
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_path)
+        config = {"size": size, "distance": distance, "quantization": {"type": "scalar"} if quantization else None}
+        collection = LocalCollection(tmp_path, config, self.index_threshold, self.index_probes)
+        collection._write_generation(collection._directory(0), [], [], np.zeros((0, size), dtype=np.float32))
+        collection._publish(0)
+        with open(os.path.join(tmp_path, CONFIG_FILE), "w") as f:
+            json.dump(config, f)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise ValueError(f"Collection '{name}' already exists")
+        logger.info(f"📦 Created local collection '{name}'")
+
+    def ensure(self, name, size, distance="Cosine"):
+        if self.exists(name):
+            return
+        try:
+            self.create(name, size, distance)
+        except ValueError:
+            # Another worker may have created it in the meantime
+            if not self.exists(name):
+                raise
+
+    def delete(self, name):
+        path = self._path(name)
+        if not self.exists(name):
+            raise ValueError(f"Collection '{name}' not found")
+        # Readers that already mapped the vectors keep them until they reload
+        tombstone = os.path.join(self.root, f".deleted-{uuid.uuid4().hex}")
+        os.rename(path, tombstone)
+        shutil.rmtree(tombstone, ignore_errors=True)
+        with self._lock:
+            self._collections.pop(name, None)
+        logger.info(f"🗑️ Deleted local collection '{name}'")
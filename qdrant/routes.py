@@ -1,9 +1,17 @@
 from flask import Blueprint, request, jsonify
 from .utils import (
-    create_collection, get_all_collections, get_collection_info, delete_collection
+    create_collection, get_all_collections, get_collection_info, delete_collection,
+    build_search_params
 )
-from utils.authentication import authenticate
-from .config import DEFAULT_COLLECTION
+from qdrant_client.http.models import Distance
+from utils.authentication import authenticate, charge_texts
+from .config import DEFAULT_COLLECTION, UPSERT_CHUNK_SIZE, UPSERT_PARALLEL, UPSERT_WAIT
+from routes.embeddings import (
+    embed_query, embed_queries, embed_texts, get_or_load_model, DEFAULT_MODEL,
+    ADMISSION, admission_cost, request_deadline, request_priority, admission_error_response,
+    DIMENSIONS, reduce_dimensions
+)
+from utils.admission import AdmissionError, PRIORITY_BULK
 
 
 # You can change this name
@@ -18,7 +26,20 @@ def create_collection_route():
         size = data.get("vector_size")
         if not name or not size:
             return jsonify({"success": False, "message": "collection_name and vector_size are required"}), 400
-        create_collection(name, size)
+        try:
+            create_collection(
+                name,
+                int(size),
+                distance=Distance(data.get("distance", Distance.COSINE.value)),
+                hnsw=data.get("hnsw"),
+                quantization=data.get("quantization"),
+                on_disk=bool(data.get("on_disk", False)),
+                on_disk_payload=data.get("on_disk_payload"),
+                optimizers=data.get("optimizers"),
+                backend=data.get("backend"),
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
         return jsonify({"success": True, "message": f"Collection '{name}' created."})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -55,7 +76,7 @@ def delete_collection_route():
         return jsonify({"success": False, "message": str(e)}), 500
 
 from .utils import (
-    save_vector, search_vector, delete_vector_by_id
+    save_vector, save_vectors, search_vector, search_vectors_batch, delete_vector_by_id
 )
 
 @qdrant_bp.route("/vector/upsert", methods=["POST"])
@@ -76,6 +97,87 @@ def upsert_vector_route():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@qdrant_bp.route("/vector/upsert_batch", methods=["POST"])
+@authenticate
+def upsert_batch_route():
+    try:
+        data = request.json
+        items = data.get("items")
+        collection_name = data.get("collection_name", DEFAULT_COLLECTION)
+        model_name = data.get("model", DEFAULT_MODEL)
+        chunk_size = int(data.get("chunk_size", UPSERT_CHUNK_SIZE))
+        parallel = int(data.get("parallel", UPSERT_PARALLEL))
+        wait = bool(data.get("wait", UPSERT_WAIT))
+
+        if not items or not isinstance(items, list):
+            return jsonify({"success": False, "message": "items must be a non-empty list"}), 400
+        if chunk_size < 1 or parallel < 1:
+            return jsonify({"success": False, "message": "chunk_size and parallel must be positive"}), 400
+        try:
+            dimensions = DIMENSIONS.check(model_name, data.get("dimensions"))
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+        points = [None] * len(items)
+        failures = []
+        to_embed = []  # (index, text)
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                failures.append({"index": index, "id": None, "error": "Item must be an object"})
+                continue
+            point = {"id": item.get("id"), "vector": item.get("vector"), "payload": item.get("payload") or {}}
+            text = item.get("text")
+            if not point["vector"]:
+                if not isinstance(text, str) or not text:
+                    failures.append({"index": index, "id": point["id"], "error": "Either vector or text is required"})
+                    continue
+                to_embed.append((index, text))
+            points[index] = point
+
+        # Embed texts in chunks
+        if to_embed:
+            try:
+                model = get_or_load_model(model_name)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            for start in range(0, len(to_embed), chunk_size):
+                chunk = to_embed[start:start + chunk_size]
+                try:
+                    deadline = request_deadline()
+                    charge_texts(len(chunk), deadline)
+                    with ADMISSION.slot(PRIORITY_BULK, deadline, cost=admission_cost(len(chunk))):
+                        embeddings = embed_texts(model_name, model, [text for _, text in chunk], deadline)
+                    embeddings = reduce_dimensions(model_name, embeddings, dimensions)
+                except AdmissionError as e:
+                    return admission_error_response(e, body_key="message")
+                except Exception as e:
+                    for index, _ in chunk:
+                        failures.append({"index": index, "id": points[index]["id"], "error": f"Embedding failed: {str(e)}"})
+                        points[index] = None
+                    continue
+                for (index, _), embedding in zip(chunk, embeddings):
+                    points[index]["vector"] = embedding.tolist()
+
+        # Upsert, mapping failures back to the original item index
+        positions = [index for index, point in enumerate(points) if point is not None]
+        saved, upsert_failures = save_vectors(
+            [points[index] for index in positions], collection_name, chunk_size, parallel, wait
+        )
+        for failure in upsert_failures:
+            failure["index"] = positions[failure["index"]]
+        failures.extend(upsert_failures)
+        failures.sort(key=lambda failure: failure["index"])
+
+        return jsonify({
+            "success": not failures,
+            "collection_name": collection_name,
+            "saved": len(saved),
+            "point_ids": saved,
+            "failures": failures,
+        })
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @qdrant_bp.route("/vector/search", methods=["POST"])
 @authenticate
 def search_vector_route():
@@ -89,8 +191,98 @@ def search_vector_route():
 
         if not vector:
             return jsonify({"success": False, "message": "Vector is required"}), 400
+        try:
+            search_params = build_search_params(data.get("search_params"))
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+        results = search_vector(vector, collection_name, top_k, include_vector, filters, search_params)
+        return jsonify({"success": True, "results": results})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@qdrant_bp.route("/vector/search_text", methods=["POST"])
+@authenticate
+def search_text_route():
+    try:
+        data = request.json
+        query = data.get("query")
+        model_name = data.get("model", DEFAULT_MODEL)
+        top_k = int(data.get("top_k", 3))
+        collection_name = data.get("collection_name", DEFAULT_COLLECTION)
+        include_vector = data.get("include_vector", False)
+        filters = data.get("filters", None)
+
+        if not query or not isinstance(query, str):
+            return jsonify({"success": False, "message": "query is required and must be a string"}), 400
+
+        try:
+            search_params = build_search_params(data.get("search_params"))
+            dimensions = DIMENSIONS.check(model_name, data.get("dimensions"))
+            charge_texts(1)
+            with ADMISSION.slot(request_priority(1), request_deadline(), cost=admission_cost(1)):
+                vector = embed_query(model_name, query)
+            if dimensions is not None:
+                vector = reduce_dimensions(model_name, [vector], dimensions)[0]
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        except AdmissionError as e:
+            return admission_error_response(e, body_key="message")
+
+        results = search_vector(vector.tolist(), collection_name, top_k, include_vector, filters, search_params)
+        return jsonify({"success": True, "model": model_name, "results": results})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@qdrant_bp.route("/vector/search_batch", methods=["POST"])
+@authenticate
+def search_batch_route():
+    try:
+        data = request.json
+        queries = data.get("queries")
+        collection_name = data.get("collection_name", DEFAULT_COLLECTION)
+        model_name = data.get("model", DEFAULT_MODEL)
+        default_top_k = int(data.get("top_k", 3))
+
+        if not queries or not isinstance(queries, list):
+            return jsonify({"success": False, "message": "queries must be a non-empty list"}), 400
+
+        prepared = []
+        text_positions = []
+        for index, query in enumerate(queries):
+            if not isinstance(query, dict) or not (query.get("vector") or isinstance(query.get("text"), str)):
+                return jsonify({"success": False, "message": f"Query {index} needs a vector or text"}), 400
+            try:
+                search_params = build_search_params(query.get("search_params", data.get("search_params")))
+            except ValueError as e:
+                return jsonify({"success": False, "message": f"Query {index}: {str(e)}"}), 400
+            prepared.append({
+                "vector": query.get("vector"),
+                "top_k": int(query.get("top_k", default_top_k)),
+                "filters": query.get("filters"),
+                "include_vector": query.get("include_vector", False),
+                "search_params": search_params,
+            })
+            if not query.get("vector"):
+                text_positions.append(index)
+
+        # Embed all text queries together
+        if text_positions:
+            try:
+                dimensions = DIMENSIONS.check(model_name, data.get("dimensions"))
+                charge_texts(len(text_positions))
+                with ADMISSION.slot(request_priority(len(text_positions)), request_deadline(),
+                                    cost=admission_cost(len(text_positions))):
+                    vectors = embed_queries(model_name, [queries[index]["text"] for index in text_positions])
+                vectors = reduce_dimensions(model_name, vectors, dimensions)
+            except ValueError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+            except AdmissionError as e:
+                return admission_error_response(e, body_key="message")
+            for index, vector in zip(text_positions, vectors):
+                prepared[index]["vector"] = vector.tolist()
 
-        results = search_vector(vector, collection_name, top_k, include_vector, filters)
+        results = search_vectors_batch(prepared, collection_name)
         return jsonify({"success": True, "results": results})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -1,58 +1,242 @@
 import uuid
 import logging
-from typing import Union, List, Dict, Any, Optional
+import threading
+from typing import Union, List, Dict, Any, Optional, Tuple
 from qdrant_client.http.models import (
     Distance, VectorParams, FieldCondition, MatchValue,
-    Filter, SearchParams, PointIdsList
+    Filter, SearchParams, PointIdsList, PointStruct, QueryRequest,
+    HnswConfigDiff, OptimizersConfigDiff, ScalarQuantization, ScalarQuantizationConfig,
+    ScalarType, BinaryQuantization, BinaryQuantizationConfig, QuantizationSearchParams
 )
 from qdrant_client.http.exceptions import UnexpectedResponse
 
 from .client import qdrant_client
-from .config import DEFAULT_COLLECTION
+from .local_store import LocalStore
+from utils.metrics import observe_qdrant
+from .config import (
+    DEFAULT_COLLECTION, UPSERT_CHUNK_SIZE, UPSERT_PARALLEL, UPSERT_WAIT,
+    LOCAL_STORE_PATH, LOCAL_COLLECTIONS, LOCAL_INDEX_THRESHOLD, LOCAL_INDEX_PROBES, LOCAL_COMPACT_ROWS
+)
 
 logger = logging.getLogger(__name__)
 
+# Known collections and their vector size, so hot paths skip the get_collection round trip
+_COLLECTION_CACHE: Dict[str, Optional[int]] = {}
+_COLLECTION_CACHE_LOCK = threading.Lock()
+
+# Embedded store for collections served in-process (see qdrant/local_store.py)
+LOCAL_STORE = LocalStore(LOCAL_STORE_PATH, LOCAL_INDEX_THRESHOLD, LOCAL_INDEX_PROBES, LOCAL_COMPACT_ROWS)
+
+# === Backend Selection ===
+def is_local(collection_name: str) -> bool:
+    """
+    A collection is served by the local store when it exists there, is listed in
+    LOCAL_COLLECTIONS, or Qdrant is not available.
+    """
+    if collection_name in LOCAL_COLLECTIONS or LOCAL_STORE.exists(collection_name):
+        return True
+    return qdrant_client is None
+
 # === Collection Handling ===
-def ensure_collection(collection_name: str, vector_size: int, distance=Distance.COSINE):
+def _cache_collection(collection_name: str, vector_size: Optional[int]):
+    with _COLLECTION_CACHE_LOCK:
+        _COLLECTION_CACHE[collection_name] = vector_size
+
+def _forget_collection(collection_name: str):
+    with _COLLECTION_CACHE_LOCK:
+        _COLLECTION_CACHE.pop(collection_name, None)
+
+def get_collection_vector_size(collection_name: str) -> Optional[int]:
+    """Return the vector size of an existing collection (cached), or None if it does not exist."""
+    if is_local(collection_name):
+        return LOCAL_STORE.get(collection_name).size if LOCAL_STORE.exists(collection_name) else None
     if not qdrant_client:
         raise RuntimeError("Qdrant client not initialized.")
+    with _COLLECTION_CACHE_LOCK:
+        if collection_name in _COLLECTION_CACHE:
+            return _COLLECTION_CACHE[collection_name]
     try:
-        qdrant_client.get_collection(collection_name)
+        with observe_qdrant("get_collection"):
+            info = qdrant_client.get_collection(collection_name)
     except UnexpectedResponse:
+        return None
+    vectors = info.config.params.vectors
+    # Named vectors have no single size; cache existence only
+    vector_size = vectors.size if isinstance(vectors, VectorParams) else 0
+    _cache_collection(collection_name, vector_size)
+    return vector_size
+
+def ensure_collection(collection_name: str, vector_size: int, distance=Distance.COSINE):
+    if is_local(collection_name):
+        LOCAL_STORE.ensure(collection_name, vector_size, distance)
+        return
+    if not qdrant_client:
+        raise RuntimeError("Qdrant client not initialized.")
+    if get_collection_vector_size(collection_name) is None:
         logger.info(f"🔧 Creating collection '{collection_name}'...")
-        qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=vector_size, distance=distance),
-        )
+        try:
+            with observe_qdrant("create_collection"):
+                qdrant_client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(size=vector_size, distance=distance),
+                )
+        except UnexpectedResponse:
+            # Another worker may have created it in the meantime
+            _forget_collection(collection_name)
+            if get_collection_vector_size(collection_name) is None:
+                raise
+            return
+        _cache_collection(collection_name, vector_size)
+
+def _upsert_or_recreate(collection_name: str, vector_size: int, upsert):
+    """
+    Run `upsert()`. If the collection is gone (deleted by another worker or outside the
+    service), drop the cached entry, create the collection again and retry once.
+    """
+    try:
+        upsert()
+    except UnexpectedResponse as e:
+        if e.status_code != 404:
+            raise
+        logger.warning(f"Collection '{collection_name}' no longer exists; re-creating it")
+        _forget_collection(collection_name)
+        ensure_collection(collection_name, vector_size)
+        upsert()
 
 # === Save Vector ===
 def save_vector(vector: List[float], payload: Dict[str, Any],
                 collection_name: str = DEFAULT_COLLECTION,
                 point_id: Optional[str] = None) -> str:
-    if not qdrant_client:
+    if not is_local(collection_name) and not qdrant_client:
         raise RuntimeError("Qdrant client not initialized.")
     ensure_collection(collection_name, len(vector))
     point_id = point_id or str(uuid.uuid4())
-    qdrant_client.upsert(
-        collection_name=collection_name,
-        points=[{"id": point_id, "vector": vector, "payload": payload}]
-    )
+    if is_local(collection_name):
+        LOCAL_STORE.get(collection_name).upsert([point_id], [vector], [payload])
+        logger.info(f"✅ Saved vector ID {point_id} to local collection '{collection_name}'")
+        return point_id
+
+    def upsert():
+        with observe_qdrant("upsert"):
+            qdrant_client.upsert(
+                collection_name=collection_name,
+                points=[{"id": point_id, "vector": vector, "payload": payload}]
+            )
+
+    _upsert_or_recreate(collection_name, len(vector), upsert)
     logger.info(f"✅ Saved vector ID {point_id} to '{collection_name}'")
     return point_id
 
+# === Save Vectors (Bulk) ===
+def save_vectors(points: List[Dict[str, Any]],
+                 collection_name: str = DEFAULT_COLLECTION,
+                 chunk_size: int = UPSERT_CHUNK_SIZE,
+                 parallel: int = UPSERT_PARALLEL,
+                 wait: bool = UPSERT_WAIT) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Upsert many points ({"id", "vector", "payload"}) in chunks of `chunk_size`.
+    Qdrant collections go through QdrantClient.upload_points, which retries failed chunks
+    and, with `parallel` > 1, uploads from that many processes.
+    Local collections append each chunk to the collection's delta log, so a failed chunk
+    only fails its own points.
+    Returns (saved point ids, failures); each failure holds the item index and error.
+    """
+    local = is_local(collection_name)
+    if not local and not qdrant_client:
+        raise RuntimeError("Qdrant client not initialized.")
+
+    failures = []
+    valid = []
+    expected_size = None
+    for index, point in enumerate(points):
+        vector = point.get("vector")
+        if not vector:
+            failures.append({"index": index, "id": point.get("id"), "error": "Vector is required"})
+            continue
+        if expected_size is None:
+            ensure_collection(collection_name, len(vector))
+            expected_size = get_collection_vector_size(collection_name) or len(vector)
+        if len(vector) != expected_size:
+            failures.append({
+                "index": index,
+                "id": point.get("id"),
+                "error": f"Vector size {len(vector)} does not match collection size {expected_size}",
+            })
+            continue
+        valid.append((index, point.get("id") or str(uuid.uuid4()), vector, point.get("payload") or {}))
+    if not valid:
+        return [], failures
+
+    if local:
+        return _save_local_vectors(collection_name, valid, failures, max(1, chunk_size))
+
+    def upload():
+        with observe_qdrant("upsert_batch"):
+            qdrant_client.upload_points(
+                collection_name=collection_name,
+                points=[PointStruct(id=point_id, vector=vector, payload=payload) for _, point_id, vector, payload in valid],
+                batch_size=max(1, chunk_size),
+                parallel=max(1, parallel),
+                wait=wait,
+            )
+
+    try:
+        _upsert_or_recreate(collection_name, expected_size, upload)
+    except Exception as e:
+        # The upload stops at the first chunk that still fails after retries; upserts are
+        # idempotent, so the caller can resend all of these points
+        logger.error(f"❌ Failed to upsert {len(valid)} points to '{collection_name}': {e}")
+        failures.extend({"index": index, "id": point_id, "error": str(e)} for index, point_id, _, _ in valid)
+        failures.sort(key=lambda failure: failure["index"])
+        return [], failures
+
+    saved = [point_id for _, point_id, _, _ in valid]
+    logger.info(f"✅ Saved {len(saved)} vectors to '{collection_name}' ({len(failures)} failed)")
+    return saved, failures
+
+def _save_local_vectors(collection_name, valid, failures, chunk_size):
+    """
+    Append validated (index, id, vector, payload) points to a local collection, one chunk per write.
+    """
+    collection = LOCAL_STORE.get(collection_name)
+    saved = []
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            collection.upsert(
+                [point_id for _, point_id, _, _ in chunk],
+                [vector for _, _, vector, _ in chunk],
+                [payload for _, _, _, payload in chunk],
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to upsert {len(chunk)} points to local collection '{collection_name}': {e}")
+            failures.extend({"index": index, "id": point_id, "error": str(e)} for index, point_id, _, _ in chunk)
+            continue
+        saved.extend(point_id for _, point_id, _, _ in chunk)
+    failures.sort(key=lambda failure: failure["index"])
+    logger.info(f"✅ Saved {len(saved)} vectors to local collection '{collection_name}' ({len(failures)} failed)")
+    return saved, failures
+
 # === Delete Vector ===
 def delete_vector_by_id(point_ids: Union[str, List[str]], collection_name: str = DEFAULT_COLLECTION):
-    if not qdrant_client:
+    local = is_local(collection_name)
+    if not local and not qdrant_client:
         raise RuntimeError("Qdrant client not initialized.")
 
     # Normalize to list
     if isinstance(point_ids, str):
         point_ids = [point_ids]
 
-    qdrant_client.delete(
-        collection_name=collection_name,
-        points_selector=PointIdsList(points=point_ids)
-    )
+    if local:
+        LOCAL_STORE.get(collection_name).delete(point_ids)
+        logger.info(f"🗑️ Deleted vector(s) ID {point_ids} from local collection '{collection_name}'")
+        return
+
+    with observe_qdrant("delete"):
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=point_ids)
+        )
     logger.info(f"🗑️ Deleted vector(s) ID {point_ids} from '{collection_name}'")
 
 
@@ -91,6 +275,14 @@ def build_filter(dynamic_filter: Dict[str, Any]) -> Optional[Filter]:
 
 
 # === Search Vector ===
+def _format_results(points, include_vector: bool) -> List[Dict[str, Any]]:
+    return [{
+        "id": str(r.id),
+        "score": r.score,
+        "payload": r.payload,
+        **({"vector": r.vector} if include_vector else {})  # Include vector if requested
+    } for r in points]
+
 def search_vector(
     vector: List[float],
     collection_name: str = DEFAULT_COLLECTION,
@@ -99,6 +291,14 @@ def search_vector(
     filters: Optional[Dict[str, Any]] = None,
     search_params: Optional[SearchParams] = None
 ) -> List[Dict[str, Any]]:
+    if is_local(collection_name):
+        return LOCAL_STORE.get(collection_name).search([{
+            "vector": vector,
+            "top_k": top_k,
+            "filters": filters,
+            "include_vector": include_vector,
+            "exact": bool(search_params and search_params.exact),
+        }])[0]
     if not qdrant_client:
         raise RuntimeError("Qdrant client not initialized.")
 
@@ -106,40 +306,171 @@ def search_vector(
     filter_obj = build_filter(filters)
 
     # Perform the search query in Qdrant
-    results = qdrant_client.search(
-        collection_name=collection_name,
-        query_vector=vector,
-        limit=top_k,
-        query_filter=filter_obj,
-        with_payload=True,  # Ensure payload is included in the result
-        search_params=search_params
-    )
+    try:
+        with observe_qdrant("search"):
+            results = qdrant_client.query_points(
+                collection_name=collection_name,
+                query=vector,
+                limit=top_k,
+                query_filter=filter_obj,
+                with_payload=True,  # Ensure payload is included in the result
+                with_vectors=include_vector,
+                search_params=search_params
+            )
+    except UnexpectedResponse as e:
+        if e.status_code == 404:
+            _forget_collection(collection_name)
+        raise
 
     # Format and return the results
-    return [{
-        "id": str(r.id),
-        "score": r.score,
-        "payload": r.payload,
-        **({"vector": r.vector} if include_vector else {})  # Include vector if requested
-    } for r in results]
+    return _format_results(results.points, include_vector)
+
+# === Search Vector (Batch) ===
+def search_vectors_batch(
+    queries: List[Dict[str, Any]],
+    collection_name: str = DEFAULT_COLLECTION,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Run many searches in one Qdrant round trip. Each query is a dict with
+    "vector" and optional "top_k", "filters", "include_vector" and "search_params".
+    Results are returned in query order.
+    """
+    if not queries:
+        return []
+    if is_local(collection_name):
+        return LOCAL_STORE.get(collection_name).search([
+            {**query, "exact": bool(query.get("search_params") and query["search_params"].exact)}
+            for query in queries
+        ])
+    if not qdrant_client:
+        raise RuntimeError("Qdrant client not initialized.")
 
+    requests = [
+        QueryRequest(
+            query=query["vector"],
+            limit=int(query.get("top_k", 3)),
+            filter=build_filter(query.get("filters")),
+            params=query.get("search_params"),
+            with_payload=True,
+            with_vector=bool(query.get("include_vector", False)),
+        )
+        for query in queries
+    ]
+    try:
+        with observe_qdrant("search_batch"):
+            responses = qdrant_client.query_batch_points(collection_name=collection_name, requests=requests)
+    except UnexpectedResponse as e:
+        if e.status_code == 404:
+            _forget_collection(collection_name)
+        raise
 
+    return [
+        _format_results(response.points, bool(query.get("include_vector", False)))
+        for query, response in zip(queries, responses)
+    ]
+
+# === Index / Storage Settings ===
+HNSW_FIELDS = ("m", "ef_construct", "full_scan_threshold", "on_disk")
+OPTIMIZER_FIELDS = (
+    "indexing_threshold", "memmap_threshold", "default_segment_number",
+    "max_segment_size", "deleted_threshold", "vacuum_min_vector_number", "flush_interval_sec",
+)
+
+def _pick(options: Dict[str, Any], fields, section: str) -> Dict[str, Any]:
+    if not isinstance(options, dict):
+        raise ValueError(f"'{section}' must be an object")
+    unknown = set(options) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown '{section}' settings: {sorted(unknown)}. Allowed: {list(fields)}")
+    return {key: value for key, value in options.items() if value is not None}
+
+def build_quantization_config(options: Optional[Dict[str, Any]]):
+    """
+    Build a Qdrant quantization config from {"type": "scalar"|"binary", "always_ram": bool, "quantile": float}.
+    """
+    if not options:
+        return None
+    quantization_type = options.get("type", "scalar")
+    always_ram = options.get("always_ram")
+    if quantization_type == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=options.get("quantile"), always_ram=always_ram,
+        ))
+    if quantization_type == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+    raise ValueError(f"Invalid quantization type '{quantization_type}'. Allowed: ['scalar', 'binary']")
+
+def build_search_params(options: Optional[Dict[str, Any]]) -> Optional[SearchParams]:
+    """
+    Build per-query search params from {"hnsw_ef", "exact", "rescore", "oversampling", "ignore_quantization"}.
+    """
+    if not options:
+        return None
+    params = _pick(options, ("hnsw_ef", "exact", "rescore", "oversampling", "ignore_quantization"), "search_params")
+    quantization = None
+    if any(key in params for key in ("rescore", "oversampling", "ignore_quantization")):
+        quantization = QuantizationSearchParams(
+            rescore=params.get("rescore"),
+            oversampling=params.get("oversampling"),
+            ignore=params.get("ignore_quantization", False),
+        )
+    return SearchParams(hnsw_ef=params.get("hnsw_ef"), exact=params.get("exact", False), quantization=quantization)
 
 # === Collection Management ===
-def create_collection(collection_name: str, vector_size: int, distance=Distance.COSINE):
-    qdrant_client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=vector_size, distance=distance),
-    )
+def create_collection(collection_name: str, vector_size: int, distance=Distance.COSINE,
+                      hnsw: Optional[Dict[str, Any]] = None,
+                      quantization: Optional[Dict[str, Any]] = None,
+                      on_disk: bool = False,
+                      on_disk_payload: Optional[bool] = None,
+                      optimizers: Optional[Dict[str, Any]] = None,
+                      backend: Optional[str] = None):
+    """
+    Create a collection on `backend` ("qdrant" or "local"; default chosen by is_local).
+    The local backend supports `distance` and scalar `quantization`.
+    """
+    backend = backend or ("local" if is_local(collection_name) else "qdrant")
+    if backend not in ("qdrant", "local"):
+        raise ValueError(f"Invalid backend '{backend}'. Allowed: ['qdrant', 'local']")
+    if backend == "local":
+        if hnsw or optimizers or on_disk_payload is not None:
+            raise ValueError("hnsw, optimizers and on_disk_payload are not supported by the local backend")
+        LOCAL_STORE.create(collection_name, vector_size, distance, quantization)
+        return
+    if not qdrant_client:
+        raise RuntimeError("Qdrant client not initialized.")
+    hnsw_config = HnswConfigDiff(**_pick(hnsw, HNSW_FIELDS, "hnsw")) if hnsw else None
+    optimizers_config = OptimizersConfigDiff(**_pick(optimizers, OPTIMIZER_FIELDS, "optimizers")) if optimizers else None
+    with observe_qdrant("create_collection"):
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=vector_size, distance=distance, on_disk=on_disk or None),
+            hnsw_config=hnsw_config,
+            quantization_config=build_quantization_config(quantization),
+            on_disk_payload=on_disk_payload,
+            optimizers_config=optimizers_config,
+        )
+    _cache_collection(collection_name, vector_size)
     logger.info(f"📦 Created collection '{collection_name}'")
 
 def get_all_collections() -> List[str]:
-    collections = qdrant_client.get_collections()
-    return [c.name for c in collections.collections]
+    names = LOCAL_STORE.list()
+    if qdrant_client:
+        with observe_qdrant("get_collections"):
+            collections = qdrant_client.get_collections()
+        names += [c.name for c in collections.collections if c.name not in names]
+    return names
 
 def get_collection_info(collection_name: str) -> Dict[str, Any]:
-    return qdrant_client.get_collection(collection_name).dict()
+    if is_local(collection_name):
+        return LOCAL_STORE.get(collection_name).info()
+    with observe_qdrant("get_collection"):
+        return qdrant_client.get_collection(collection_name).dict()
 
 def delete_collection(collection_name: str):
-    qdrant_client.delete_collection(collection_name=collection_name)
+    if is_local(collection_name):
+        LOCAL_STORE.delete(collection_name)
+        return
+    with observe_qdrant("delete_collection"):
+        qdrant_client.delete_collection(collection_name=collection_name)
+    _forget_collection(collection_name)
     logger.info(f"🗑️ Deleted collection '{collection_name}'")
@@ -1,95 +1,508 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify, Response, stream_with_context
 from fastembed import TextEmbedding
-from utils.authentication import authenticate
-from utils.utils import calculate_token_count
+from utils.authentication import authenticate, charge_texts, record_tokens
+from utils.tokenization import TokenizerRegistry, get_model_tokenizer
+from utils.metrics import observe_stage, INFERENCE_BATCH_SIZE
+from utils.admission import AdmissionController, AdmissionError, PRIORITIES, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from utils.batching import MicroBatcher, embed_texts_batched
+from utils.model_pool import ModelPool
+from utils.runpod import RunPodClient, CircuitBreaker
+from utils.routing import SplitRouter
+from utils.embedding_cache import EmbeddingCache
+from utils.inference_server import InferenceClient, RemoteModel, socket_paths
+from utils.calibration import load_profile
+from utils.encoding import resolve_encoding, to_matrix, encode_base64_rows, encode_npy, encode_raw
+from utils.streaming import iter_ndjson, iter_json_array, iter_batches
+from utils.chunking import model_max_tokens, parse_chunking, split_texts, pool_embeddings
+from utils.dimensions import DimensionReducer
+from utils.model_manifest import validate_models, record_model, model_dimension, load_manifest
+from utils.warmup import ModelWarmup
+from utils.log import setup_logging
 import os
 import logging
+import threading
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
-)
+# Setup logging (queued JSON logging, see utils/log.py)
+setup_logging()
 
 # Konfigurasi Environment
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
 AVAILABLE_MODELS = os.getenv("AVAILABLE_MODELS", "").split(",")
 MODEL_PATH = os.getenv("MODEL_PATH", "./models")
 MAX_CACHED_MODELS = int(os.getenv("MAX_CACHED_MODELS", 1))  # Batas jumlah model di cache
+MODEL_POOL_MAX_BYTES = int(os.getenv("MODEL_POOL_MAX_BYTES", 0))  # Batas memori model di cache (0 = tanpa batas)
 TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 600))  # Default 10 menit
 RUNPOD_URL = os.getenv("RUNPOD_URL", "")
 RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY", "")
 RUNPOD_ENABLE = os.getenv("RUNPOD_ENABLE", "false").lower() == "true"
-MAX_TEXTS_FOR_LOCAL_PROCESSING = int(os.getenv("MAX_TEXTS_FOR_LOCAL_PROCESSING", 1))
+MAX_TEXTS_FOR_LOCAL_PROCESSING = int(os.getenv("MAX_TEXTS_FOR_LOCAL_PROCESSING", 1))  # Request lebih besar dibagi antara lokal dan RunPod
+RUNPOD_MAX_RETRIES = int(os.getenv("RUNPOD_MAX_RETRIES", 2))
+RUNPOD_POOL_SIZE = int(os.getenv("RUNPOD_POOL_SIZE", 8))  # Koneksi keep-alive ke RunPod
+RUNPOD_BREAKER_FAILURES = int(os.getenv("RUNPOD_BREAKER_FAILURES", 5))  # Gagal berturut-turut sebelum circuit breaker terbuka
+RUNPOD_BREAKER_RESET_SECONDS = float(os.getenv("RUNPOD_BREAKER_RESET_SECONDS", 30))
+LOCAL_SECONDS_PER_TEXT = float(os.getenv("LOCAL_SECONDS_PER_TEXT", 0.01))  # Estimasi awal biaya inferensi lokal
+RUNPOD_OVERHEAD_SECONDS = float(os.getenv("RUNPOD_OVERHEAD_SECONDS", 0.5))  # Estimasi awal latensi RunPod per request
+RUNPOD_SECONDS_PER_TEXT = float(os.getenv("RUNPOD_SECONDS_PER_TEXT", 0.002))  # Estimasi awal biaya RunPod per teks
+BATCHING_ENABLE = os.getenv("BATCHING_ENABLE", "true").lower() == "true"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 64))  # Maksimal teks per batch ONNX
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))  # Waktu tunggu maksimal untuk mengisi batch
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", 8192))  # Token (termasuk padding) per batch ONNX; teks dikelompokkan per panjang (0 = nonaktif)
+EMBEDDING_CACHE_ENABLE = os.getenv("EMBEDDING_CACHE_ENABLE", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024))  # Batas memori cache embedding
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "")  # Kosongkan untuk menonaktifkan cache di disk
+EMBEDDING_CACHE_DISK_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))  # Ukuran file cache di disk per model
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 256))  # Ukuran batch untuk endpoint streaming
+# Dengan micro-batching, admission dihitung per teks: INFERENCE_MAX_CONCURRENCY batch penuh (x BATCH_MAX_SIZE),
+# sehingga request kecil yang bersamaan masuk bersama ke batcher. Hanya thread Gunicorn yang bisa mengantri,
+# jadi INFERENCE_QUEUE_DEPTH praktis dibatasi GUNICORN_THREADS (default 8)
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", 2))  # Batch (atau request tanpa batching) inferensi bersamaan per worker
+INFERENCE_QUEUE_DEPTH = int(os.getenv("INFERENCE_QUEUE_DEPTH", 4))  # Request yang boleh menunggu; lebih dari ini ditolak 429
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", 30000))  # Deadline default per request
+INTERACTIVE_MAX_TEXTS = int(os.getenv("INTERACTIVE_MAX_TEXTS", 1))  # Request dengan teks sebanyak ini atau kurang diprioritaskan
+TOKEN_COUNT_THREADS = int(os.getenv("TOKEN_COUNT_THREADS", 8))  # Thread untuk menghitung token secara batch
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", 8 * 1024 * 1024))  # Cache khusus embedding query pencarian (0 = nonaktif)
+INFERENCE_SERVER_ENABLE = os.getenv("INFERENCE_SERVER_ENABLE", "False").lower() == "true"  # Model dipegang oleh satu proses inference server
+INFERENCE_SERVER_SOCKET = os.getenv("INFERENCE_SERVER_SOCKET", "/tmp/fastembed-inference.sock")
+INFERENCE_SERVER_PROCESSES = int(os.getenv("INFERENCE_SERVER_PROCESSES", 1))  # Jumlah proses inference server
+CALIBRATION_PROFILE = os.getenv("CALIBRATION_PROFILE") or os.path.join(MODEL_PATH, "calibration.json")  # Hasil kalibrasi thread/batch
+PROJECTIONS_DIR = os.getenv("PROJECTIONS_DIR") or os.path.join(MODEL_PATH, "projections")  # Matriks PCA untuk parameter dimensions
+MATRYOSHKA_MODELS = os.getenv("MATRYOSHKA_MODELS", "").split(",")  # Model yang boleh dipotong langsung (Matryoshka)
+MODEL_MANIFEST = os.getenv("MODEL_MANIFEST") or os.path.join(MODEL_PATH, "manifest.json")  # Daftar model yang sudah diunduh
+MODEL_WARMUP_ENABLE = os.getenv("MODEL_WARMUP_ENABLE", "true").lower() == "true"  # Muat dan panaskan model default di background
+
+# Klien inference server bersama; jika aktif, worker tidak memuat model ONNX sendiri
+INFERENCE_CLIENT = None
+if INFERENCE_SERVER_ENABLE:
+    INFERENCE_CLIENT = InferenceClient(
+        socket_paths(INFERENCE_SERVER_SOCKET, INFERENCE_SERVER_PROCESSES), timeout=TIMEOUT
+    )
+
+# Reduksi dimensi embedding (PCA atau Matryoshka); native_dimension didefinisikan di bawah
+DIMENSIONS = DimensionReducer(PROJECTIONS_DIR, MATRYOSHKA_MODELS, lambda name: native_dimension(name))
+
+# Pengaturan thread dan batch size per model hasil kalibrasi di mesin ini
+CALIBRATION = load_profile(CALIBRATION_PROFILE)
+
+# Micro-batcher per model
+BATCHERS = {}
+BATCHERS_LOCK = threading.Lock()
+
+# Klien RunPod dan router pembagian batch lokal/remote
+RUNPOD_CLIENT = None
+if RUNPOD_ENABLE:
+    if RUNPOD_URL and RUNPOD_API_KEY:
+        RUNPOD_CLIENT = RunPodClient(
+            RUNPOD_URL,
+            RUNPOD_API_KEY,
+            timeout=TIMEOUT,
+            max_retries=RUNPOD_MAX_RETRIES,
+            pool_size=RUNPOD_POOL_SIZE,
+            breaker=CircuitBreaker(RUNPOD_BREAKER_FAILURES, RUNPOD_BREAKER_RESET_SECONDS),
+        )
+    else:
+        logging.error("RunPod is enabled but RUNPOD_URL or RUNPOD_API_KEY is not configured; using local inference only.")
+SPLIT_ROUTER = SplitRouter(LOCAL_SECONDS_PER_TEXT, RUNPOD_OVERHEAD_SECONDS, RUNPOD_SECONDS_PER_TEXT)
+REMOTE_EXECUTOR = ThreadPoolExecutor(max_workers=RUNPOD_POOL_SIZE, thread_name_prefix="runpod")
+
+# Antrian inferensi dengan prioritas dan deadline; satuan slot adalah teks jika request berbagi micro-batch
+ADMISSION_PER_TEXT = BATCHING_ENABLE and INFERENCE_CLIENT is None
+ADMISSION = AdmissionController(
+    INFERENCE_MAX_CONCURRENCY * BATCH_MAX_SIZE if ADMISSION_PER_TEXT else INFERENCE_MAX_CONCURRENCY,
+    INFERENCE_QUEUE_DEPTH,
+)
+
+# Tokenizer model yang dimuat, untuk menghitung usage dengan tokenizer model itu sendiri
+TOKENIZERS = TokenizerRegistry(num_threads=TOKEN_COUNT_THREADS)
+TOKEN_EXECUTOR = ThreadPoolExecutor(max_workers=TOKEN_COUNT_THREADS, thread_name_prefix="tokens")
 
-# Cache model yang dimuat
-LOADED_MODELS = {}
+# Cache embedding berdasarkan (model, hash teks)
+EMBEDDING_CACHE = EmbeddingCache(EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_DISK_MAX_BYTES) if EMBEDDING_CACHE_ENABLE else None
 
-# Fungsi validasi model pada startup
-def validate_models(available_models, model_path):
+# Cache terpisah untuk query pencarian, agar query populer tidak tergeser oleh ingest massal
+QUERY_CACHE = EmbeddingCache(QUERY_CACHE_MAX_BYTES) if QUERY_CACHE_MAX_BYTES > 0 else None
+
+# Validasi model pada startup dari registry fastembed dan manifest, tanpa memuat model
+# (dilakukan oleh inference server jika aktif)
+if INFERENCE_CLIENT is None:
+    try:
+        validate_models(AVAILABLE_MODELS, MODEL_MANIFEST)
+    except ValueError as e:
+        logging.critical(f"Model validation failed: {str(e)}")
+        raise e
+
+# Fungsi untuk memuat model baru
+def load_model(model_name):
     """
-    Validates all available models at application startup.
+    Instantiate an embedding model from MODEL_PATH, or a proxy to the inference server.
     """
-    for model_name in available_models:
-        try:
-            logging.info(f"Validating model '{model_name}'...")
-            _ = TextEmbedding(model_name=model_name, cache_dir=model_path)
-            logging.info(f"Model '{model_name}' is valid and ready.")
-        except Exception as e:
-            logging.error(f"Model '{model_name}' cannot be loaded: {str(e)}")
-            raise ValueError(f"Invalid model '{model_name}' in AVAILABLE_MODELS: {str(e)}")
+    try:
+        if INFERENCE_CLIENT is not None:
+            model = RemoteModel(INFERENCE_CLIENT, model_name)
+        else:
+            threads = CALIBRATION.get(model_name, {}).get("threads")
+            model = TextEmbedding(model_name=model_name, cache_dir=MODEL_PATH, threads=threads)
+            record_model(MODEL_MANIFEST, model_name, model)
+        TOKENIZERS.register(model_name, model)
+        return model
+    except Exception as e:
+        logging.error(f"Failed to load model '{model_name}': {str(e)}")
+        raise Exception(f"Failed to load model '{model_name}': {str(e)}")
 
-# Validasi model pada startup
-try:
-    validate_models(AVAILABLE_MODELS, MODEL_PATH)
-except ValueError as e:
-    logging.critical(f"Model validation failed: {str(e)}")
-    raise e
+def release_model(model_name, model):
+    """
+    Close the micro-batcher and drop the tokenizer of a model evicted from the pool.
+    """
+    TOKENIZERS.unregister(model_name)
+    with BATCHERS_LOCK:
+        batcher = BATCHERS.get(model_name)
+        if batcher is not None and batcher.model is model:
+            del BATCHERS[model_name]
+        else:
+            batcher = None
+    if batcher is not None:
+        batcher.close()
+
+# Pool model yang dimuat (LRU, dibatasi jumlah dan memori, model default tidak pernah dikeluarkan)
+MODEL_POOL = ModelPool(
+    load_model,
+    max_models=MAX_CACHED_MODELS,
+    max_bytes=MODEL_POOL_MAX_BYTES,
+    pinned=[DEFAULT_MODEL],
+    on_evict=release_model,
+)
+
+# Model default dimuat dan dipanaskan di background; request memakai instance yang sama dari MODEL_POOL
+WARMUP = ModelWarmup(MODEL_POOL.get, [DEFAULT_MODEL] if MODEL_WARMUP_ENABLE else [])
+WARMUP.start()
 
 # Fungsi untuk memuat atau mengambil model
 def get_or_load_model(model_name):
     """
     Retrieve or load an embedding model. Validate against allowed models.
     """
-    global LOADED_MODELS
-
     # Validasi apakah model termasuk dalam daftar model yang diizinkan
     if model_name not in AVAILABLE_MODELS:
         logging.error(f"Requested model '{model_name}' is not in allowed models: {AVAILABLE_MODELS}")
         raise ValueError(f"Model '{model_name}' is not available. Allowed models: {AVAILABLE_MODELS}")
 
-    # Jika model ada di cache, gunakan model tersebut
-    if model_name in LOADED_MODELS:
-        logging.info(f"Using cached model: {model_name}")
-        return LOADED_MODELS[model_name]
+    return MODEL_POOL.get(model_name)
 
-    # Jika tidak ada, muat model baru
-    try:
-        logging.info(f"Loading new model: {model_name}")
-        model = TextEmbedding(model_name=model_name, cache_dir=MODEL_PATH)
+def ensure_tokenizer(model_name):
+    """
+    Make sure an allowed model has a registered tokenizer, loading only tokenizer.json
+    from its downloaded directory (see MODEL_MANIFEST) instead of the whole model.
+    """
+    if model_name not in AVAILABLE_MODELS or TOKENIZERS.has_tokenizer(model_name):
+        return TOKENIZERS.has_tokenizer(model_name)
+    entry = load_manifest(MODEL_MANIFEST).get(model_name)
+    return bool(entry) and TOKENIZERS.load(model_name, entry["model_dir"])
 
-        # Tambahkan ke cache
-        LOADED_MODELS[model_name] = model
+def native_dimension(model_name):
+    """
+    Native embedding size of a model: from fastembed's registry, or measured with one
+    inference for models the registry does not know. None if it cannot be determined.
+    """
+    dimension = model_dimension(model_name)
+    if dimension is None and model_name in AVAILABLE_MODELS:
+        try:
+            dimension = len(next(iter(get_or_load_model(model_name).embed(["dimension"]))))
+        except Exception as e:
+            logging.warning(f"Cannot determine the embedding size of '{model_name}': {str(e)}")
+    return dimension
 
-        # Hapus model lama jika cache penuh
-        if len(LOADED_MODELS) > MAX_CACHED_MODELS:
-            oldest_model = next(iter(LOADED_MODELS))
-            del LOADED_MODELS[oldest_model]
-            logging.warning(f"Removed oldest model from cache: {oldest_model}")
+def model_batch_size(model_name):
+    """
+    Calibrated batch size for a model, or BATCH_MAX_SIZE.
+    """
+    return CALIBRATION.get(model_name, {}).get("batch_size", BATCH_MAX_SIZE)
 
-        return model
+def get_batcher(model_name, model):
+    """
+    Retrieve the micro-batcher for a loaded model, replacing it if the model was reloaded.
+    """
+    with BATCHERS_LOCK:
+        batcher = BATCHERS.get(model_name)
+        if batcher is None or batcher.model is not model:
+            if batcher is not None:
+                batcher.close()
+            batcher = MicroBatcher(
+                model, model_batch_size(model_name), BATCH_MAX_WAIT_MS, name=model_name,
+                tokenizer=get_model_tokenizer(model), max_batch_tokens=BATCH_MAX_TOKENS,
+                callers=lambda: ADMISSION.active,
+            )
+            BATCHERS[model_name] = batcher
+        return batcher
+
+def run_inference(model_name, model, texts, lengths=None):
+    """
+    Generate embeddings locally, sharing ONNX batches with concurrent requests when batching is enabled.
+    With the inference server, batching across all workers happens in the server instead.
+    `lengths` are the texts' token counts, if already known, for length bucketing.
+    """
+    if INFERENCE_CLIENT is not None:
+        return list(model.embed(texts))
+    # The lease keeps the model (and its batcher) from being evicted during inference. If the
+    # caller's instance was evicted since it was fetched, the pool's current one is used instead
+    with MODEL_POOL.lease(model_name) as model:
+        if BATCHING_ENABLE:
+            return get_batcher(model_name, model).embed(texts, lengths=lengths)
+        INFERENCE_BATCH_SIZE.labels(model=model_name).observe(len(texts))
+        return embed_texts_batched(
+            model, texts, model_batch_size(model_name), get_model_tokenizer(model), BATCH_MAX_TOKENS, lengths
+        )
+
+def run_local_inference(model_name, model, texts, lengths=None):
+    """
+    Run local inference and feed the observed cost back into the split router.
+    """
+    started = time.monotonic()
+    embeddings = run_inference(model_name, model, texts, lengths)
+    SPLIT_ROUTER.record_local(len(texts), time.monotonic() - started)
+    return embeddings
+
+def run_remote_inference(model_name, texts, deadline=None):
+    started = time.monotonic()
+    embeddings = RUNPOD_CLIENT.embed(model_name, texts, deadline)
+    SPLIT_ROUTER.record_remote(len(texts), time.monotonic() - started)
+    return embeddings
+
+def run_routed_inference(model_name, model, texts, deadline=None, lengths=None):
+    """
+    Split a large batch between the local model and RunPod so both finish at about the same time.
+    Both halves run concurrently; if RunPod fails, its share is embedded locally.
+    The RunPod call gives up at `deadline` (absolute time.monotonic()), or after REQUEST_TIMEOUT.
+    """
+    if RUNPOD_CLIENT is None or len(texts) <= MAX_TEXTS_FOR_LOCAL_PROCESSING:
+        return run_local_inference(model_name, model, texts, lengths)
+    if deadline is not None and deadline <= time.monotonic():
+        return run_local_inference(model_name, model, texts, lengths)
+
+    local_count = SPLIT_ROUTER.split(len(texts))
+    if local_count >= len(texts) or not RUNPOD_CLIENT.available():
+        return run_local_inference(model_name, model, texts, lengths)
+
+    local_texts, remote_texts = texts[:local_count], texts[local_count:]
+    local_lengths, remote_lengths = (None, None) if lengths is None else (lengths[:local_count], lengths[local_count:])
+    logging.info(f"Splitting batch: {len(local_texts)} local, {len(remote_texts)} RunPod.")
+    remote_future = REMOTE_EXECUTOR.submit(run_remote_inference, model_name, remote_texts, deadline)
+    local_embeddings = run_local_inference(model_name, model, local_texts, local_lengths) if local_texts else []
+
+    try:
+        remote_embeddings = remote_future.result()
     except Exception as e:
-        logging.error(f"Failed to load model '{model_name}': {str(e)}")
-        raise Exception(f"Failed to load model '{model_name}': {str(e)}")
+        logging.warning(f"RunPod failed, embedding {len(remote_texts)} texts locally: {str(e)}")
+        remote_embeddings = run_local_inference(model_name, model, remote_texts, remote_lengths)
+    return list(local_embeddings) + list(remote_embeddings)
+
+def embed_texts(model_name, model, texts, deadline=None, lengths=None):
+    """
+    Generate embeddings, serving repeated texts from the embedding cache.
+    Only cache misses are sent to the model (or split with RunPod until `deadline`).
+    `lengths` are the texts' token counts from usage counting, reused to plan batches.
+    """
+    if EMBEDDING_CACHE is None:
+        return run_routed_inference(model_name, model, texts, deadline, lengths)
+
+    embeddings = EMBEDDING_CACHE.get_many(model_name, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, embeddings) if vector is None))
+    if not missing:
+        return embeddings
+
+    if lengths is not None:
+        length_of = dict(zip(texts, lengths))
+        lengths = [length_of[text] for text in missing]
+    computed = dict(zip(missing, run_routed_inference(model_name, model, missing, deadline, lengths)))
+    EMBEDDING_CACHE.put_many(model_name, missing, [computed[text] for text in missing])
+    return [vector if vector is not None else computed[text] for text, vector in zip(texts, embeddings)]
+
+def reduce_dimensions(model_name, embeddings, dimensions):
+    """
+    Reduce embeddings to the requested `dimensions` (see utils/dimensions.py); unchanged when None.
+    """
+    if dimensions is None:
+        return embeddings
+    return list(DIMENSIONS.reduce(model_name, embeddings, dimensions))
+
+def embed_queries(model_name, texts):
+    """
+    Embed search queries in-process, reusing cached query embeddings.
+    """
+    if QUERY_CACHE is None:
+        return embed_texts(model_name, get_or_load_model(model_name), texts)
+
+    embeddings = QUERY_CACHE.get_many(model_name, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, embeddings) if vector is None))
+    if not missing:
+        return embeddings
+
+    model = get_or_load_model(model_name)
+    computed = dict(zip(missing, embed_texts(model_name, model, missing)))
+    QUERY_CACHE.put_many(model_name, missing, [computed[text] for text in missing])
+    return [vector if vector is not None else computed[text] for text, vector in zip(texts, embeddings)]
+
+def embed_query(model_name, text):
+    """
+    Embed a single search query in-process, reusing cached query embeddings.
+    """
+    return embed_queries(model_name, [text])[0]
+
+def count_tokens(texts, model_name):
+    with observe_stage("token_count"):
+        return TOKENIZERS.count_tokens(texts, model_name)
+
+def start_token_count(texts, model_name):
+    """
+    Count tokens for usage. Returns (future of the counts, token lengths for batching or None).
+    With the model's own tokenizer the counts are exactly the lengths that length bucketing
+    needs, so they are computed once, up front, and reused; tiktoken estimates are counted
+    in the background while inference runs.
+    """
+    if TOKENIZERS.has_tokenizer(model_name):
+        future = Future()
+        future.set_result(count_tokens(texts, model_name))
+        return future, future.result()
+    return TOKEN_EXECUTOR.submit(count_tokens, texts, model_name), None
+
+def admission_cost(text_count):
+    """
+    Admission units for a request: one per text when requests share micro-batches, otherwise one.
+    """
+    return text_count if ADMISSION_PER_TEXT else 1
+
+def request_priority(text_count):
+    """
+    Priority class from the X-Priority header, or interactive for small requests and bulk otherwise.
+    """
+    priority = request.headers.get("X-Priority", "").lower()
+    if priority in PRIORITIES:
+        return PRIORITIES[priority]
+    return PRIORITY_INTERACTIVE if text_count <= INTERACTIVE_MAX_TEXTS else PRIORITY_BULK
+
+def request_deadline(started=None):
+    """
+    Absolute deadline for the current request, from X-Request-Deadline-Ms or REQUEST_DEADLINE_MS,
+    counted from the request's arrival (see utils/log.py) rather than from when the view runs.
+    """
+    try:
+        budget_ms = float(request.headers.get("X-Request-Deadline-Ms", REQUEST_DEADLINE_MS))
+    except ValueError:
+        budget_ms = REQUEST_DEADLINE_MS
+    return (started or g.get("request_arrival") or time.monotonic()) + budget_ms / 1000.0
+
+def admission_error_response(error, body_key="error"):
+    logging.warning(f"Request rejected by admission control: {str(error)}")
+    body = {body_key: str(error)} if body_key == "error" else {"success": False, body_key: str(error)}
+    return jsonify(body), error.status_code, {"Retry-After": str(error.retry_after)}
+
+def build_embeddings_response(model_name, embeddings, token_counts, encoding_format="float", precision="float32"):
+    """
+    Format embeddings as an OpenAI-compatible JSON body or as a binary matrix.
+    Binary formats are written straight from the numpy buffer; usage is sent in headers.
+    """
+    matrix = to_matrix(embeddings, precision)
+    usage = {
+        "input_text_count": len(token_counts),
+        "prompt_tokens": sum(token_counts),
+        "total_tokens": sum(token_counts),
+    }
+
+    if encoding_format in ("npy", "raw"):
+        body = encode_npy(matrix) if encoding_format == "npy" else encode_raw(matrix)
+        headers = {
+            "X-Embedding-Model": model_name,
+            "X-Embedding-Shape": ",".join(str(dim) for dim in matrix.shape),
+            "X-Embedding-Dtype": matrix.dtype.str,
+            "X-Usage-Prompt-Tokens": str(usage["prompt_tokens"]),
+            "X-Usage-Total-Tokens": str(usage["total_tokens"]),
+        }
+        mimetype = "application/x-npy" if encoding_format == "npy" else "application/octet-stream"
+        return Response(body, mimetype=mimetype, headers=headers)
+
+    vectors = encode_base64_rows(matrix) if encoding_format == "base64" else matrix.tolist()
+    response = {
+        "object": "list",
+        "data": [
+            {
+                "object": "embedding",
+                "embedding": vector,
+                "index": i,
+            }
+            for i, vector in enumerate(vectors)
+        ],
+        "model": model_name,
+        "usage": usage,
+    }
+    if encoding_format == "base64" or precision != "float32":
+        response["dtype"] = matrix.dtype.str
+    return jsonify(response)
+
+def plan_chunks(model_name, texts, options, encoding_format):
+    """
+    Split texts into overlapping token windows for the `chunking` option.
+    Returns (pooling, spans per text, chunk texts). Raises ValueError for invalid options.
+    """
+    model_tokenizer = TOKENIZERS.get(model_name)
+    tokenizer = TOKENIZERS.get_untruncated(model_name)
+    if model_tokenizer is None or tokenizer is None:
+        raise ValueError(f"Chunking is not available for model '{model_name}'")
+    max_tokens, overlap, pooling = parse_chunking(options, model_max_tokens(model_tokenizer))
+    if pooling == "none" and encoding_format not in ("float", "base64"):
+        raise ValueError("Per-chunk output supports only 'float' and 'base64' encoding_format")
+
+    spans = split_texts(tokenizer, texts, max_tokens, overlap)
+    chunk_texts = [text[start:end] for text, text_spans in zip(texts, spans) for start, end, _ in text_spans]
+    return pooling, spans, chunk_texts
+
+def build_chunked_response(model_name, pooling, spans, chunk_embeddings, encoding_format, precision,
+                           dimensions=None):
+    """
+    Pool chunk embeddings into one vector per input, or return every chunk with its character offsets.
+    """
+    token_counts = [sum(tokens for _, _, tokens in text_spans) for text_spans in spans]
+    grouped, offset = [], 0
+    for text_spans in spans:
+        grouped.append(chunk_embeddings[offset:offset + len(text_spans)])
+        offset += len(text_spans)
+
+    if pooling != "none":
+        pooled = [
+            pool_embeddings(vectors, [tokens for _, _, tokens in text_spans], pooling)
+            for vectors, text_spans in zip(grouped, spans)
+        ]
+        pooled = reduce_dimensions(model_name, pooled, dimensions)
+        return build_embeddings_response(model_name, pooled, token_counts, encoding_format, precision)
+
+    matrix = to_matrix(reduce_dimensions(model_name, chunk_embeddings, dimensions), precision)
+    rows = encode_base64_rows(matrix) if encoding_format == "base64" else matrix.tolist()
+    data, offset = [], 0
+    for i, text_spans in enumerate(spans):
+        chunks = [
+            {"embedding": rows[offset + j], "start": start, "end": end, "tokens": tokens}
+            for j, (start, end, tokens) in enumerate(text_spans)
+        ]
+        data.append({"object": "embedding.chunks", "index": i, "chunks": chunks})
+        offset += len(text_spans)
+    response = {
+        "object": "list",
+        "data": data,
+        "model": model_name,
+        "usage": {
+            "input_text_count": len(spans),
+            "chunk_count": len(chunk_embeddings),
+            "prompt_tokens": sum(token_counts),
+            "total_tokens": sum(token_counts),
+        },
+    }
+    if encoding_format == "base64" or precision != "float32":
+        response["dtype"] = matrix.dtype.str
+    return jsonify(response)
 
 # Blueprint Flask
 embeddings_bp = Blueprint("embeddings", __name__)
@@ -100,6 +513,7 @@ def embed():
     """
     Generate embeddings for the input text. Supports single or batch input.
     """
+    started = time.monotonic()
     try:
         # Parse JSON input
         data = request.get_json()
@@ -112,87 +526,175 @@ def embed():
             logging.warning("Invalid input type. Input must be a string or list of strings.")
             return jsonify({"error": "Input text must be a string or list of strings"}), 400
 
+        try:
+            encoding_format, precision = resolve_encoding(
+                data.get("encoding_format"), data.get("precision"), request.headers.get("Accept", "")
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         # Ambil model dari request atau gunakan default
         model_name = data.get("model", DEFAULT_MODEL)
         try:
             model = get_or_load_model(model_name)
+            dimensions = DIMENSIONS.check(model_name, data.get("dimensions"))
         except ValueError as e:
             return jsonify({"error": str(e)}), 400
 
         # Handle single or batch text input
         texts = input_text if isinstance(input_text, list) else [input_text]
 
-        if len(texts) > MAX_TEXTS_FOR_LOCAL_PROCESSING:
-            if not RUNPOD_ENABLE:
-                logging.error("RunPod is disabled and cannot process multiple texts.")
-                return jsonify({"error": "RunPod is disabled and cannot process multiple texts"}), 400
+        # Split long inputs into token windows and embed all windows of the request together
+        if data.get("chunking"):
+            try:
+                pooling, spans, chunk_texts = plan_chunks(model_name, texts, data["chunking"], encoding_format)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            try:
+                charge_texts(len(chunk_texts))
+                deadline = request_deadline()
+                with ADMISSION.slot(request_priority(len(chunk_texts)), deadline, cost=admission_cost(len(chunk_texts))):
+                    with observe_stage("inference"):
+                        chunk_embeddings = embed_texts(model_name, model, chunk_texts, deadline)
+            except AdmissionError as e:
+                return admission_error_response(e)
+            record_tokens(sum(tokens for text_spans in spans for _, _, tokens in text_spans))
+            try:
+                with observe_stage("serialization"):
+                    return build_chunked_response(
+                        model_name, pooling, spans, chunk_embeddings, encoding_format, precision, dimensions
+                    )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
 
-            if not RUNPOD_URL or not RUNPOD_API_KEY:
-                logging.error("RunPod URL or API key is not configured.")
-                return jsonify({"error": "RunPod URL or API key is not configured"}), 500
+        # Count tokens once; the same lengths plan the inference batches
+        token_future, lengths = start_token_count(texts, model_name)
 
-            try:
-                # Build the payload for RunPod
-                payload = {
-                    "input": {
-                        "openai_route": "/v1/embeddings",
-                        "openai_input": {
-                            "input": texts,
-                            "model": model_name
-                        }
-                    }
-                }
-
-                # Forward the request to the external embedding service
-                headers = {
-                    "Authorization": f"Bearer {RUNPOD_API_KEY}",
-                    "Content-Type": "application/json",
-                }
-                logging.info("Forwarding request to RunPod.")
-                response = requests.post(RUNPOD_URL, json=payload, headers=headers, timeout=TIMEOUT)
-
-                logging.info("Response received from RunPod.")
-                runpod_response = response.json()  # Parse JSON response
-
-                # Periksa apakah 'output' ada dalam respons
-                if "output" not in runpod_response or not isinstance(runpod_response["output"], list):
-                    logging.error("Invalid RunPod response structure.")
-                    return jsonify({"error": "Invalid RunPod response structure"}), 500
-
-                # Ambil elemen pertama dari 'output' dan kembalikan sebagai respons
-                return jsonify(runpod_response["output"][0]), response.status_code
-                # return jsonify(response.output[0].json()), response.status_code
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Failed to forward request to RunPod: {str(e)}")
-                return jsonify({"error": f"Failed to forward request: {str(e)}"}), 500
-
-        # Generate embeddings locally
+        # Generate embeddings (locally, or split with RunPod for large batches)
         logging.info(f"Generating embeddings using model: {model_name}")
-        embeddings = list(model.embed(texts))  # Convert generator to list
-
-        # Calculate token counts for each text
-        token_counts = [calculate_token_count(text, model="gpt-4") for text in texts]
-
-        # Format response
-        response = {
-            "data": [
-                {
-                    "object": "embedding",
-                    "embedding": embeddings[i].tolist(),
-                    "index": i,
-                }
-                for i in range(len(embeddings))
-            ],
+        try:
+            charge_texts(len(texts))
+            deadline = request_deadline()
+            with ADMISSION.slot(request_priority(len(texts)), deadline, cost=admission_cost(len(texts))):
+                with observe_stage("inference"):
+                    embeddings = embed_texts(model_name, model, texts, deadline, lengths)
+        except AdmissionError as e:
+            token_future.cancel()
+            return admission_error_response(e)
+        token_counts = token_future.result()
+        record_tokens(sum(token_counts))
+        try:
+            embeddings = reduce_dimensions(model_name, embeddings, dimensions)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        logging.info("Embeddings generated successfully.", extra={
             "model": model_name,
-            "usage": {
-                "input_text_count": len(texts),
-                "prompt_tokens": sum(token_counts),
-                "total_tokens": sum(token_counts),
-            },
-        }
-        logging.info("Embeddings generated successfully.")
-        return jsonify(response)
+            "texts": len(texts),
+            "duration_ms": round((time.monotonic() - started) * 1000, 2),
+        })
+        with observe_stage("serialization"):
+            return build_embeddings_response(model_name, embeddings, token_counts, encoding_format, precision)
 
     except Exception as e:
         logging.critical(f"Unexpected error in embedding endpoint: {str(e)}")
-        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": "An unexpected error occurred", "details": str(e)}), 500
+
+@embeddings_bp.route("/v1/embeddings/stream", methods=["POST"])
+@authenticate
+def embed_stream():
+    """
+    Stream embeddings for a large corpus as NDJSON.
+    The body is read incrementally as NDJSON (one string or {"id", "input"} object per line)
+    or as a JSON array, and every batch is written out as soon as it is embedded.
+    """
+    model_name = request.args.get("model", DEFAULT_MODEL)
+    try:
+        batch_size = int(request.args.get("batch_size", STREAM_BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+        encoding_format, precision = resolve_encoding(
+            request.args.get("encoding_format"), request.args.get("precision")
+        )
+        if encoding_format not in ("float", "base64"):
+            raise ValueError("Streaming supports only 'float' and 'base64' encoding_format")
+        model = get_or_load_model(model_name)
+        dimensions = request.args.get("dimensions")
+        dimensions = DIMENSIONS.check(model_name, int(dimensions) if dimensions is not None else None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    content_type = request.mimetype or ""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = iter_ndjson(request.stream)
+    else:
+        items = iter_json_array(request.stream)
+
+    def generate():
+        count = 0
+        total_tokens = 0
+        try:
+            for batch in iter_batches(items, batch_size):
+                ids = [item_id for item_id, _ in batch]
+                texts = [text for _, text in batch]
+                token_future, lengths = start_token_count(texts, model_name)
+                # Bulk priority; wait for rate limit tokens and a slot instead of failing
+                deadline = time.monotonic() + TIMEOUT
+                charge_texts(len(texts), deadline)
+                with ADMISSION.slot(PRIORITY_BULK, deadline, block=True, cost=admission_cost(len(texts))):
+                    embeddings = embed_texts(model_name, model, texts, deadline, lengths)
+                matrix = to_matrix(reduce_dimensions(model_name, embeddings, dimensions), precision)
+                vectors = encode_base64_rows(matrix) if encoding_format == "base64" else matrix.tolist()
+                batch_tokens = sum(token_future.result())
+                record_tokens(batch_tokens)
+                total_tokens += batch_tokens
+
+                lines = [
+                    json.dumps({"object": "embedding", "id": item_id, "index": count + i, "embedding": vector})
+                    for i, (item_id, vector) in enumerate(zip(ids, vectors))
+                ]
+                count += len(batch)
+                yield "\n".join(lines) + "\n"
+        except Exception as e:
+            logging.error(f"Streaming embeddings failed after {count} items: {str(e)}")
+            yield json.dumps({"object": "error", "error": str(e), "processed": count}) + "\n"
+            return
+
+        yield json.dumps({
+            "object": "usage",
+            "model": model_name,
+            "input_text_count": count,
+            "prompt_tokens": total_tokens,
+            "total_tokens": total_tokens,
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@embeddings_bp.route("/v1/cache/stats", methods=["GET"])
+@authenticate
+def cache_stats():
+    """
+    Return hit/miss counters of the embedding and query caches for this worker.
+    """
+    if EMBEDDING_CACHE is None:
+        stats = {"enabled": False}
+    else:
+        stats = {"enabled": True, **EMBEDDING_CACHE.stats()}
+    stats["query_cache"] = QUERY_CACHE.stats() if QUERY_CACHE is not None else {"enabled": False}
+    return jsonify(stats)
+
+@embeddings_bp.route("/v1/queue/stats", methods=["GET"])
+@authenticate
+def queue_stats():
+    """
+    Return inference queue depth and admission counters for this worker.
+    """
+    return jsonify(ADMISSION.stats())
+
+@embeddings_bp.route("/v1/models/stats", methods=["GET"])
+@authenticate
+def model_pool_stats():
+    """
+    Return loaded models with their load time, last use and estimated memory for this worker.
+    """
+    return jsonify(MODEL_POOL.stats())
@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify
+from routes.embeddings import WARMUP, INFERENCE_CLIENT
+from qdrant.client import check_qdrant, qdrant_health
+from qdrant.config import QDRANT_ENABLE
+
+# Probes for the orchestrator; not authenticated
+health_bp = Blueprint("health", __name__)
+
+@health_bp.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Liveness: the worker is up and serving requests.
+    """
+    return jsonify({"status": "ok"})
+
+@health_bp.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: the default model is loaded and warm, and the inference servers and
+    Qdrant (when enabled) are reachable.
+    """
+    ready = WARMUP.ready()
+    checks = {"models": WARMUP.status()}
+    if INFERENCE_CLIENT is not None:
+        errors = INFERENCE_CLIENT.ping()
+        checks["inference_servers"] = {path: {"ok": error is None, "error": error} for path, error in errors.items()}
+        ready = ready and not any(errors.values())
+    if QDRANT_ENABLE:
+        qdrant_ok = check_qdrant()
+        checks["qdrant"] = {"ok": qdrant_ok, "error": qdrant_health()["error"]}
+        ready = ready and qdrant_ok
+    return jsonify({"status": "ready" if ready else "not_ready", "checks": checks}), 200 if ready else 503
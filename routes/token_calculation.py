@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
-from utils.utils import calculate_token_count
 from utils.authentication import authenticate
+from routes.embeddings import TOKENIZERS, ensure_tokenizer
 
 # Create a blueprint
 token_calculation_bp = Blueprint("token_calculation", __name__)
@@ -9,7 +9,7 @@ token_calculation_bp = Blueprint("token_calculation", __name__)
 @authenticate
 def calculate_tokens_endpoint():
     """
-    Endpoint to calculate tokens for given input text.
+    Endpoint to calculate tokens for given input text. Supports single or batch input.
     """
     data = request.get_json()
 
@@ -20,16 +20,24 @@ def calculate_tokens_endpoint():
     model = data.get("model", "gpt-4")
 
     # Validate input type
-    if not isinstance(input_text, str):
-        return jsonify({"error": "Input must be a string"}), 400
+    is_batch = isinstance(input_text, list)
+    if not isinstance(input_text, str) and not (is_batch and all(isinstance(text, str) for text in input_text)):
+        return jsonify({"error": "Input must be a string or list of strings"}), 400
 
     try:
-        # Calculate token count using the updated utility function
-        token_count = calculate_token_count(input_text, model)
-        return jsonify({
+        texts = input_text if is_batch else [input_text]
+
+        # Embedding models are counted with their own tokenizer, loaded without the model
+        exact = model.startswith("gpt-") or ensure_tokenizer(model)
+
+        token_counts = TOKENIZERS.count_tokens(texts, model, fallback=model)
+        response = {
             "model": model,
-            "tokens": token_count,
-            "note": "Token count is estimated for non-OpenAI models" if not model.startswith("gpt-") else "Token count is exact"
-        })
+            "tokens": sum(token_counts),
+            "note": "Token count is exact" if exact else "Token count is estimated for non-OpenAI models"
+        }
+        if is_batch:
+            response["token_counts"] = token_counts
+        return jsonify(response)
     except Exception as e:
         return jsonify({"error": f"Failed to calculate tokens: {str(e)}"}), 500
@@ -0,0 +1,56 @@
+"""
+Shared fixtures. The app is imported once, offline, with the fakes from benchmarks/fakes.py.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import fakes  # noqa: E402
+
+API_KEY = "test"
+# Key allowed one request at a time, for the concurrency tests
+LIMITED_API_KEY = "limited"
+
+_TMP = tempfile.mkdtemp(prefix="fastembed-tests-")
+QDRANT = fakes.install(env={
+    "API_KEYS": f"{API_KEY},{LIMITED_API_KEY}",
+    "RATE_LIMIT_FILE": os.path.join(_TMP, "ratelimit.bin"),
+    "RATE_LIMIT_OVERRIDES": json.dumps({LIMITED_API_KEY: {"concurrency": 1}}),
+    "LOCAL_STORE_PATH": os.path.join(_TMP, "vectors"),
+    "MODEL_PATH": os.path.join(_TMP, "models"),
+    "MODEL_WARMUP_ENABLE": "false",
+    "LOG_FILE": "",
+    "LOG_LEVEL": "WARNING",
+})
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth():
+    return {"Authorization": f"Bearer {API_KEY}"}
+
+
+@pytest.fixture
+def limited_auth():
+    return {"Authorization": f"Bearer {LIMITED_API_KEY}"}
+
+
+@pytest.fixture
+def qdrant():
+    return QDRANT
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeTextEmbedding
+from utils.admission import (
+    PRIORITY_BULK, PRIORITY_INTERACTIVE, AdmissionController, DeadlineExceededError, QueueFullError, arrival_time,
+)
+from utils.batching import MicroBatcher
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_rejects_when_the_queue_is_full():
+    controller = AdmissionController(max_concurrency=1, max_queue_depth=0)
+    controller.acquire()
+    with pytest.raises(QueueFullError) as error:
+        controller.acquire()
+    assert error.value.status_code == 429
+    assert error.value.retry_after >= 1
+    controller.release()
+    controller.acquire()
+    controller.release()
+
+
+def test_expired_deadline_is_dropped():
+    controller = AdmissionController(max_concurrency=1, max_queue_depth=4)
+    with pytest.raises(DeadlineExceededError):
+        controller.acquire(deadline=time.monotonic() - 1)
+
+    controller.acquire()
+    with pytest.raises(DeadlineExceededError):
+        controller.acquire(deadline=time.monotonic() + 0.05)
+    controller.release()
+    assert controller.stats()["expired"] == 2
+    assert controller.stats()["queued"] == 0
+
+
+def test_interactive_requests_are_admitted_before_bulk():
+    controller = AdmissionController(max_concurrency=1, max_queue_depth=4)
+    controller.acquire()
+    order = []
+
+    def wait(priority, name):
+        with controller.slot(priority):
+            order.append(name)
+
+    bulk = threading.Thread(target=wait, args=(PRIORITY_BULK, "bulk"))
+    bulk.start()
+    _wait_until(lambda: controller.stats()["queued"] == 1)
+    interactive = threading.Thread(target=wait, args=(PRIORITY_INTERACTIVE, "interactive"))
+    interactive.start()
+    _wait_until(lambda: controller.stats()["queued"] == 2)
+
+    controller.release()
+    bulk.join()
+    interactive.join()
+    assert order == ["interactive", "bulk"]
+
+
+
+def test_requests_are_admitted_by_cost():
+    controller = AdmissionController(max_concurrency=4, max_queue_depth=4)
+    controller.acquire(cost=3)
+    controller.acquire(cost=1)
+    assert controller.stats()["used"] == 4
+
+    admitted = threading.Event()
+
+    def wait():
+        with controller.slot(cost=2):
+            admitted.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    _wait_until(lambda: controller.stats()["queued"] == 1)
+    controller.release(cost=1)
+    assert not admitted.wait(0.05)  # 3 + 2 units do not fit yet
+    controller.release(cost=3)
+    thread.join()
+    assert admitted.is_set()
+    # A request larger than the whole capacity still runs, alone
+    with controller.slot(cost=100):
+        assert controller.stats()["used"] == 4
+    assert controller.stats()["used"] == 0
+
+
+def test_concurrent_single_text_requests_share_one_batch():
+    class RecordingModel(FakeTextEmbedding):
+        def __init__(self, model_name):
+            super().__init__(model_name)
+            self.calls = []
+
+        def embed(self, documents, batch_size=256, parallel=None, **kwargs):
+            documents = list(documents)
+            self.calls.append(documents)
+            return super().embed(documents, batch_size=batch_size)
+
+    requests = 6
+    controller = AdmissionController(max_concurrency=2 * 64, max_queue_depth=0)
+    model = RecordingModel("fake/minilm-384")
+    # A long window: the batch is only sent early because every admitted request joined it
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=10000, callers=lambda: controller.active)
+    all_admitted = threading.Barrier(requests)
+    results = [None] * requests
+
+    def request(i):
+        with controller.slot(cost=1):
+            all_admitted.wait()
+            results[i] = batcher.embed([f"text {i}"])
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert time.monotonic() - started < 2
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0]) == sorted(f"text {i}" for i in range(requests))
+    assert all(len(result) == 1 for result in results)
+
+
+def test_arrival_time_from_request_start_header():
+    now = time.monotonic()
+    assert arrival_time(None, now) == now
+    assert arrival_time("garbage", now) == now
+    assert now - arrival_time(f"t={time.time() - 2:.3f}", now) == pytest.approx(2, abs=0.1)
+    assert now - arrival_time(f"t={int((time.time() - 1) * 1000)}", now) == pytest.approx(1, abs=0.1)
@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pytest
+
+from benchmarks.fakes import FakeTextEmbedding
+from utils.batching import MicroBatcher, embed_bucketed, plan_batches
+
+
+class RecordingModel(FakeTextEmbedding):
+    def __init__(self, model_name="fake/minilm-384"):
+        super().__init__(model_name)
+        self.calls = []
+
+    def embed(self, documents, batch_size=256, parallel=None, **kwargs):
+        documents = list(documents)
+        self.calls.append(documents)
+        return super().embed(documents, batch_size=batch_size)
+
+
+def test_plan_batches_respects_size_and_token_budget():
+    lengths = [1, 50, 2, 40, 3]
+    batches = plan_batches(lengths, max_batch_size=2, max_batch_tokens=80)
+    assert sorted(p for batch in batches for p in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 2
+        assert max(lengths[p] for p in batch) * len(batch) <= 80
+    # Shortest texts are grouped first
+    assert batches[0] == [0, 2]
+
+
+def test_bucketed_embeddings_keep_the_input_order():
+    model = RecordingModel()
+    texts = ["word " * 30, "short", "word " * 10, "tiny", "word " * 31]
+    embeddings = embed_bucketed(model, texts, model.model.tokenizer, max_batch_size=8, max_batch_tokens=64)
+    expected = list(FakeTextEmbedding("fake/minilm-384").embed(texts))
+    np.testing.assert_allclose(np.stack(embeddings), np.stack(expected), rtol=1e-5)
+    # The short texts run together, the two long ones in their own batch
+    assert sorted(len(call) for call in model.calls) == [2, 3]
+    assert {texts[1], texts[2], texts[3]} in [set(call) for call in model.calls]
+
+
+def test_micro_batcher_returns_each_caller_its_own_rows():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=64, max_wait_ms=50)
+    inputs = [[f"text {i} {j}" for j in range(i + 1)] for i in range(4)]
+    results = [None] * len(inputs)
+
+    def run(i):
+        results[i] = batcher.embed(inputs[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    for texts, embeddings in zip(inputs, results):
+        expected = list(FakeTextEmbedding("fake/minilm-384").embed(texts))
+        assert len(embeddings) == len(texts)
+        np.testing.assert_allclose(np.stack(embeddings), np.stack(expected), rtol=1e-5)
+    # Concurrent requests shared fewer model calls than there were requests
+    assert len(model.calls) < len(inputs)
+
+
+def test_micro_batcher_reuses_given_lengths(monkeypatch):
+    import utils.batching
+
+    monkeypatch.setattr(utils.batching, "token_lengths", lambda *args: pytest.fail("texts were tokenized again"))
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=0, tokenizer=model.model.tokenizer,
+                           max_batch_tokens=64)
+    assert len(batcher.embed(["a b c", "d"], lengths=[3, 1])) == 2
+    batcher.close()
+
+
+def test_micro_batcher_empty_input_and_close():
+    batcher = MicroBatcher(RecordingModel(), max_wait_ms=0)
+    assert batcher.embed([]) == []
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.embed(["late"])
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import utils.calibration as calibration
+
+
+@pytest.fixture
+def cgroup(tmp_path, monkeypatch):
+    """
+    Redirects the module's reads of /sys/fs/cgroup to files written by the test.
+    """
+    files = {}
+
+    def fake_open(path, *args, **kwargs):
+        if path not in files:
+            raise FileNotFoundError(path)
+        target = tmp_path / os.path.basename(path)
+        target.write_text(files[path])
+        return open(target, *args, **kwargs)
+
+    monkeypatch.setattr(calibration, "open", fake_open, raising=False)
+    return files
+
+
+def test_cgroup_v2_quota_rounds_up(cgroup):
+    cgroup["/sys/fs/cgroup/cpu.max"] = "150000 100000\n"
+    assert calibration._cgroup_cpu_limit() == 2
+    cgroup["/sys/fs/cgroup/cpu.max"] = "max 100000\n"
+    assert calibration._cgroup_cpu_limit() is None
+
+
+def test_cgroup_v1_quota(cgroup):
+    assert calibration._cgroup_cpu_limit() is None
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_quota_us"] = "300000\n"
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_period_us"] = "100000\n"
+    assert calibration._cgroup_cpu_limit() == 3
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_quota_us"] = "-1\n"
+    assert calibration._cgroup_cpu_limit() is None
+
+
+def test_available_cpus_is_capped_by_the_quota(monkeypatch):
+    monkeypatch.setattr(calibration.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    monkeypatch.setattr(calibration, "_cgroup_cpu_limit", lambda: 2)
+    assert calibration.available_cpus() == 2
+    monkeypatch.setattr(calibration, "_cgroup_cpu_limit", lambda: None)
+    assert calibration.available_cpus() == 8
+
+
+def test_profile_is_ignored_on_a_different_host(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles" / "calibration.json")
+    models = {"fake/minilm-384": {"threads": 2, "batch_size": 64, "texts_per_second": 100.0}}
+    monkeypatch.setattr(calibration, "available_cpus", lambda: 4)
+    calibration.save_profile(path, models)
+    assert calibration.load_profile(path) == models
+    assert os.listdir(tmp_path / "profiles") == ["calibration.json"]
+
+    monkeypatch.setattr(calibration, "available_cpus", lambda: 8)
+    assert calibration.load_profile(path) == {}
+    assert calibration.load_profile(str(tmp_path / "missing.json")) == {}
+
+
+def test_calibrate_model_picks_the_fastest_setting(monkeypatch):
+    timings = {(1, 16): 2.0, (1, 32): 1.0, (2, 16): 0.5, (2, 32): 0.8}
+
+    class Model:
+        def __init__(self, threads):
+            self.threads = threads
+
+        def embed(self, texts, batch_size=None):
+            return iter(texts)
+
+    monkeypatch.setattr(calibration, "_time_embed", lambda model, texts, batch_size: timings[model.threads, batch_size])
+    best = calibration.calibrate_model(Model, max_threads=2, batch_sizes=(16, 32), texts=["x"] * 10, repeat=1)
+    assert (best["threads"], best["batch_size"]) == (2, 16)
+    assert best["texts_per_second"] == 20.0
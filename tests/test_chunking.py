@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from benchmarks.fakes import _build_tokenizer
+from utils.chunking import model_max_tokens, parse_chunking, pool_embeddings, split_texts, untruncated_copy
+
+
+@pytest.fixture
+def tokenizer():
+    return untruncated_copy(_build_tokenizer())
+
+
+def test_split_texts_into_overlapping_windows(tokenizer):
+    words = [f"w{i}" for i in range(30)]
+    text = " ".join(words)
+    spans = split_texts(tokenizer, [text, "short text"], max_tokens=10, overlap=2)
+
+    assert spans[1] == [(0, len("short text"), 2)]
+    windows = spans[0]
+    assert [count for _, _, count in windows] == [10, 10, 10, 6]
+    assert [text[start:end].split() for start, end, _ in windows][:2] == [words[0:10], words[8:18]]
+    assert windows[-1][1] == len(text)
+
+
+def test_parse_chunking_defaults_and_validation():
+    assert model_max_tokens(_build_tokenizer()) == 510
+    assert parse_chunking(True, 510) == (510, 32, "mean")
+    assert parse_chunking({"max_tokens": 8}, 510) == (8, 2, "mean")
+    for options in ({"max_tokens": 600}, {"max_tokens": 8, "overlap": 8}, {"pooling": "sum"}, {"max_tokens": "x"}, []):
+        with pytest.raises(ValueError):
+            parse_chunking(options, 510)
+
+
+def test_pooling_modes_are_normalized():
+    vectors = [[1.0, 0.0], [0.0, 3.0]]
+    np.testing.assert_allclose(pool_embeddings(vectors, [1, 1], "mean"), [0.316228, 0.948683], rtol=1e-5)
+    np.testing.assert_allclose(pool_embeddings([[1.0, -1.0], [0.0, 1.0]], [1, 1], "max"), [0.707107, 0.707107],
+                               rtol=1e-5)
+    np.testing.assert_allclose(pool_embeddings(vectors, [3, 1], "weighted"), [0.707107, 0.707107], rtol=1e-5)
+    assert not np.isnan(pool_embeddings([[0.0, 0.0]], [1], "mean")).any()
+
+
+def test_long_inputs_are_chunked_by_the_route(client, auth):
+    text = " ".join(f"w{i}" for i in range(30))
+    body = {"input": [text, "short"], "chunking": {"max_tokens": 10, "overlap": 2, "pooling": "none"}}
+    response = client.post("/v1/embeddings", json=body, headers=auth)
+    assert response.status_code == 200
+    chunks = response.json["data"][0]["chunks"]
+    assert [chunk["tokens"] for chunk in chunks] == [10, 10, 10, 6]
+    assert len(response.json["data"][1]["chunks"]) == 1
+
+    body["chunking"]["pooling"] = "mean"
+    response = client.post("/v1/embeddings", json=body, headers=auth)
+    vector = np.asarray(response.json["data"][0]["embedding"])
+    assert np.linalg.norm(vector) == pytest.approx(1, abs=1e-4)
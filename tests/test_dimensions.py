@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from utils.dimensions import DimensionReducer, fit_projection, projection_filename
+
+MODEL = "fake/minilm-384"
+
+
+def _embeddings(count=64, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+def test_matryoshka_models_are_truncated_and_renormalized():
+    reducer = DimensionReducer("/nonexistent", [MODEL], model_dimension=lambda name: 16)
+    assert reducer.check(MODEL, 4) == 4
+    assert reducer.check(MODEL, None) is None
+    reduced = reducer.reduce(MODEL, list(_embeddings(3)), 4)
+    assert reduced.shape == (3, 4)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1, rtol=1e-5)
+    assert reducer.reduce(MODEL, [], 4).shape == (0, 4)
+
+
+def test_sizes_above_the_native_dimension_are_rejected():
+    reducer = DimensionReducer("/nonexistent", [MODEL], model_dimension=lambda name: 16)
+    with pytest.raises(ValueError, match="at most 16"):
+        reducer.check(MODEL, 17)
+    for value in (0, -1, True, "8", 2.5):
+        with pytest.raises(ValueError):
+            reducer.check(MODEL, value)
+
+
+def test_pca_projection_from_projections_dir(tmp_path):
+    components, mean, ratio = fit_projection(_embeddings(), 8)
+    assert components.shape == (8, 16) and ratio[0] >= ratio[-1]
+    np.savez(tmp_path / projection_filename(MODEL), components=components, mean=mean)
+
+    reducer = DimensionReducer(str(tmp_path))
+    assert reducer.check(MODEL, 4) == 4
+    with pytest.raises(ValueError, match="at most 8"):
+        reducer.check(MODEL, 9)
+    with pytest.raises(ValueError, match="does not support"):
+        reducer.check("fake/base-768", 4)
+    reduced = reducer.reduce(MODEL, list(_embeddings(5, seed=1)), 4)
+    assert reduced.shape == (5, 4)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1, rtol=1e-5)
+
+
+def test_route_rejects_unsupported_dimensions(client, auth):
+    response = client.post("/v1/embeddings", json={"input": "x", "dimensions": 8}, headers=auth)
+    assert response.status_code == 400
+    assert "dimensions" in response.json["error"]
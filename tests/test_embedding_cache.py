@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+from utils.embedding_cache import ENTRY_OVERHEAD_BYTES, DiskSlab, EmbeddingCache
+
+MODEL = "fake/minilm-384"
+
+
+def _vectors(count, dim=16, seed=0):
+    return list(np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32))
+
+
+def test_memory_tier_hits_misses_and_lru_budget():
+    vectors = _vectors(3)
+    cache = EmbeddingCache(max_bytes=2 * (vectors[0].nbytes + ENTRY_OVERHEAD_BYTES))
+    cache.put_many(MODEL, ["a", "b"], vectors[:2])
+    assert cache.get_many(MODEL, ["a"])[0] is not None  # "a" is now the most recently used
+    cache.put_many(MODEL, ["c"], vectors[2:])
+
+    found = cache.get_many(MODEL, ["a", "b", "c", "a"])
+    assert [vector is None for vector in found] == [False, True, False, False]
+    np.testing.assert_array_equal(found[2], vectors[2])
+    # Keys include the model name
+    assert cache.get_many("other/model", ["a"]) == [None]
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (4, 2)
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    vectors = _vectors(20)
+    texts = [f"text {i}" for i in range(20)]
+    EmbeddingCache(1024 * 1024, str(tmp_path), 1024 * 1024).put_many(MODEL, texts, vectors)
+
+    # A fresh cache (another worker, or after a restart) reads the same file
+    reader = EmbeddingCache(1024 * 1024, str(tmp_path), 1024 * 1024)
+    found = reader.get_many(MODEL, texts + ["unknown"])
+    assert found[-1] is None
+    np.testing.assert_array_equal(np.stack(found[:-1]), np.stack(vectors))
+    assert reader.stats()["disk_hits"] == 20
+    assert len(os.listdir(tmp_path)) == 1
+    # Served from memory the second time
+    reader.get_many(MODEL, texts[:1])
+    assert reader.stats()["hits"] == 1
+
+
+def test_slab_has_a_fixed_size_and_replaces_least_recently_used(tmp_path):
+    dim = 4
+    slab = DiskSlab(str(tmp_path / "model.slab"), dim, max_bytes=1)  # a single bucket
+    assert slab.buckets == 1
+    size = os.path.getsize(tmp_path / "model.slab")
+
+    digests = [bytes([i]) * 32 for i in range(1, DiskSlab.WAYS + 2)]
+    vectors = _vectors(len(digests), dim)
+    assert slab.put_many(digests[:-1], vectors[:-1]) == 0
+    slab.table["stamp"][:] = np.arange(DiskSlab.WAYS) + 1  # the first entry is the oldest
+    assert slab.put_many(digests[-1:], vectors[-1:]) == 1
+
+    found = slab.get_many(digests)
+    assert found[0] is None
+    np.testing.assert_array_equal(np.stack(found[1:]), np.stack(vectors[1:]))
+    assert os.path.getsize(tmp_path / "model.slab") == size
+
+
+def test_torn_row_reads_as_a_miss(tmp_path):
+    slab = DiskSlab(str(tmp_path / "model.slab"), 4, max_bytes=4096)
+    digest = bytes(range(32))
+    slab.put_many([digest], _vectors(1, 4))
+    row = slab.get_many([digest])
+    assert row[0] is not None
+
+    # Another process rewrote the vector but not yet the checksum
+    written = np.flatnonzero(slab.table["stamp"])[0]
+    slab.table["vector"][written] += 1
+    assert slab.get_many([digest]) == [None]
+
+
+def test_disk_tier_disabled_without_a_budget(tmp_path):
+    cache = EmbeddingCache(1024, str(tmp_path), 0)
+    cache.put_many(MODEL, ["a"], _vectors(1))
+    assert not cache.stats()["disk_enabled"]
+    assert os.listdir(tmp_path) == []
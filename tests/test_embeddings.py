@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"encoding_format": "base64"},
+    {"chunking": True},
+    {"chunking": {"pooling": "none"}},
+])
+def test_empty_input_returns_no_embeddings(client, auth, options):
+    response = client.post("/v1/embeddings", json={"input": [], **options}, headers=auth)
+    assert response.status_code == 200
+    assert response.json["data"] == []
+
+
+def test_empty_input_npy(client, auth):
+    response = client.post("/v1/embeddings", json={"input": [], "encoding_format": "npy"}, headers=auth)
+    assert response.status_code == 200
+    assert response.headers["X-Embedding-Shape"] == "0,0"
+
+
+def test_single_input(client, auth):
+    response = client.post("/v1/embeddings", json={"input": "hello world"}, headers=auth)
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 1
+    assert response.json["usage"]["prompt_tokens"] > 0
+
+
+def test_explicit_encoding_format_wins_over_accept(client, auth):
+    headers = {**auth, "Accept": "application/x-npy"}
+    response = client.post("/v1/embeddings", json={"input": "x", "encoding_format": "float"}, headers=headers)
+    assert response.json["data"][0]["embedding"]
+    response = client.post("/v1/embeddings", json={"input": "x"}, headers=headers)
+    assert response.mimetype == "application/x-npy"
+
+
+def test_stream_ndjson(client, auth):
+    body = '"first"\n{"id": "b", "input": "second"}\n'
+    response = client.post("/v1/embeddings/stream", data=body, content_type="application/x-ndjson", headers=auth)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line["id"], line["index"]) for line in lines[:-1]] == [(0, 0), ("b", 1)]
+    assert lines[-1]["object"] == "usage"
+    assert lines[-1]["input_text_count"] == 2
+
+
+def test_stream_holds_its_slot_until_closed(client, limited_auth):
+    stream = client.post("/v1/embeddings/stream", data='["a", "b"]', content_type="application/json",
+                         headers=limited_auth, buffered=False)
+    assert stream.status_code == 200
+    chunks = iter(stream.response)
+    next(chunks)
+
+    # The key's only concurrency slot belongs to the open stream
+    assert client.post("/v1/embeddings", json={"input": "x"}, headers=limited_auth).status_code == 429
+
+    list(chunks)
+    stream.close()
+    assert client.post("/v1/embeddings", json={"input": "x"}, headers=limited_auth).status_code == 200
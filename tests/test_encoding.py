@@ -0,0 +1,40 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+
+from utils.encoding import encode_base64_rows, encode_npy, encode_raw, resolve_encoding, to_matrix
+
+
+def test_resolve_encoding_defaults_and_accept_header():
+    assert resolve_encoding(None, None) == ("float", "float32")
+    assert resolve_encoding(None, "int8", "application/x-npy") == ("npy", "int8")
+    assert resolve_encoding("", None, "application/octet-stream") == ("raw", "float32")
+    # An explicit format in the body is never overridden
+    assert resolve_encoding("float", None, "application/x-npy") == ("float", "float32")
+    assert resolve_encoding("base64", None, "application/octet-stream") == ("base64", "float32")
+    with pytest.raises(ValueError):
+        resolve_encoding("xml", None)
+    with pytest.raises(ValueError):
+        resolve_encoding("float", "float64")
+
+
+def test_to_matrix_precisions():
+    embeddings = [np.array([0.5, -1.0, 1.2], dtype=np.float32), np.array([0.0, 0.25, -0.5], dtype=np.float32)]
+    assert to_matrix(embeddings).dtype == np.dtype("<f4")
+    half = to_matrix(embeddings, "float16")
+    assert half.dtype == np.dtype("<f2")
+    np.testing.assert_allclose(half, np.stack(embeddings), atol=1e-3)
+    np.testing.assert_array_equal(to_matrix(embeddings, "int8"), [[64, -127, 127], [0, 32, -64]])
+    assert to_matrix([]).shape == (0, 0)
+    assert to_matrix(embeddings[0]).shape == (1, 3)
+
+
+def test_binary_encodings_round_trip():
+    matrix = to_matrix(np.random.default_rng(0).standard_normal((3, 5)), "float16")
+    rows = encode_base64_rows(matrix)
+    assert len(rows) == 3
+    np.testing.assert_array_equal(np.frombuffer(base64.b64decode(rows[1]), dtype="<f2"), matrix[1])
+    np.testing.assert_array_equal(np.load(io.BytesIO(encode_npy(matrix))), matrix)
+    np.testing.assert_array_equal(np.frombuffer(encode_raw(matrix), dtype="<f2").reshape(3, 5), matrix)
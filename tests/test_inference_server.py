@@ -0,0 +1,64 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import utils.inference_server as inference_server
+from benchmarks.fakes import FakeTextEmbedding
+from utils.inference_server import InferenceClient, InferenceServer, InferenceServerError
+from utils.model_pool import ModelPool
+
+MODEL = "fake/minilm-384"
+
+
+@pytest.fixture
+def server_path():
+    # Unix socket paths are limited to ~100 characters, too short for pytest's tmp_path
+    path = os.path.join(tempfile.mkdtemp(prefix="inf"), "s.sock")
+    server = InferenceServer(ModelPool(FakeTextEmbedding), [MODEL], batch_max_wait_ms=0)
+    thread = threading.Thread(target=server.serve_forever, args=(path,), daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "inference server did not start"
+        time.sleep(0.01)
+    yield path
+    server.shutdown()
+    thread.join(5)
+
+
+def test_embed_round_trip_through_shared_memory(server_path):
+    client = InferenceClient([server_path])
+    assert client.ping() == {server_path: None}
+    texts = ["short", "a somewhat longer text"]
+    expected = np.stack(list(FakeTextEmbedding(MODEL).embed(texts)))
+    for _ in range(2):  # the second request reuses the connection and its buffer
+        np.testing.assert_allclose(np.stack(client.embed(MODEL, texts)), expected, rtol=1e-5)
+    # A larger matrix replaces the connection's buffer
+    assert len(client.embed(MODEL, [f"text {i}" for i in range(100)])) == 100
+    assert client.embed(MODEL, []) == []
+
+
+def test_server_errors_are_raised(server_path):
+    client = InferenceClient([server_path])
+    with pytest.raises(InferenceServerError, match="not available"):
+        client.embed("unknown/model", ["x"])
+    # The connection stays usable after an error response
+    assert len(client.embed(MODEL, ["x"])) == 1
+
+
+def test_unreachable_and_timed_out_servers(monkeypatch):
+    client = InferenceClient([os.path.join(tempfile.gettempdir(), "missing-inference.sock")])
+    with pytest.raises(InferenceServerError, match="unavailable"):
+        client.info(MODEL)
+
+    def timed_out(path, timeout):
+        raise socket.timeout("timed out")
+
+    monkeypatch.setattr(inference_server, "_Connection", timed_out)
+    with pytest.raises(InferenceServerError, match="timed out"):
+        client.info(MODEL)
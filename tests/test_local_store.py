@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from qdrant.local_store import LocalStore
+
+DIM = 8
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path), compact_rows=0)
+
+
+def _points(count, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return [f"p{i}" for i in range(count)], vectors, [{"n": i, "even": i % 2 == 0} for i in range(count)]
+
+
+def _brute_force(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [f"p{i}" for i in np.argsort(-scores)[:k]]
+
+
+def _search(collection, query, **options):
+    return collection.search([{"vector": query, "top_k": 5, **options}])[0]
+
+
+def test_search_matches_brute_force(store):
+    store.create("docs", DIM)
+    collection = store.get("docs")
+    ids, vectors, payloads = _points(200)
+    # Written in several batches so the results span base and delta rows
+    for start in range(0, 200, 50):
+        collection.upsert(ids[start:start + 50], vectors[start:start + 50], payloads[start:start + 50])
+
+    query = vectors[7] + 0.1
+    found = _search(collection, query)
+    assert [point["id"] for point in found] == _brute_force(vectors, query, 5)
+    assert found[0]["payload"] == payloads[int(found[0]["id"][1:])]
+    assert collection.count() == 200
+
+
+def test_overwrite_delete_and_compact(store):
+    store.create("docs", DIM)
+    collection = store.get("docs")
+    ids, vectors, payloads = _points(20)
+    collection.upsert(ids, vectors, payloads)
+
+    collection.upsert(["p0"], [-vectors[3]], [{"n": "moved"}])
+    collection.delete(["p3"])
+    assert collection.count() == 19
+    found = _search(collection, vectors[3])
+    assert "p3" not in [point["id"] for point in found]
+    assert _search(collection, -vectors[3])[0] == {"id": "p0", "score": pytest.approx(1, abs=1e-5), "payload": {"n": "moved"}}
+
+    before = _search(collection, vectors[5])
+    collection.compact()
+    assert _search(collection, vectors[5]) == before
+    assert collection.count() == 19
+
+
+def test_other_readers_see_writes(store, tmp_path):
+    store.create("docs", DIM)
+    reader = LocalStore(str(tmp_path)).get("docs")
+    assert reader.count() == 0
+
+    ids, vectors, payloads = _points(10)
+    store.get("docs").upsert(ids, vectors, payloads)
+    assert reader.count() == 10
+    store.get("docs").compact()
+    store.get("docs").delete(["p1"])
+    assert reader.count() == 9
+    assert _search(reader, vectors[2])[0]["id"] == "p2"
+
+
+def test_filters_and_vectors(store):
+    store.create("docs", DIM)
+    collection = store.get("docs")
+    ids, vectors, payloads = _points(30)
+    collection.upsert(ids, vectors, payloads)
+
+    found = _search(collection, vectors[4], filters={"must": [{"even": False}]}, include_vector=True)
+    assert found and all(point["payload"]["even"] is False for point in found)
+    assert len(found[0]["vector"]) == DIM
+
+
+def test_quantized_collection(store):
+    store.create("docs", DIM, quantization={"type": "scalar"})
+    collection = store.get("docs")
+    ids, vectors, payloads = _points(100, seed=1)
+    collection.upsert(ids, vectors, payloads)
+    collection.compact()
+    assert _search(collection, vectors[9])[0]["id"] == "p9"
+
+
+def test_invalid_requests(store):
+    with pytest.raises(ValueError):
+        store.create("../escape", DIM)
+    with pytest.raises(ValueError):
+        store.get("missing")
+    store.create("docs", DIM)
+    with pytest.raises(ValueError):
+        store.create("docs", DIM)
+    with pytest.raises(ValueError):
+        store.get("docs").upsert(["x"], [[0.0] * (DIM + 1)], [{}])
+    store.delete("docs")
+    assert not store.exists("docs")
+
+
+def test_save_vectors_appends_local_collections_in_chunks(qdrant, monkeypatch):
+    import qdrant.utils as qu
+    from qdrant.local_store import LocalCollection
+
+    qu.LOCAL_STORE.create("local_bulk", DIM)
+    writes = []
+    upsert = LocalCollection.upsert
+
+    def recording_upsert(self, ids, vectors, payloads):
+        writes.append(list(ids))
+        if "bad" in ids:
+            raise OSError("disk full")
+        return upsert(self, ids, vectors, payloads)
+
+    monkeypatch.setattr(LocalCollection, "upsert", recording_upsert)
+    ids, vectors, payloads = _points(5)
+    ids[3] = "bad"
+    points = [{"id": i, "vector": v.tolist(), "payload": p} for i, v, p in zip(ids, vectors, payloads)]
+    saved, failures = qu.save_vectors(points, "local_bulk", chunk_size=2)
+
+    assert writes == [["p0", "p1"], ["p2", "bad"], ["p4"]]
+    assert saved == ["p0", "p1", "p4"]
+    assert [failure["index"] for failure in failures] == [2, 3]
+    assert qu.LOCAL_STORE.get("local_bulk").count() == 3
@@ -0,0 +1,26 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from utils.log import JsonFormatter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_json_lines_carry_extra_fields():
+    record = logging.makeLogRecord({"name": "access", "levelno": logging.INFO, "levelname": "INFO",
+                                    "msg": "request %s", "args": ("completed",), "status": 200})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "request completed"
+    assert entry["logger"] == "access" and entry["status"] == 200
+
+
+def test_records_are_written_to_stdout():
+    script = "import logging; from utils.log import setup_logging; setup_logging(); logging.warning('hello')"
+    env = {**os.environ, "LOG_FILE": "", "LOG_FORMAT": "json"}
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=30)
+    assert json.loads(result.stdout.splitlines()[-1])["message"] == "hello"
+    assert "hello" not in result.stderr
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from utils.model_pool import ModelPool
+
+
+class Loader:
+    def __init__(self, delay=None, fail=()):
+        self.loads = []
+        self.delay = delay
+        self.fail = set(fail)
+
+    def __call__(self, name):
+        if self.delay is not None:
+            self.delay.wait(2)
+        self.loads.append(name)
+        if name in self.fail:
+            raise RuntimeError(f"cannot load {name}")
+        return object()
+
+
+def test_lru_eviction_keeps_pinned_models():
+    evicted = []
+    loader = Loader()
+    pool = ModelPool(loader, max_models=2, pinned=["default"], on_evict=lambda name, model: evicted.append(name))
+    pool.get("default")
+    pool.get("a")
+    pool.get("b")
+    assert evicted == ["a"]
+    assert pool.loaded() == ["default", "b"]
+    # Cached models are not loaded again
+    pool.get("b")
+    assert loader.loads == ["default", "a", "b"]
+
+
+def test_concurrent_requests_share_one_load():
+    release = threading.Event()
+    loader = Loader(delay=release)
+    pool = ModelPool(loader, max_models=2)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(pool.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loader.loads == ["a"]
+    assert len(models) == 4 and all(model is models[0] for model in models)
+
+
+def test_failed_load_is_retried():
+    loader = Loader(fail=["broken"])
+    pool = ModelPool(loader)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            pool.get("broken")
+    assert loader.loads == ["broken", "broken"]
+    assert pool.stats()["load_failures"] == 2
+
+
+def test_leased_models_are_not_evicted_until_released():
+    evicted = []
+    pool = ModelPool(Loader(), max_models=1, on_evict=lambda name, model: evicted.append(name))
+    with pool.lease("a") as model:
+        pool.get("b")  # over budget, but "a" is in use
+        assert evicted == []
+        assert set(pool.loaded()) == {"a", "b"}
+        assert pool.stats()["leased"] == {"a": 1}
+        pool.evict("a")
+        assert pool.loaded().count("a") == 1
+    assert evicted == ["a"]
+    assert pool.loaded() == ["b"]
+    assert model is not None
@@ -0,0 +1,45 @@
+import pytest
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+import qdrant.utils as qu
+
+
+def test_upserts_recreate_a_collection_deleted_elsewhere(qdrant):
+    qu.save_vector([0.1] * 4, {}, "gone")
+    assert not qu.is_local("gone")
+    # Deleted outside this worker, so its cache still says the collection exists
+    qdrant.delete_collection("gone")
+    point_id = qu.save_vector([0.1] * 4, {"n": 1}, "gone")
+    assert qu.get_collection_vector_size("gone") == 4
+
+    qdrant.delete_collection("gone")
+    ids, failures = qu.save_vectors([{"vector": [0.2] * 4, "payload": {}}], "gone")
+    assert len(ids) == 1 and failures == []
+    assert point_id != ids[0]
+
+
+def test_search_on_a_missing_collection_clears_the_cache(qdrant):
+    qu.save_vector([0.1] * 4, {}, "searched")
+    assert "searched" in qu._COLLECTION_CACHE
+    qdrant.delete_collection("searched")
+    with pytest.raises(UnexpectedResponse):
+        qu.search_vector([0.1] * 4, "searched")
+    assert "searched" not in qu._COLLECTION_CACHE
+
+
+def test_save_vectors_uploads_through_the_client_and_waits(qdrant):
+    points = [{"vector": [0.1 * i, 1.0, 0.0, 0.0], "payload": {"n": i}} for i in range(5)]
+    points.append({"vector": [1.0, 2.0]})
+    ids, failures = qu.save_vectors(points, "bulk", chunk_size=2)
+    assert len(ids) == 5
+    assert [failure["index"] for failure in failures] == [5]
+    assert qdrant.uploads[-1] == {"batch_size": 2, "parallel": 1, "wait": True}
+    assert len(qu.search_vector([0.0, 1.0, 0.0, 0.0], "bulk", top_k=10)) == 5
+
+
+def test_upsert_batch_route(client, auth, qdrant):
+    items = [{"id": i + 1, "text": f"document {i}", "payload": {"n": i}} for i in range(3)] + [{"payload": {}}]
+    response = client.post("/vector/upsert_batch", json={"collection_name": "route", "items": items}, headers=auth)
+    assert response.json["saved"] == 3
+    assert [failure["index"] for failure in response.json["failures"]] == [3]
+    assert qdrant.uploads[-1]["wait"] is True
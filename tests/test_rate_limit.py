@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils.rate_limit import Limits, RateLimitError, RateLimiter, parse_overrides, release_process_slots
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    def build(**limits):
+        return RateLimiter(str(tmp_path / "limits.bin"), ["a", "b"], Limits(**limits))
+    return build
+
+
+def test_concurrency_cap_and_release(limiter):
+    rate_limiter = limiter(concurrency=1)
+    rate_limiter.acquire("a")
+    with pytest.raises(RateLimitError) as error:
+        rate_limiter.acquire("a")
+    assert error.value.status_code == 429
+    # Keys are limited separately
+    rate_limiter.acquire("b")
+    rate_limiter.release("a")
+    rate_limiter.acquire("a")
+
+
+
+def test_slots_of_a_dead_process_are_reclaimed(limiter, tmp_path):
+    rate_limiter = limiter(concurrency=1)
+    rate_limiter.acquire("a")  # maps the file before the other process uses it
+    rate_limiter.release("a")
+    # Another worker takes the key's only slot and is killed before releasing it
+    script = (
+        "from utils.rate_limit import Limits, RateLimiter; "
+        f"RateLimiter({str(tmp_path / 'limits.bin')!r}, ['a', 'b'], Limits(concurrency=1)).acquire('a')"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, timeout=30)
+    rate_limiter.acquire("a")
+    with pytest.raises(RateLimitError):
+        rate_limiter.acquire("a")
+
+
+def test_release_process_slots_from_the_master(limiter, tmp_path):
+    rate_limiter = limiter(concurrency=2)
+    rate_limiter.acquire("a")
+    rate_limiter.acquire("a")
+    rate_limiter.acquire("b")
+    # What Gunicorn's child_exit hook does for a worker that exited
+    release_process_slots(str(tmp_path / "limits.bin"), os.getpid())
+    rate_limiter.acquire("a")
+    rate_limiter.acquire("a")
+    with pytest.raises(RateLimitError):
+        rate_limiter.acquire("a")
+    # Releases after the reclaim do not free more than was taken
+    for _ in range(3):
+        rate_limiter.release("a")
+    rate_limiter.acquire("a")
+    rate_limiter.acquire("a")
+    with pytest.raises(RateLimitError):
+        rate_limiter.acquire("a")
+
+
+def test_request_bucket_runs_out(limiter):
+    rate_limiter = limiter(requests=2)
+    assert rate_limiter.acquire("a")["requests"][1] == 1
+    rate_limiter.acquire("a")
+    with pytest.raises(RateLimitError) as error:
+        rate_limiter.acquire("a")
+    assert error.value.retry_after >= 1
+    assert error.value.status["requests"][0] == 2
+
+
+def test_texts_and_tokens(limiter):
+    rate_limiter = limiter(texts=10, tokens=5)
+    rate_limiter.consume("a", "texts", 8)
+    with pytest.raises(RateLimitError):
+        rate_limiter.consume("a", "texts", 8)
+    # Tokens are charged afterwards and may overdraw the bucket, which then blocks new requests
+    rate_limiter.record("a", "tokens", 20)
+    with pytest.raises(RateLimitError):
+        rate_limiter.acquire("a")
+
+
+def test_unknown_keys_and_disabled_limits_are_not_limited(limiter):
+    assert limiter().acquire("a") == {}
+    assert limiter(requests=1).acquire("unknown") == {}
+
+
+def test_parse_overrides():
+    defaults = Limits(requests=10, texts=100)
+    overrides = parse_overrides('{"a": {"requests": 1}}', defaults)
+    assert overrides["a"].requests == 1
+    assert overrides["a"].texts == 100
+    with pytest.raises(ValueError):
+        parse_overrides("{", defaults)
@@ -0,0 +1,92 @@
+import time
+
+import numpy as np
+import pytest
+import requests
+
+from benchmarks.fakes import FAKE_MODELS, FakeRunPodServer, FakeTextEmbedding
+from utils.routing import SplitRouter
+from utils.runpod import CircuitBreaker, RemoteUnavailableError, RunPodClient
+
+
+@pytest.fixture
+def server():
+    server = FakeRunPodServer().start()
+    yield server
+    server.stop()
+
+
+def _response(status_code, body=b"{}"):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.url = "http://runpod.test/run"
+    return response
+
+
+def test_split_router_balances_local_and_remote_time():
+    router = SplitRouter(local_seconds_per_text=0.01, remote_overhead_seconds=0.5, remote_seconds_per_text=0.002)
+    # The round trip alone costs more than embedding everything locally
+    assert router.split(10) == 10
+    local = router.split(1000)
+    assert local * 0.01 == pytest.approx(0.5 + (1000 - local) * 0.002, abs=0.01)
+
+    # A slower local model shifts work to the remote side
+    for _ in range(20):
+        router.record_local(100, 5.0)
+    assert router.split(1000) < local
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_client_returns_embeddings_in_input_order(server):
+    client = RunPodClient(server.url, "key")
+    texts = ["alpha", "beta gamma"]
+    embeddings = client.embed(FAKE_MODELS[0], texts)
+    expected = list(FakeTextEmbedding(FAKE_MODELS[0]).embed(texts))
+    np.testing.assert_allclose(np.stack(embeddings), np.stack(expected), rtol=1e-5)
+    assert client.breaker.state == "closed"
+
+
+def test_client_errors_do_not_open_the_circuit(monkeypatch):
+    client = RunPodClient("http://runpod.test/run", "key", max_retries=2, breaker=CircuitBreaker(1, 60))
+    calls = []
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: calls.append(1) or _response(400))
+    for _ in range(3):
+        with pytest.raises(RemoteUnavailableError):
+            client.embed("model", ["x"])
+    # Not retried, and the endpoint is still considered healthy
+    assert len(calls) == 3
+    assert client.breaker.state == "closed"
+
+
+def test_server_errors_and_bad_bodies_are_retried_then_open_the_circuit(monkeypatch):
+    client = RunPodClient("http://runpod.test/run", "key", max_retries=1, backoff_seconds=0,
+                          breaker=CircuitBreaker(2, 60))
+    responses = iter([_response(503), _response(200, b'{"output": []}')] * 2)
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: next(responses))
+    for _ in range(2):
+        with pytest.raises(RemoteUnavailableError):
+            client.embed("model", ["x"])
+    assert client.breaker.state == "open"
+    assert not client.available()
+
+
+def test_client_gives_up_at_the_deadline(monkeypatch):
+    client = RunPodClient("http://runpod.test/run", "key")
+    monkeypatch.setattr(client.session, "post", lambda *args, **kwargs: pytest.fail("called after the deadline"))
+    with pytest.raises(RemoteUnavailableError):
+        client.embed("model", ["x"], deadline=time.monotonic() - 1)
@@ -0,0 +1,27 @@
+import io
+import json
+
+import pytest
+
+from utils.streaming import iter_json_array, iter_ndjson
+
+
+def test_json_array_one_byte_at_a_time():
+    items = ["plain", {"id": "x", "input": "with id"}, {"text": "ünïcødé ✓"}, "last"]
+    stream = io.BytesIO(json.dumps(items, ensure_ascii=False).encode("utf-8"))
+    assert list(iter_json_array(stream, chunk_size=1)) == [
+        (0, "plain"), ("x", "with id"), (2, "ünïcødé ✓"), (3, "last"),
+    ]
+
+
+def test_json_array_empty_and_invalid():
+    assert list(iter_json_array(io.BytesIO(b" [ ] "))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'{"input": "x"}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b"[1]")))
+
+
+def test_ndjson():
+    stream = io.BytesIO(b'"a"\n\n{"id": 7, "input": "b"}\n"c"')
+    assert list(iter_ndjson(stream, chunk_size=3)) == [(0, "a"), (7, "b"), (2, "c")]
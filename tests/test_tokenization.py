@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+
+import routes.embeddings as embeddings
+from utils.tokenization import TokenizerRegistry, load_tokenizer
+
+MODEL = "fake/minilm-384"
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """
+    A downloaded model directory holding only the tokenizer files fastembed reads.
+    """
+    vocab = {"[UNK]": 0, "[PAD]": 1, "[CLS]": 2, "[SEP]": 3, "hello": 4, "world": 5}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    tokenizer.save(str(tmp_path / "tokenizer.json"))
+    files = {
+        "config.json": {"pad_token_id": 1},
+        "tokenizer_config.json": {"model_max_length": 6, "pad_token": "[PAD]"},
+        "special_tokens_map.json": {"cls_token": "[CLS]", "sep_token": "[SEP]", "pad_token": "[PAD]"},
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(json.dumps(content))
+    return tmp_path
+
+
+def test_counts_include_special_tokens_and_are_truncated(model_dir):
+    registry = TokenizerRegistry()
+    assert registry.load(MODEL, str(model_dir))
+    counts = registry.count_tokens(["hello", "hello world", "hello " * 20], MODEL)
+    assert counts == [3, 4, 6]
+
+
+def test_missing_tokenizer_falls_back(tmp_path):
+    assert load_tokenizer(tmp_path) is None
+    registry = TokenizerRegistry()
+    assert not registry.load(MODEL, str(tmp_path))
+    assert registry.count_tokens(["hello world"], MODEL, fallback="gpt-4") == [2]
+    assert registry.count_tokens([], MODEL) == []
+
+
+def test_calculate_tokens_does_not_load_the_model(client, auth, model_dir, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"models": {MODEL: {"model_dir": str(model_dir), "model_file": "model.onnx"}}}))
+    monkeypatch.setattr(embeddings, "MODEL_MANIFEST", str(manifest))
+    monkeypatch.setattr(embeddings.TOKENIZERS, "_tokenizers", {})
+    monkeypatch.setattr(embeddings.TOKENIZERS, "_untruncated", {})
+    monkeypatch.setattr(embeddings.MODEL_POOL, "get", lambda *args: pytest.fail("the model was loaded"))
+
+    response = client.post("/v1/calculate-tokens", json={"input": ["hello", "hello world"], "model": MODEL},
+                           headers=auth)
+    assert response.status_code == 200
+    assert response.json["token_counts"] == [3, 4]
+    assert response.json["note"] == "Token count is exact"
@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Priority classes, lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "bulk": PRIORITY_BULK}
+
+
+def arrival_time(request_start=None, now=None):
+    """
+    time.monotonic() value of when a request arrived. `request_start` is an
+    X-Request-Start header set by a proxy ("t=<unix time>" in seconds, milliseconds or
+    microseconds), so time spent waiting for a free Gunicorn thread counts as well.
+    """
+    now = time.monotonic() if now is None else now
+    if not request_start:
+        return now
+    try:
+        started = float(request_start.strip().lstrip("t="))
+    except ValueError:
+        return now
+    while started > 1e11:  # milliseconds or microseconds since the epoch
+        started /= 1000.0
+    waited = time.time() - started
+    # Ignore clock skew that would put the arrival in the future or implausibly far back
+    return now - waited if 0 < waited < 3600 else now
+
+
+class AdmissionError(Exception):
+    """
+    Base class for rejected requests. `retry_after` is a hint in whole seconds.
+    """
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class QueueFullError(AdmissionError):
+    status_code = 429
+
+
+class DeadlineExceededError(AdmissionError):
+    status_code = 503
+
+
+class _Waiter:
+    __slots__ = ("granted", "cancelled", "cost")
+
+    def __init__(self, cost):
+        self.granted = False
+        self.cancelled = False
+        self.cost = cost
+
+
+class AdmissionController:
+    """
+    Bounded, priority-ordered admission in front of inference.
+
+    Running requests hold at most `max_concurrency` units between them; a request
+    costs one unit unless it asks for more (e.g. one per text when concurrent
+    requests share micro-batches). Others wait in a queue of at most
+    `max_queue_depth` requests, ordered by priority and arrival. Requests are
+    rejected right away when the queue is full and dropped when their deadline
+    passes before they get a slot.
+    """
+
+    def __init__(self, max_concurrency=4, max_queue_depth=64):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue_depth = max(0, int(max_queue_depth))
+        self._cond = threading.Condition()
+        self._active = 0  # admitted requests
+        self._used = 0  # units held by admitted requests
+        self._waiting = []  # heap of (priority, seq, waiter)
+        self._queued = 0
+        self._seq = itertools.count()
+        self._service_seconds = 0.05  # EWMA of time spent holding a slot
+        self._stats = {"admitted": 0, "rejected": 0, "expired": 0}
+
+    def retry_after(self):
+        """
+        Estimate how long until a new request would get a slot.
+        """
+        return (self._queued + 1) * self._service_seconds / max(1, self._active)
+
+    @property
+    def active(self):
+        """
+        Number of admitted requests that have not released their slot.
+        """
+        return self._active
+
+    def _cost(self, cost):
+        # A request larger than the whole capacity runs once it has the controller to itself
+        return min(max(1, int(cost)), self.max_concurrency)
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, deadline=None, block=False, cost=1):
+        """
+        Wait for an inference slot worth `cost` units. `deadline` is an absolute time.monotonic() value.
+        With `block=True` a full queue makes the caller wait instead of failing.
+        """
+        cost = self._cost(cost)
+        with self._cond:
+            if deadline is not None and time.monotonic() >= deadline:
+                self._stats["expired"] += 1
+                raise DeadlineExceededError("Request deadline passed before inference", self.retry_after())
+
+            if self._used + cost <= self.max_concurrency and not self._queued:
+                self._active += 1
+                self._used += cost
+                self._stats["admitted"] += 1
+                return
+
+            if self._queued >= self.max_queue_depth and not block:
+                self._stats["rejected"] += 1
+                raise QueueFullError("Inference queue is full", self.retry_after())
+
+            waiter = _Waiter(cost)
+            heapq.heappush(self._waiting, (priority, next(self._seq), waiter))
+            self._queued += 1
+            while not waiter.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    waiter.cancelled = True
+                    self._queued -= 1
+                    self._stats["expired"] += 1
+                    # A large request at the head may have held back smaller ones behind it
+                    self._grant()
+                    raise DeadlineExceededError("Request deadline passed while queued", self.retry_after())
+                self._cond.wait(remaining)
+            self._stats["admitted"] += 1
+
+    def _grant(self):
+        # Admit waiters in priority order while the head fits; later ones never overtake it
+        while self._waiting:
+            _, _, waiter = self._waiting[0]
+            if waiter.cancelled:
+                heapq.heappop(self._waiting)
+                continue
+            if self._used + waiter.cost > self.max_concurrency:
+                break
+            heapq.heappop(self._waiting)
+            waiter.granted = True
+            self._queued -= 1
+            self._active += 1
+            self._used += waiter.cost
+        self._cond.notify_all()
+
+    def release(self, held_seconds=None, cost=1):
+        with self._cond:
+            if held_seconds is not None:
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+            self._active -= 1
+            self._used -= self._cost(cost)
+            self._grant()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_INTERACTIVE, deadline=None, block=False, cost=1):
+        self.acquire(priority, deadline, block, cost)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started, cost)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "active": self._active,
+                "used": self._used,
+                "queued": self._queued,
+                "max_concurrency": self.max_concurrency,
+                "max_queue_depth": self.max_queue_depth,
+                "service_seconds": round(self._service_seconds, 4),
+            }
@@ -1,14 +1,78 @@
-from flask import request, jsonify
+from flask import Blueprint, Response, g, request, jsonify
 from functools import wraps
 import os
+import logging
 from dotenv import load_dotenv
+from utils.log import setup_logging
+from utils.rate_limit import Limits, RateLimiter, RateLimitError, parse_overrides
 
 # Load environment variables
 load_dotenv()
 
-# Load API keys from environment variable (comma-separated values)
-API_KEYS = [key.strip() for key in os.getenv("API_KEYS", "adk_default").split(",")]
-print("Loaded API_KEYS:", API_KEYS)
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Load API keys from environment variable (comma-separated values); a set for constant-time lookup
+API_KEYS = {key.strip() for key in os.getenv("API_KEYS", "adk_default").split(",") if key.strip()}
+logger.info(f"Loaded {len(API_KEYS)} API keys")
+
+# Per-key limits (per minute, 0 = unlimited), shared by all workers through RATE_LIMIT_FILE
+RATE_LIMIT_DEFAULTS = Limits(
+    requests=os.getenv("RATE_LIMIT_REQUESTS", 0),
+    texts=os.getenv("RATE_LIMIT_TEXTS", 0),
+    tokens=os.getenv("RATE_LIMIT_TOKENS", 0),
+    concurrency=os.getenv("RATE_LIMIT_CONCURRENCY", 0),
+)
+RATE_LIMITER = RateLimiter(
+    os.getenv("RATE_LIMIT_FILE", "/tmp/fastembed-ratelimit.bin"),
+    API_KEYS,
+    RATE_LIMIT_DEFAULTS,
+    parse_overrides(os.getenv("RATE_LIMIT_OVERRIDES"), RATE_LIMIT_DEFAULTS),
+    stale_seconds=int(os.getenv("REQUEST_TIMEOUT", 600)),
+)
+
+rate_limit_bp = Blueprint("rate_limit", __name__)
+
+def _remember(status):
+    # Keep the latest bucket status for the response headers
+    if status:
+        g.rate_limit = {**g.get("rate_limit", {}), **status}
+
+def rate_limit_response(error):
+    _remember(error.status)
+    logger.warning(f"Request throttled: {str(error)}")
+    return jsonify({"error": str(error)}), 429, {"Retry-After": str(error.retry_after)}
+
+def charge_texts(count, deadline=None):
+    """
+    Take `count` texts from the caller's bucket. Raises RateLimitError (an AdmissionError),
+    or waits until `deadline` (time.monotonic()) when one is given.
+    """
+    key = g.get("api_key")
+    if key is None:
+        return
+    try:
+        _remember(RATE_LIMITER.consume(key, "texts", count, deadline))
+    except RateLimitError as e:
+        _remember(e.status)
+        raise
+
+def record_tokens(count):
+    """
+    Charge the caller's token bucket once usage is known.
+    """
+    key = g.get("api_key")
+    if key is not None:
+        _remember(RATE_LIMITER.record(key, "tokens", count))
+
+@rate_limit_bp.after_app_request
+def add_rate_limit_headers(response):
+    for bucket, (limit, remaining, reset) in g.get("rate_limit", {}).items():
+        name = bucket.capitalize()
+        response.headers[f"X-RateLimit-Limit-{name}"] = str(limit)
+        response.headers[f"X-RateLimit-Remaining-{name}"] = str(remaining)
+        response.headers[f"X-RateLimit-Reset-{name}"] = f"{reset:.1f}s"
+    return response
 
 def authenticate(f):
     @wraps(f)
@@ -24,8 +88,23 @@ def authenticate(f):
 
         # Check if the token exists in the allowed API keys
         if token not in API_KEYS:
-            print(f"Unauthorized attempt with token: {token}")
+            logger.warning("Unauthorized attempt", extra={"token_prefix": token[:4]})
             return jsonify({"error": "Unauthorized"}), 401
 
-        return f(*args, **kwargs)
+        g.api_key = token
+        try:
+            _remember(RATE_LIMITER.acquire(token))
+        except RateLimitError as e:
+            return rate_limit_response(e)
+        try:
+            result = f(*args, **kwargs)
+        except BaseException:
+            RATE_LIMITER.release(token)
+            raise
+        if isinstance(result, Response) and result.is_streamed:
+            # A streamed body is produced after the view returns; hold the slot until the response closes
+            result.call_on_close(lambda: RATE_LIMITER.release(token))
+        else:
+            RATE_LIMITER.release(token)
+        return result
     return decorated_function
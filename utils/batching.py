@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from utils.metrics import INFERENCE_BATCH_SIZE
+from utils.tokenization import token_lengths
+
+logger = logging.getLogger(__name__)
+
+
+def plan_batches(lengths, max_batch_size, max_batch_tokens):
+    """
+    Group text positions into batches of similar length, shortest first. A batch holds at
+    most `max_batch_size` texts and at most `max_batch_tokens` tokens once padded to its
+    longest text, so short texts run in large batches and long ones in small batches.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches, current = [], []
+    for position in order:
+        # Sorted ascending, so this text sets the padded length of the current batch
+        padded = max(1, lengths[position]) * (len(current) + 1)
+        if current and (len(current) >= max_batch_size or padded > max_batch_tokens):
+            batches.append(current)
+            current = []
+        current.append(position)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_bucketed(model, texts, tokenizer, max_batch_size, max_batch_tokens, lengths=None):
+    """
+    Embed texts in length-bucketed batches to avoid computing padding tokens.
+    `lengths` are the texts' token counts if the caller already has them.
+    Returns the embeddings in the original order of `texts`.
+    """
+    texts = list(texts)
+    if lengths is None:
+        lengths = token_lengths(tokenizer, texts)
+    embeddings = [None] * len(texts)
+    for batch in plan_batches(lengths, max_batch_size, max_batch_tokens):
+        batch_texts = [texts[position] for position in batch]
+        for position, embedding in zip(batch, model.embed(batch_texts, batch_size=len(batch_texts))):
+            embeddings[position] = embedding
+    return embeddings
+
+
+def embed_texts_batched(model, texts, max_batch_size, tokenizer=None, max_batch_tokens=0, lengths=None):
+    """
+    Run model.embed, bucketing by token length when a tokenizer and token budget are given.
+    """
+    if tokenizer is not None and max_batch_tokens > 0 and len(texts) > 1:
+        return embed_bucketed(model, texts, tokenizer, max_batch_size, max_batch_tokens, lengths)
+    return list(model.embed(texts, batch_size=max_batch_size))
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests for one model into a single
+    `model.embed` call and hands every caller back only its own rows.
+
+    `callers` optionally returns how many callers may currently submit (e.g. requests
+    admitted to inference); once that many requests are queued no one else can join,
+    so the batch is sent without waiting out `max_wait_ms`.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait_ms=5.0, name="model", tokenizer=None, max_batch_tokens=0,
+                 callers=None):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.tokenizer = tokenizer
+        self.max_batch_tokens = int(max_batch_tokens)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.callers = callers
+
+        self._queue = deque()  # items: (texts, token lengths or None, future)
+        self._pending = 0  # number of texts waiting in the queue
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"batcher-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def embed(self, texts, timeout=None, lengths=None):
+        """
+        Queue texts for the next batch and block until their embeddings are ready.
+        `lengths` are the texts' token counts when already known (e.g. from usage counting).
+        Returns a list of numpy arrays in the same order as `texts`.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"Batcher for '{self.name}' is closed")
+            self._queue.append((texts, lengths, future))
+            self._pending += len(texts)
+            self._cond.notify()
+        return future.result(timeout)
+
+    def close(self):
+        """
+        Stop accepting new work. Already queued texts are still processed.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            # Give concurrent requests a short window to join this batch
+            deadline = time.monotonic() + self.max_wait
+            while self._pending < self.max_batch_size and not self._closed:
+                if self.callers is not None and len(self._queue) >= self.callers():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Take whole requests only; an oversized request is sent on its own
+            batch, size = [], 0
+            while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+                item = self._queue.popleft()
+                batch.append(item)
+                texts = item[0]
+                size += len(texts)
+            self._pending -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._process(batch)
+
+    def _process(self, batch):
+        texts = [text for item_texts, _, _ in batch for text in item_texts]
+        # Reuse the callers' token lengths when every request in the batch brought them
+        lengths = None
+        if all(item_lengths is not None for _, item_lengths, _ in batch):
+            lengths = [length for _, item_lengths, _ in batch for length in item_lengths]
+        INFERENCE_BATCH_SIZE.labels(model=self.name).observe(len(texts))
+        try:
+            embeddings = embed_texts_batched(
+                self.model, texts, self.max_batch_size, self.tokenizer, self.max_batch_tokens, lengths
+            )
+        except Exception as e:
+            logger.error(f"Batched inference failed for '{self.name}': {str(e)}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        logger.debug(f"Batched {len(texts)} texts from {len(batch)} requests for '{self.name}'")
+        offset = 0
+        for item_texts, _, future in batch:
+            future.set_result(embeddings[offset:offset + len(item_texts)])
+            offset += len(item_texts)
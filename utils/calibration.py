@@ -0,0 +1,198 @@
+"""
+Per-machine calibration of ONNX intra-op threads and batch size.
+
+`python -m utils.calibration` benchmarks every model in AVAILABLE_MODELS on this
+host and writes the fastest settings to CALIBRATION_PROFILE. The service applies
+the profile when it loads a model; profiles recorded with a different number of
+usable CPUs (affinity and container quota included) are ignored.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_OPTIONS = (16, 32, 64, 128, 256)
+SAMPLE_TEXTS = 256
+SAMPLE_WORDS = 32
+
+
+def _cgroup_cpu_limit():
+    """
+    CPU quota of this container in cores (cgroup v2 cpu.max or v1 CFS quota), or None.
+    """
+    candidates = (
+        ("/sys/fs/cgroup/cpu.max", None),
+        ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"),
+    )
+    for quota_path, period_path in candidates:
+        try:
+            with open(quota_path) as f:
+                values = f.read().split()
+            if period_path:
+                with open(period_path) as f:
+                    values.append(f.read().strip())
+        except OSError:
+            continue
+        if len(values) < 2 or values[0] in ("max", "-1"):
+            return None
+        try:
+            return max(1, math.ceil(int(values[0]) / int(values[1])))
+        except (ValueError, ZeroDivisionError):
+            return None
+    return None
+
+
+def available_cpus():
+    """
+    CPUs this process may actually use: its affinity mask, capped by the container's CPU quota.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+def thread_options(max_threads):
+    """
+    Powers of two up to `max_threads`, plus `max_threads` itself.
+    """
+    max_threads = max(1, int(max_threads))
+    options, threads = [], 1
+    while threads < max_threads:
+        options.append(threads)
+        threads *= 2
+    options.append(max_threads)
+    return options
+
+
+def default_max_threads():
+    """
+    Cores available to one model-owning process: split across Gunicorn workers,
+    or across inference servers when they hold the models.
+    """
+    if os.getenv("INFERENCE_SERVER_ENABLE", "False").lower() == "true":
+        processes = int(os.getenv("INFERENCE_SERVER_PROCESSES", 1))
+    else:
+        processes = int(os.getenv("GUNICORN_WORKERS", 2))
+    return max(1, available_cpus() // max(1, processes))
+
+
+def sample_texts(count=SAMPLE_TEXTS, words=SAMPLE_WORDS):
+    vocabulary = "the quick brown fox jumps over a lazy dog while embeddings are computed on cpu".split()
+    return [" ".join(vocabulary[(i + j) % len(vocabulary)] for j in range(words)) for i in range(count)]
+
+
+def calibrate_model(model_factory, max_threads, batch_sizes=BATCH_SIZE_OPTIONS, texts=None, repeat=2):
+    """
+    Measure throughput for every (threads, batch size) pair and return the best one.
+    `model_factory(threads)` must return a model with a fastembed-style `embed`.
+    """
+    texts = texts or sample_texts()
+    best = None
+    for threads in thread_options(max_threads):
+        model = model_factory(threads)
+        list(model.embed(texts[:8], batch_size=8))  # warm up the session
+        for batch_size in batch_sizes:
+            seconds = min(_time_embed(model, texts, batch_size) for _ in range(repeat))
+            throughput = len(texts) / seconds
+            logger.info(f"threads={threads} batch_size={batch_size}: {throughput:.1f} texts/s")
+            if best is None or throughput > best["texts_per_second"]:
+                best = {"threads": threads, "batch_size": batch_size, "texts_per_second": round(throughput, 1)}
+        del model
+    return best
+
+
+def _time_embed(model, texts, batch_size):
+    started = time.perf_counter()
+    list(model.embed(texts, batch_size=batch_size))
+    return time.perf_counter() - started
+
+
+def load_profile(path):
+    """
+    Return {model_name: {"threads", "batch_size", ...}} from a profile recorded on
+    hardware like this host, or {} when there is none.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable calibration profile {path}: {str(e)}")
+        return {}
+    if profile.get("host", {}).get("cpu_count") != available_cpus():
+        logger.warning(f"Ignoring calibration profile {path}: recorded on a host with a different CPU count")
+        return {}
+    return profile.get("models", {})
+
+
+def save_profile(path, models):
+    profile = {
+        "host": {"cpu_count": available_cpus(), "machine": platform.machine(), "node": platform.node()},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "models": models,
+    }
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def calibrate(model_names, model_path, profile_path, max_threads=None, batch_sizes=BATCH_SIZE_OPTIONS):
+    """
+    Calibrate every model and write the profile. Models that fail to load are skipped.
+    """
+    from fastembed import TextEmbedding
+
+    max_threads = max_threads or default_max_threads()
+    models = {}
+    for name in model_names:
+        logger.info(f"Calibrating '{name}' with up to {max_threads} threads...")
+        try:
+            models[name] = calibrate_model(
+                lambda threads: TextEmbedding(model_name=name, cache_dir=model_path, threads=threads),
+                max_threads,
+                batch_sizes,
+            )
+        except Exception as e:
+            logger.error(f"Calibration failed for '{name}': {str(e)}")
+            continue
+        logger.info(f"Best settings for '{name}': {models[name]}")
+    save_profile(profile_path, models)
+    return models
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from utils.log import setup_logging
+
+    load_dotenv()
+    setup_logging()
+
+    model_path = os.getenv("MODEL_PATH", "./models")
+    parser = argparse.ArgumentParser(description="Calibrate threads and batch size for this host")
+    parser.add_argument("--models", help="Comma-separated models (default: AVAILABLE_MODELS)")
+    parser.add_argument("--output", default=os.getenv("CALIBRATION_PROFILE") or os.path.join(model_path, "calibration.json"))
+    parser.add_argument("--max-threads", type=int, help="Largest thread count to try")
+    parser.add_argument("--batch-sizes", help="Comma-separated batch sizes to try")
+    args = parser.parse_args(argv)
+
+    models = (args.models or os.getenv("AVAILABLE_MODELS", "")).split(",")
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")] if args.batch_sizes else BATCH_SIZE_OPTIONS
+    results = calibrate([m for m in models if m], model_path, args.output, args.max_threads, batch_sizes)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+from tokenizers import Tokenizer
+
+POOLING_MODES = ("mean", "max", "weighted", "none")
+DEFAULT_OVERLAP = 32
+SPECIAL_TOKENS_RESERVE = 2  # room for [CLS]/[SEP] when a chunk is re-tokenized by the model
+
+
+def untruncated_copy(tokenizer):
+    """
+    Copy of a model tokenizer with truncation and padding disabled, for measuring long texts.
+    The model's own tokenizer is shared and must not be reconfigured.
+    """
+    copy = Tokenizer.from_str(tokenizer.to_str())
+    copy.no_truncation()
+    copy.no_padding()
+    return copy
+
+
+def model_max_tokens(tokenizer):
+    """
+    Largest chunk (in tokens, without special tokens) the model can embed without truncation.
+    """
+    truncation = tokenizer.truncation or {}
+    return max(1, truncation.get("max_length", 512) - SPECIAL_TOKENS_RESERVE)
+
+
+def parse_chunking(options, limit):
+    """
+    Validate the `chunking` request option against the model's token `limit`
+    (see model_max_tokens). Returns (max_tokens, overlap, pooling).
+    Raises ValueError for invalid values.
+    """
+    if options is True:
+        options = {}
+    if not isinstance(options, dict):
+        raise ValueError("chunking must be an object")
+
+    try:
+        max_tokens = int(options.get("max_tokens", limit))
+        overlap = int(options.get("overlap", min(DEFAULT_OVERLAP, max_tokens // 4)))
+    except (TypeError, ValueError):
+        raise ValueError("chunking.max_tokens and chunking.overlap must be integers")
+    pooling = options.get("pooling", "mean")
+
+    if not 1 <= max_tokens <= limit:
+        raise ValueError(f"chunking.max_tokens must be between 1 and {limit} for this model")
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("chunking.overlap must be at least 0 and smaller than max_tokens")
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"chunking.pooling must be one of {', '.join(POOLING_MODES)}")
+    return max_tokens, overlap, pooling
+
+
+def split_texts(tokenizer, texts, max_tokens, overlap):
+    """
+    Split each text into overlapping windows of at most `max_tokens` tokens.
+    `tokenizer` must not truncate (see untruncated_copy). Returns one list per text
+    of (start, end, token_count) character spans; short texts give a single span.
+    """
+    step = max_tokens - overlap
+    spans = []
+    for text, encoding in zip(texts, tokenizer.encode_batch(list(texts))):
+        offsets = [
+            offset for offset, special in zip(encoding.offsets, encoding.special_tokens_mask) if not special
+        ]
+        if len(offsets) <= max_tokens:
+            spans.append([(0, len(text), len(offsets))])
+            continue
+
+        windows = []
+        for first in range(0, len(offsets), step):
+            window = offsets[first:first + max_tokens]
+            windows.append((window[0][0], window[-1][1], len(window)))
+            if first + max_tokens >= len(offsets):
+                break
+        spans.append(windows)
+    return spans
+
+
+def pool_embeddings(vectors, weights, pooling):
+    """
+    Combine chunk embeddings into one L2-normalized vector.
+    `weighted` is a mean weighted by chunk token count.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if pooling == "max":
+        pooled = matrix.max(axis=0)
+    elif pooling == "weighted":
+        pooled = np.average(matrix, axis=0, weights=np.maximum(np.asarray(weights, dtype=np.float32), 1))
+    else:
+        pooled = matrix.mean(axis=0)
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm > 0 else pooled
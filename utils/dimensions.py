@@ -0,0 +1,157 @@
+"""
+Dimension reduction for the OpenAI-style `dimensions` parameter.
+
+Matryoshka models (MATRYOSHKA_MODELS) are truncated to the first N dimensions.
+Other models need a PCA projection fitted offline and stored in PROJECTIONS_DIR:
+
+    python -m utils.dimensions --model <name> --input corpus.txt --components 256
+
+Reduced vectors are L2-normalized again, so cosine and dot product scores stay comparable.
+"""
+import argparse
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def projection_filename(model_name):
+    return model_name.replace("/", "__") + ".npz"
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+class DimensionReducer:
+    """
+    Reduces batches of embeddings to a requested size with one matrix operation per batch.
+    """
+
+    def __init__(self, projections_dir, matryoshka_models=(), model_dimension=None):
+        self.projections_dir = projections_dir
+        self.matryoshka_models = {name for name in matryoshka_models if name}
+        # model_name -> native embedding size or None, used to validate Matryoshka truncation
+        self.model_dimension = model_dimension
+        self._projections = {}  # model_name -> (components, mean) or None
+        self._dimensions = {}  # model_name -> native size or None
+        self._lock = threading.Lock()
+
+    def _native_dimension(self, model_name):
+        if self.model_dimension is None:
+            return None
+        with self._lock:
+            if model_name in self._dimensions:
+                return self._dimensions[model_name]
+        dimension = self.model_dimension(model_name)
+        with self._lock:
+            self._dimensions[model_name] = dimension
+        return dimension
+
+    def _projection(self, model_name):
+        with self._lock:
+            if model_name in self._projections:
+                return self._projections[model_name]
+
+        path = os.path.join(self.projections_dir, projection_filename(model_name))
+        projection = None
+        if os.path.exists(path):
+            with np.load(path) as data:
+                projection = (data["components"].astype(np.float32), data["mean"].astype(np.float32))
+            logger.info(f"Loaded {projection[0].shape[0]}-component projection for '{model_name}'")
+
+        with self._lock:
+            self._projections[model_name] = projection
+        return projection
+
+    def check(self, model_name, dimensions):
+        """
+        Validate a requested `dimensions` value. Returns it as an int, or None when not requested.
+        Raises ValueError when the model cannot be reduced to that size.
+        """
+        if dimensions is None:
+            return None
+        if isinstance(dimensions, bool) or not isinstance(dimensions, int) or dimensions < 1:
+            raise ValueError("dimensions must be a positive integer")
+        if model_name in self.matryoshka_models:
+            native = self._native_dimension(model_name)
+            if native is not None and dimensions > native:
+                raise ValueError(f"dimensions must be at most {native} for model '{model_name}'")
+            return dimensions
+
+        projection = self._projection(model_name)
+        if projection is None:
+            raise ValueError(f"Model '{model_name}' does not support the dimensions parameter")
+        if dimensions > projection[0].shape[0]:
+            raise ValueError(f"dimensions must be at most {projection[0].shape[0]} for model '{model_name}'")
+        return dimensions
+
+    def reduce(self, model_name, embeddings, dimensions):
+        """
+        Reduce embeddings (a list of vectors) to `dimensions`. Returns a float32 matrix.
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            return matrix.reshape(0, dimensions)
+
+        if model_name in self.matryoshka_models:
+            if dimensions > matrix.shape[1]:
+                raise ValueError(f"dimensions must be at most {matrix.shape[1]} for model '{model_name}'")
+            return normalize_rows(matrix[:, :dimensions])
+
+        components, mean = self._projection(model_name)
+        return normalize_rows((matrix - mean) @ components[:dimensions].T)
+
+
+def fit_projection(embeddings, components):
+    """
+    Fit a PCA projection. Returns (components, mean, explained variance ratio),
+    with components ordered by explained variance.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float64)
+    mean = matrix.mean(axis=0)
+    _, singular_values, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+    variance = singular_values ** 2
+    components = min(components, vt.shape[0])
+    return vt[:components].astype(np.float32), mean.astype(np.float32), (variance / variance.sum())[:components]
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from fastembed import TextEmbedding
+    from utils.log import setup_logging
+
+    load_dotenv()
+    setup_logging()
+
+    model_path = os.getenv("MODEL_PATH", "./models")
+    parser = argparse.ArgumentParser(description="Fit a PCA projection for the dimensions parameter")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--input", required=True, help="Text file with one sample document per line")
+    parser.add_argument("--components", type=int, default=256, help="Largest dimensions value to support")
+    parser.add_argument("--output-dir", default=os.getenv("PROJECTIONS_DIR") or os.path.join(model_path, "projections"))
+    args = parser.parse_args(argv)
+
+    with open(args.input) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    if len(texts) < args.components:
+        parser.error(f"Need at least {args.components} sample documents, got {len(texts)}")
+
+    model = TextEmbedding(model_name=args.model, cache_dir=model_path)
+    components, mean, ratio = fit_projection(list(model.embed(texts)), args.components)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, projection_filename(args.model))
+    np.savez(path, components=components, mean=mean, explained_variance_ratio=ratio)
+    logger.info(f"Saved {components.shape[0]} components to {path}")
+    for size in (64, 128, 256, 512):
+        if size <= components.shape[0]:
+            logger.info(f"dimensions={size}: {ratio[:size].sum():.1%} of variance retained")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry bookkeeping cost (key string, OrderedDict node, array header)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def _row_dtype(dim):
+    # Key (first 16 bytes of the digest), CRC of key and vector, last use in unix seconds, vector
+    return np.dtype([("key", "<u8", (2,)), ("crc", "<u4"), ("stamp", "<u4"), ("vector", "<f4", (dim,))])
+
+
+def _row_crc(key, vector):
+    return zlib.crc32(np.ascontiguousarray(vector).tobytes(), zlib.crc32(key.tobytes()))
+
+
+class DiskSlab:
+    """
+    Fixed-size table of one model's embeddings in a memory-mapped file shared by every
+    process that maps it. Rows are grouped into buckets of WAYS by key hash, and a new
+    entry replaces the least recently used row of its bucket, so the file never grows.
+    Each row carries a CRC of its key and vector: a row that another process is
+    rewriting reads as a miss.
+    """
+
+    WAYS = 8
+
+    def __init__(self, path, dim, max_bytes):
+        self.path = path
+        self.dim = int(dim)
+        self.dtype = _row_dtype(self.dim)
+        bucket_bytes = self.dtype.itemsize * self.WAYS
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size == 0 or size % bucket_bytes:
+            self._create(max(1, int(max_bytes) // bucket_bytes) * bucket_bytes, replace=size > 0)
+        self.table = np.memmap(path, dtype=self.dtype, mode="r+")
+        self.buckets = len(self.table) // self.WAYS
+        self._lock = threading.Lock()
+
+    def _create(self, size, replace=False):
+        # Sized up front (sparse, so unused rows take no disk space) and moved into place in one step
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        try:
+            if replace:
+                os.replace(tmp_path, self.path)
+            else:
+                os.link(tmp_path, self.path)
+        except FileExistsError:
+            pass  # created by another worker
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @property
+    def nbytes(self):
+        return len(self.table) * self.dtype.itemsize
+
+    def _rows(self, digests):
+        keys = np.frombuffer(b"".join(digest[:16] for digest in digests), dtype="<u8").reshape(-1, 2)
+        buckets = np.array([int.from_bytes(digest[16:24], "little") % self.buckets for digest in digests])
+        return keys, buckets[:, None] * self.WAYS + np.arange(self.WAYS)
+
+    def get_many(self, digests):
+        """
+        Look up vectors by key digest. Returns a list aligned with `digests`, None for misses.
+        """
+        if not digests:
+            return []
+        keys, rows = self._rows(digests)
+        candidates = self.table[rows]  # one gather (a copy) for all lookups
+        matches = (candidates["key"] == keys[:, None, :]).all(axis=2)
+        now = int(time.time())
+        results = []
+        for i, match in enumerate(matches):
+            vector = None
+            for way in np.flatnonzero(match):
+                row = candidates[i, way]
+                if row["crc"] == _row_crc(keys[i], row["vector"]):
+                    vector = row["vector"]
+                    vector.flags.writeable = False
+                    self.table["stamp"][rows[i, way]] = now
+                    break
+            results.append(vector)
+        return results
+
+    def put_many(self, digests, vectors):
+        """
+        Store vectors by key digest. Returns the number of older entries replaced.
+        """
+        keys, rows = self._rows(digests)
+        now = int(time.time())
+        replaced = 0
+        with self._lock:
+            for key, bucket_rows, vector in zip(keys, rows, vectors):
+                bucket = self.table[bucket_rows[0]:bucket_rows[-1] + 1]
+                same = np.flatnonzero((bucket["key"] == key).all(axis=1))
+                row = bucket_rows[same[0] if len(same) else int(np.argmin(bucket["stamp"]))]
+                if not len(same) and self.table["stamp"][row]:
+                    replaced += 1
+                # Clear the key first so concurrent readers never match a half-written row
+                self.table["key"][row] = 0
+                self.table["vector"][row] = vector
+                self.table["crc"][row] = _row_crc(key, self.table["vector"][row])
+                self.table["stamp"][row] = now
+                self.table["key"][row] = key
+        return replaced
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, text hash).
+
+    The in-process tier is an LRU bounded by bytes. The optional disk tier keeps one
+    DiskSlab of `disk_max_bytes` per model under `disk_dir`: it survives restarts, is
+    shared by every worker pointing at the same directory, and looks up all of a
+    request's misses in one pass without opening a file per text.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.disk_max_bytes = int(disk_max_bytes)
+        self.disk_dir = (disk_dir or None) if self.disk_max_bytes > 0 else None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+        self._slabs = {}  # model name -> DiskSlab
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_name, text):
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_many(self, model_name, texts):
+        """
+        Look up embeddings for texts. Returns a list aligned with `texts`,
+        holding a numpy array for hits and None for misses.
+        """
+        keys = [self.make_key(model_name, text) for text in texts]
+        results = [self._get_memory(key) for key in keys]
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing and self.disk_dir:
+            found = self._get_disk(model_name, [keys[i] for i in missing])
+            for i, vector in zip(missing, found):
+                if vector is not None:
+                    results[i] = vector
+                    self._put_memory(keys[i], vector)
+            missing = [i for i in missing if results[i] is None]
+        with self._lock:
+            self._stats["misses"] += len(missing)
+        return results
+
+    def put_many(self, model_name, texts, vectors):
+        """
+        Store embeddings for texts in every enabled tier.
+        """
+        keys, stored = [], []
+        for text, vector in zip(texts, vectors):
+            key = self.make_key(model_name, text)
+            vector = np.array(vector, dtype=np.float32)
+            vector.flags.writeable = False
+            self._put_memory(key, vector)
+            keys.append(key)
+            stored.append(vector)
+        if self.disk_dir and keys:
+            self._put_disk(model_name, keys, stored)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_bytes": sum(slab.nbytes for slab in self._slabs.values()),
+                "disk_max_bytes": self.disk_max_bytes,
+            })
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # === Memory tier ===
+    def _get_memory(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return vector
+
+    def _put_memory(self, key, vector):
+        size = vector.nbytes + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = vector
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+                self._stats["evictions"] += 1
+
+    # === Disk tier ===
+    def _slab(self, model_name, dim=None):
+        """
+        The model's DiskSlab: one this process opened, one another worker created, or a
+        new one when `dim` is given. None if there is none yet.
+        """
+        with self._lock:
+            slab = self._slabs.get(model_name)
+        if slab is not None:
+            return slab
+        prefix = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:16]
+        if dim is None:
+            existing = [name for name in os.listdir(self.disk_dir) if name.startswith(prefix) and name.endswith(".slab")]
+            if not existing:
+                return None
+            dim = int(existing[0][len(prefix) + 1:-len(".slab")])
+        slab = DiskSlab(os.path.join(self.disk_dir, f"{prefix}-{dim}.slab"), dim, self.disk_max_bytes)
+        with self._lock:
+            return self._slabs.setdefault(model_name, slab)
+
+    def _get_disk(self, model_name, keys):
+        try:
+            slab = self._slab(model_name)
+            found = slab.get_many([bytes.fromhex(key) for key in keys]) if slab is not None else [None] * len(keys)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read the embedding cache of '{model_name}': {str(e)}")
+            return [None] * len(keys)
+        with self._lock:
+            self._stats["disk_hits"] += sum(vector is not None for vector in found)
+        return found
+
+    def _put_disk(self, model_name, keys, vectors):
+        try:
+            slab = self._slab(model_name, len(vectors[0]))
+            if slab.dim != len(vectors[0]):
+                return
+            replaced = slab.put_many([bytes.fromhex(key) for key in keys], vectors)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to write the embedding cache of '{model_name}': {str(e)}")
+            return
+        with self._lock:
+            self._stats["disk_evictions"] += replaced
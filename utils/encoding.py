@@ -0,0 +1,74 @@
+import base64
+import io
+
+import numpy as np
+
+# Response encodings for embeddings
+ENCODING_FORMATS = ("float", "base64", "npy", "raw")
+
+# Output precision -> little-endian numpy dtype
+PRECISIONS = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+# Accept header values that select a binary response
+BINARY_MIMETYPES = {
+    "application/x-npy": "npy",
+    "application/octet-stream": "raw",
+}
+
+
+def resolve_encoding(encoding_format, precision, accept_header=""):
+    """
+    Validate the requested encoding and precision.
+    Without an explicit `encoding_format`, a binary Accept header selects the format;
+    otherwise the default is `float`.
+    Returns (encoding_format, precision) or raises ValueError.
+    """
+    if not encoding_format:
+        encoding_format = "float"
+        for mimetype, binary_format in BINARY_MIMETYPES.items():
+            if mimetype in (accept_header or ""):
+                encoding_format = binary_format
+                break
+    precision = precision or "float32"
+
+    if encoding_format not in ENCODING_FORMATS:
+        raise ValueError(f"Invalid encoding_format '{encoding_format}'. Allowed: {list(ENCODING_FORMATS)}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Invalid precision '{precision}'. Allowed: {list(PRECISIONS)}")
+    return encoding_format, precision
+
+
+def to_matrix(embeddings, precision="float32"):
+    """
+    Stack embeddings into one contiguous little-endian matrix of the requested precision.
+    int8 assumes normalized vectors and maps [-1, 1] onto [-127, 127].
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        # An empty list means no vectors, not one empty vector
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+
+    if precision == "int8":
+        matrix = np.clip(np.rint(matrix * 127.0), -127, 127)
+    return np.ascontiguousarray(matrix, dtype=PRECISIONS[precision])
+
+
+def encode_base64_rows(matrix):
+    """
+    Encode every row of the matrix as a base64 string of its raw little-endian bytes.
+    """
+    return [base64.b64encode(row.tobytes()).decode("ascii") for row in matrix]
+
+
+def encode_npy(matrix):
+    buffer = io.BytesIO()
+    np.save(buffer, matrix, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def encode_raw(matrix):
+    return matrix.tobytes()
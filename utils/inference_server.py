@@ -0,0 +1,397 @@
+"""
+Shared inference server.
+
+One process (or a small fixed pool) owns the ONNX models and batches texts from
+all Gunicorn workers. Workers send texts over a Unix socket as length-prefixed
+JSON and read the vectors back from a shared memory buffer owned by the server,
+one buffer per connection, reused across requests.
+
+Run standalone with `python -m utils.inference_server [--index N]`; gunicorn.conf.py
+starts it automatically when INFERENCE_SERVER_ENABLE=true.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from queue import Empty, LifoQueue
+from types import SimpleNamespace
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!I")
+
+
+class InferenceServerError(Exception):
+    """
+    Raised when the inference server cannot be reached or rejects a request.
+    """
+
+
+def socket_paths(base_path, processes=1):
+    """
+    Socket path of every server in the pool.
+    """
+    if processes <= 1:
+        return [base_path]
+    return [f"{base_path}.{index}" for index in range(processes)]
+
+
+def send_message(sock, message):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Inference server connection closed")
+        chunks += chunk
+    return bytes(chunks)
+
+
+def recv_message(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def attach_shared_memory(name):
+    """
+    Attach to a buffer created by another process without taking ownership of it.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    # Only the creator may unlink; keep this process's resource tracker from doing it on exit
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+# === Server ===
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        buffer = None
+        try:
+            while True:
+                try:
+                    message = recv_message(self.request)
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    response, buffer = self.server.owner.dispatch(message, buffer)
+                except Exception as e:
+                    logger.error(f"Inference server request failed: {str(e)}")
+                    response = {"error": str(e)}
+                send_message(self.request, response)
+        finally:
+            if buffer is not None:
+                buffer.close()
+                buffer.unlink()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceServer:
+    """
+    Serves `info` and `embed` requests for the models in `pool` (a ModelPool),
+    batching concurrent requests for the same model with a MicroBatcher.
+    """
+
+    def __init__(self, pool, available_models, batch_max_size=64, batch_max_wait_ms=5.0, batch_sizes=None,
+                 batch_max_tokens=0):
+        self.pool = pool
+        self.available_models = set(available_models)
+        self.batch_max_size = batch_max_size
+        self.batch_sizes = batch_sizes or {}  # per-model overrides from calibration
+        self.batch_max_tokens = batch_max_tokens
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self._batchers = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _get_batcher(self, model_name, model):
+        from utils.batching import MicroBatcher
+        from utils.tokenization import get_model_tokenizer
+
+        with self._lock:
+            batcher = self._batchers.get(model_name)
+            if batcher is None or batcher.model is not model:
+                if batcher is not None:
+                    batcher.close()
+                batch_size = self.batch_sizes.get(model_name, self.batch_max_size)
+                batcher = MicroBatcher(
+                    model, batch_size, self.batch_max_wait_ms, name=model_name,
+                    tokenizer=get_model_tokenizer(model), max_batch_tokens=self.batch_max_tokens,
+                )
+                self._batchers[model_name] = batcher
+            return batcher
+
+    def release(self, model_name, model):
+        """
+        ModelPool eviction callback.
+        """
+        with self._lock:
+            batcher = self._batchers.pop(model_name, None)
+        if batcher is not None:
+            batcher.close()
+
+    def dispatch(self, message, buffer):
+        """
+        Handle one request. Returns the response and the (possibly replaced) connection buffer.
+        """
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True}, buffer
+        if op not in ("info", "embed"):
+            raise ValueError(f"Unknown operation '{op}'")
+        model_name = message["model"]
+        if model_name not in self.available_models:
+            raise ValueError(f"Model '{model_name}' is not available")
+        if op == "info":
+            model = self.pool.get(model_name)
+            model_dir = getattr(getattr(model, "model", None), "_model_dir", None)
+            return {"model_dir": str(model_dir) if model_dir else None}, buffer
+
+        texts = message["texts"]
+        if not texts:
+            return {"shm": None, "shape": [0, 0]}, buffer
+        # Leased so the model and its batcher are not evicted while the texts are queued
+        with self.pool.lease(model_name) as model:
+            embeddings = self._get_batcher(model_name, model).embed(texts)
+        matrix = np.ascontiguousarray(np.stack(embeddings), dtype=np.float32)
+
+        if buffer is None or buffer.size < matrix.nbytes:
+            size = max(matrix.nbytes, 2 * buffer.size if buffer is not None else 0)
+            if buffer is not None:
+                buffer.close()
+                buffer.unlink()
+            buffer = shared_memory.SharedMemory(create=True, size=size)
+        np.ndarray(matrix.shape, dtype=np.float32, buffer=buffer.buf)[:] = matrix
+        return {"shm": buffer.name, "shape": list(matrix.shape)}, buffer
+
+    def serve_forever(self, socket_path):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self._server = _UnixServer(socket_path, _RequestHandler)
+        self._server.owner = self
+        logger.info(f"Inference server listening on {socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+# === Client ===
+class _Connection:
+    def __init__(self, path, timeout):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.shm = None
+
+    def call(self, message):
+        send_message(self.sock, message)
+        return recv_message(self.sock)
+
+    def read_matrix(self, name, shape):
+        if self.shm is None or self.shm.name != name:
+            if self.shm is not None:
+                self.shm.close()
+            self.shm = attach_shared_memory(name)
+        # Copy out of the buffer before it is reused by the next request on this connection
+        return np.ndarray(shape, dtype=np.float32, buffer=self.shm.buf).copy()
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        self.sock.close()
+
+
+class InferenceClient:
+    """
+    Pooled connections to one or more inference servers, used round-robin.
+    """
+
+    def __init__(self, paths, timeout=600):
+        self.paths = list(paths)
+        self.timeout = timeout
+        self._idle = {path: LifoQueue() for path in self.paths}
+        self._next_path = itertools.cycle(self.paths)
+        self._lock = threading.Lock()
+
+    def _acquire(self, path):
+        try:
+            return self._idle[path].get_nowait()
+        except Empty:
+            return _Connection(path, self.timeout)
+
+    def _call(self, message, read=None, path=None, timeout=None):
+        if path is None:
+            with self._lock:
+                path = next(self._next_path)
+        # One retry on a fresh connection covers connections broken by a server restart
+        for attempt in range(2):
+            connection = None
+            try:
+                connection = self._acquire(path)
+                connection.sock.settimeout(timeout or self.timeout)
+                response = connection.call(message)
+                if "error" in response:
+                    self._idle[path].put(connection)
+                    raise InferenceServerError(response["error"])
+                result = read(connection, response) if read else response
+                self._idle[path].put(connection)
+                return result
+            except socket.timeout:
+                # Also raised by connect(), before there is a connection to close
+                if connection is not None:
+                    connection.close()
+                raise InferenceServerError(f"Inference server at {path} timed out")
+            except (ConnectionError, OSError) as e:
+                if connection is not None:
+                    connection.close()
+                if attempt == 1:
+                    raise InferenceServerError(f"Inference server at {path} is unavailable: {str(e)}")
+
+    def ping(self, timeout=2.0):
+        """
+        {socket path: error message or None} for every server in the pool.
+        """
+        errors = {}
+        for path in self.paths:
+            try:
+                ok = self._call({"op": "ping"}, path=path, timeout=timeout).get("ok")
+                errors[path] = None if ok else "unexpected ping response"
+            except InferenceServerError as e:
+                errors[path] = str(e)
+        return errors
+
+    def info(self, model_name):
+        return self._call({"op": "info", "model": model_name})
+
+    def embed(self, model_name, texts):
+        """
+        Embed texts on the server and return numpy arrays in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        def read(connection, response):
+            return list(connection.read_matrix(response["shm"], response["shape"]))
+
+        return self._call({"op": "embed", "model": model_name, "texts": texts}, read)
+
+
+def _load_tokenizer(model_dir):
+    if not model_dir:
+        return None
+    try:
+        from fastembed.common.preprocessor_utils import load_tokenizer
+        tokenizer, _ = load_tokenizer(Path(model_dir))
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer from {model_dir}: {str(e)}")
+        return None
+
+
+class RemoteModel:
+    """
+    Stand-in for a TextEmbedding whose inference runs in the inference server.
+    The tokenizer is loaded locally from the model directory for token counting.
+    """
+
+    def __init__(self, client, model_name):
+        self.client = client
+        self.model_name = model_name
+        info = client.info(model_name)  # makes the server load the model
+        self.model = SimpleNamespace(tokenizer=_load_tokenizer(info.get("model_dir")))
+
+    def embed(self, documents, batch_size=None, parallel=None, **kwargs):
+        if isinstance(documents, str):
+            documents = [documents]
+        return iter(self.client.embed(self.model_name, documents))
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from fastembed import TextEmbedding
+    from utils.calibration import load_profile
+    from utils.log import setup_logging
+    from utils.model_manifest import record_model, validate_models
+    from utils.model_pool import ModelPool
+
+    load_dotenv()
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="Shared inference server")
+    parser.add_argument("--index", type=int, default=0, help="Position of this server in the pool")
+    args = parser.parse_args(argv)
+
+    model_path = os.getenv("MODEL_PATH", "./models")
+    default_model = os.getenv("DEFAULT_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    available_models = os.getenv("AVAILABLE_MODELS", "").split(",")
+    paths = socket_paths(
+        os.getenv("INFERENCE_SERVER_SOCKET", "/tmp/fastembed-inference.sock"),
+        int(os.getenv("INFERENCE_SERVER_PROCESSES", 1)),
+    )
+
+    calibration = load_profile(os.getenv("CALIBRATION_PROFILE") or os.path.join(model_path, "calibration.json"))
+    manifest = os.getenv("MODEL_MANIFEST") or os.path.join(model_path, "manifest.json")
+    validate_models(available_models, manifest)
+    server = None
+
+    def release(name, model):
+        server.release(name, model)
+
+    def load(name):
+        model = TextEmbedding(model_name=name, cache_dir=model_path, threads=calibration.get(name, {}).get("threads"))
+        record_model(manifest, name, model)
+        return model
+
+    pool = ModelPool(
+        load,
+        max_models=int(os.getenv("MAX_CACHED_MODELS", 1)),
+        max_bytes=int(os.getenv("MODEL_POOL_MAX_BYTES", 0)),
+        pinned=[default_model],
+        on_evict=release,
+    )
+    server = InferenceServer(
+        pool,
+        available_models,
+        batch_max_size=int(os.getenv("BATCH_MAX_SIZE", 64)),
+        batch_max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", 5)),
+        batch_sizes={name: settings["batch_size"] for name, settings in calibration.items()},
+        batch_max_tokens=int(os.getenv("BATCH_MAX_TOKENS", 8192)),
+    )
+
+    # Load the default model before listening, so an open socket means the server is ready
+    pool.get(default_model)
+    signal.signal(signal.SIGTERM, lambda *_: server.shutdown())
+    server.serve_forever(paths[args.index])
+
+
+if __name__ == "__main__":
+    main()
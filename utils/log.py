@@ -0,0 +1,172 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from flask import Blueprint, g, has_request_context, request
+
+from utils.admission import arrival_time
+from utils.metrics import LOG_RECORDS_DROPPED
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json or text
+LOG_FILE = os.getenv("LOG_FILE", "")  # empty = stdout only; "{pid}" is replaced by the process id
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_REQUEST_SAMPLE_RATE = float(os.getenv("LOG_REQUEST_SAMPLE_RATE", 1.0))  # share of requests with INFO lines
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with timestamp, level, logger, message, request id and any `extra` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Tags records with the current request id and drops INFO/DEBUG lines from
+    requests that were not sampled. Warnings and errors always pass.
+    """
+
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        record.request_id = g.get("request_id")
+        return record.levelno >= logging.WARNING or g.get("log_sampled", True)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the background writer without ever blocking the request thread.
+    Records are dropped (and counted) when the queue is full.
+    """
+
+    def prepare(self, record):
+        # Merge args and render the traceback here, but leave formatting to the writer thread
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Plain one-line format; "-" stands in for the request id outside of requests.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(request_id)s %(message)s")
+
+    def format(self, record):
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+def _build_formatter():
+    if LOG_FORMAT == "text":
+        return TextFormatter()
+    return JsonFormatter()
+
+
+def setup_logging():
+    """
+    Route all logging through a bounded queue drained by a background thread that
+    writes to stdout and, when LOG_FILE is set, a rotating log file. Safe to call more than once.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        formatter = _build_formatter()
+        handlers = [logging.StreamHandler(sys.stdout)]
+        if LOG_FILE:
+            handlers.append(RotatingFileHandler(
+                LOG_FILE.format(pid=os.getpid()), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL)
+
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+# Assigns request ids, decides sampling and logs one access line per request
+request_logging_bp = Blueprint("request_logging", __name__)
+
+
+@request_logging_bp.before_app_request
+def _start_request():
+    g.request_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
+    g.log_sampled = LOG_REQUEST_SAMPLE_RATE >= 1 or random.random() < LOG_REQUEST_SAMPLE_RATE
+    g.log_started = time.monotonic()
+    # Request deadlines count from here (or from the proxy's X-Request-Start)
+    g.request_arrival = arrival_time(request.headers.get("X-Request-Start"), g.log_started)
+
+
+@request_logging_bp.after_app_request
+def _finish_request(response):
+    request_id = g.get("request_id")
+    if request_id:
+        response.headers["X-Request-Id"] = request_id
+    started = g.get("log_started")
+    if started is not None:
+        logging.getLogger("access").info("request completed", extra={
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.monotonic() - started) * 1000, 2),
+        })
+    return response
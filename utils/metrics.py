@@ -0,0 +1,94 @@
+import os
+import time
+
+from flask import Blueprint, Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+)
+
+# Latency buckets from sub-millisecond cache hits up to long bulk requests
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "fastembed_http_request_duration_seconds", "HTTP request latency by route",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_STAGE_SECONDS = Histogram(
+    "fastembed_embedding_stage_seconds", "Time spent per stage of the embeddings path",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "fastembed_inference_batch_size", "Number of texts per model.embed call",
+    ["model"], buckets=BATCH_SIZE_BUCKETS,
+)
+MODEL_EVENTS = Counter(
+    "fastembed_model_events_total", "Model pool load/evict events",
+    ["model", "event"],
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "fastembed_model_load_seconds", "Model load duration",
+    ["model"], buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+RUNPOD_REQUEST_SECONDS = Histogram(
+    "fastembed_runpod_request_duration_seconds", "RunPod forward latency per attempt",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+RUNPOD_ERRORS = Counter(
+    "fastembed_runpod_errors_total", "RunPod forward errors",
+    ["reason"],
+)
+QDRANT_REQUEST_SECONDS = Histogram(
+    "fastembed_qdrant_request_duration_seconds", "Qdrant call latency by operation",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    "fastembed_log_records_dropped_total", "Log records dropped because the log queue was full",
+)
+
+
+def observe_stage(stage):
+    """
+    Context manager timing one stage of the embeddings path (inference, token_count, serialization).
+    """
+    return EMBEDDING_STAGE_SECONDS.labels(stage=stage).time()
+
+
+def observe_qdrant(operation):
+    return QDRANT_REQUEST_SECONDS.labels(operation=operation).time()
+
+
+def collect_metrics():
+    """
+    Render metrics in the Prometheus text format. When PROMETHEUS_MULTIPROC_DIR is set
+    (see gunicorn.conf.py), values are aggregated across all Gunicorn workers.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    g.request_started = time.monotonic()
+
+
+@metrics_bp.after_app_request
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.labels(route=route, method=request.method, status=str(response.status_code)).observe(
+            time.monotonic() - started
+        )
+    return response
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(collect_metrics(), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,98 @@
+"""
+On-disk manifest of downloaded models (MODEL_MANIFEST, default $MODEL_PATH/manifest.json).
+
+Loading a model records its directory and ONNX file. At startup, AVAILABLE_MODELS are
+checked against fastembed's model registry and this manifest, so no model has to be
+instantiated just to validate the configuration.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_WRITE_LOCK = threading.Lock()
+
+
+def supported_models():
+    """
+    {model_name: description} from fastembed's registry (no download), or None when unavailable.
+    """
+    from fastembed import TextEmbedding
+
+    try:
+        return {entry["model"]: entry for entry in TextEmbedding.list_supported_models()}
+    except Exception as e:
+        logger.warning(f"Cannot read the fastembed model registry: {str(e)}")
+        return None
+
+
+def model_dimension(model_name):
+    """
+    Native embedding size of a model from fastembed's registry, or None when unknown.
+    """
+    return (supported_models() or {}).get(model_name, {}).get("dim")
+
+
+def load_manifest(path):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f).get("models", {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable model manifest {path}: {str(e)}")
+        return {}
+
+
+def record_model(path, model_name, model):
+    """
+    Add a loaded fastembed model to the manifest. Models without a local directory are skipped.
+    """
+    model_dir = getattr(getattr(model, "model", None), "_model_dir", None)
+    if not path or not model_dir:
+        return
+    registry = supported_models() or {}
+    entry = {
+        "model_dir": str(model_dir),
+        "model_file": registry.get(model_name, {}).get("model_file", "model_optimized.onnx"),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with _WRITE_LOCK:
+        models = load_manifest(path)
+        if models.get(model_name, {}).get("model_dir") == entry["model_dir"]:
+            return
+        models[model_name] = entry
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"models": models}, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def validate_models(available_models, manifest_path):
+    """
+    Check AVAILABLE_MODELS without loading them. Raises ValueError for a model fastembed
+    does not know. Returns {model_name: "cached" | "not_downloaded"}; models that are not
+    cached yet are downloaded on first use.
+    """
+    registry = supported_models()
+    manifest = load_manifest(manifest_path)
+    states = {}
+    for model_name in available_models:
+        if registry is not None and model_name not in registry:
+            logger.error(f"Model '{model_name}' is not supported by fastembed")
+            raise ValueError(f"Invalid model '{model_name}' in AVAILABLE_MODELS: not a supported fastembed model")
+
+        entry = manifest.get(model_name)
+        if entry and os.path.exists(os.path.join(entry["model_dir"], entry["model_file"])):
+            states[model_name] = "cached"
+        else:
+            states[model_name] = "not_downloaded"
+            logger.info(f"Model '{model_name}' is not downloaded yet; it will be fetched on first use")
+    logger.info(f"Validated {len(states)} models from the manifest")
+    return states
@@ -0,0 +1,230 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from utils.metrics import MODEL_EVENTS, MODEL_LOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes():
+    """
+    Resident set size of this process, or 0 where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def estimate_model_bytes(model):
+    """
+    Estimate the resident memory of a loaded fastembed model from its ONNX files.
+    Returns 0 when the model does not expose its directory.
+    """
+    inner = getattr(model, "model", None)
+    model_dir = getattr(inner, "_model_dir", None)
+    if not model_dir:
+        return 0
+
+    total = 0
+    for root, _, files in os.walk(model_dir):
+        for name in files:
+            if name.endswith((".onnx", ".onnx_data")):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+
+class ModelPool:
+    """
+    Thread-safe pool of loaded models.
+
+    Models are evicted in LRU order when the pool holds more than `max_models`
+    entries or more than `max_bytes` of estimated memory. Concurrent requests for
+    a model that is not loaded yet wait on a single load. Pinned models are never
+    evicted, and neither are models leased for an inference (see `lease`); the pool
+    may then stay over budget until the last lease is returned.
+    """
+
+    def __init__(self, loader, max_models=1, max_bytes=0, pinned=(), on_evict=None):
+        self.loader = loader
+        self.max_models = max(1, int(max_models))
+        self.max_bytes = int(max_bytes)
+        self.pinned = set(pinned)
+        self.on_evict = on_evict
+
+        self._models = OrderedDict()  # name -> model, least recently used first
+        self._stats = {}
+        self._loading = {}  # name -> Future shared by waiting threads
+        self._leases = {}  # name -> number of callers using the model
+        self._evict_on_release = set()  # leased models evict() was called for
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "load_failures": 0, "evictions": 0}
+
+    def get(self, name):
+        """
+        Return the loaded model, loading it once if needed.
+        """
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._touch(name)
+                return model
+
+            future = self._loading.get(name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[name] = future
+
+        if not owner:
+            logger.info(f"Waiting for model '{name}' being loaded by another request")
+            return future.result()
+
+        try:
+            model = self._load(name)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(name, None)
+                self._counters["load_failures"] += 1
+            MODEL_EVENTS.labels(model=name, event="load_failure").inc()
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._loading.pop(name, None)
+            self._models[name] = model
+            self._touch(name)
+            evicted = self._evict_over_budget(keep=name)
+        future.set_result(model)
+
+        for evicted_name, evicted_model in evicted:
+            self._notify_evicted(evicted_name, evicted_model)
+        return model
+
+    @contextmanager
+    def lease(self, name):
+        """
+        Yield the loaded model (loading it if needed) and keep it from being evicted
+        until the block exits.
+        """
+        while True:
+            model = self.get(name)
+            with self._lock:
+                # Evicted between get() and here: load it again
+                if self._models.get(name) is model:
+                    self._leases[name] = self._leases.get(name, 0) + 1
+                    break
+        try:
+            yield model
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+                evicted = []
+                if not self._leases[name]:
+                    del self._leases[name]
+                    if name in self._evict_on_release:
+                        self._evict_on_release.discard(name)
+                        evicted.append((name, self._models.pop(name)))
+                        self._counters["evictions"] += 1
+                    evicted += self._evict_over_budget(keep=None)
+            for evicted_name, evicted_model in evicted:
+                self._notify_evicted(evicted_name, evicted_model)
+
+    def _load(self, name):
+        logger.info(f"Loading new model: {name}")
+        rss_before = _rss_bytes()
+        started = time.monotonic()
+        model = self.loader(name)
+        load_seconds = time.monotonic() - started
+        MODEL_EVENTS.labels(model=name, event="load").inc()
+        MODEL_LOAD_SECONDS.labels(model=name).observe(load_seconds)
+
+        estimated = estimate_model_bytes(model) or max(0, _rss_bytes() - rss_before)
+        with self._lock:
+            self._counters["loads"] += 1
+            stats = self._stats.setdefault(name, {"loads": 0, "uses": 0})
+            stats.update({
+                "loads": stats["loads"] + 1,
+                "load_seconds": round(load_seconds, 3),
+                "loaded_at": time.time(),
+                "estimated_bytes": estimated,
+            })
+        logger.info(f"Loaded model '{name}' in {load_seconds:.2f}s (~{estimated / 1e6:.0f} MB)")
+        return model
+
+    def _touch(self, name):
+        self._models.move_to_end(name)
+        stats = self._stats.setdefault(name, {"loads": 0, "uses": 0})
+        stats["uses"] += 1
+        stats["last_used"] = time.time()
+
+    def _loaded_bytes(self):
+        return sum(self._stats.get(name, {}).get("estimated_bytes", 0) for name in self._models)
+
+    def _evict_over_budget(self, keep):
+        evicted = []
+        while len(self._models) > self.max_models or (
+            self.max_bytes and self._loaded_bytes() > self.max_bytes
+        ):
+            victim = next(
+                (name for name in self._models
+                 if name != keep and name not in self.pinned and name not in self._leases), None
+            )
+            if victim is None:
+                break
+            evicted.append((victim, self._models.pop(victim)))
+            self._counters["evictions"] += 1
+        return evicted
+
+    def _notify_evicted(self, name, model):
+        logger.warning(f"Evicted model from pool: {name}")
+        MODEL_EVENTS.labels(model=name, event="evict").inc()
+        if self.on_evict is not None:
+            try:
+                self.on_evict(name, model)
+            except Exception as e:
+                logger.error(f"Eviction callback failed for '{name}': {str(e)}")
+
+    def evict(self, name):
+        """
+        Drop a model from the pool, even if it is pinned. A leased model is dropped
+        when its last lease is returned.
+        """
+        with self._lock:
+            if name in self._leases:
+                self._evict_on_release.add(name)
+                return
+            model = self._models.pop(name, None)
+            if model is not None:
+                self._counters["evictions"] += 1
+        if model is not None:
+            self._notify_evicted(name, model)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "loaded_bytes": self._loaded_bytes(),
+                "loaded": list(self._models),
+                "loading": list(self._loading),
+                "leased": dict(self._leases),
+                "models": {
+                    name: {**stats, "loaded": name in self._models, "pinned": name in self.pinned}
+                    for name, stats in self._stats.items()
+                },
+            }
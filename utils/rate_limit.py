@@ -0,0 +1,320 @@
+"""
+Per-API-key rate limits shared by all Gunicorn workers.
+
+Every key has token buckets for requests, texts and tokens per minute, and a cap on
+concurrent requests. The counters live in a small memory-mapped file (RATE_LIMIT_FILE)
+locked with fcntl, so all worker processes enforce the same limits without an external service.
+Concurrency slots are recorded per owning process, so the slots of a worker that was
+killed mid-request are returned (see release_process_slots) instead of leaking.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.admission import AdmissionError
+
+BUCKETS = ("requests", "texts", "tokens")
+# Columns of a key's row: (level, last refill) per bucket, then in-flight requests and last activity
+_COLUMN = {"requests": 0, "texts": 2, "tokens": 4}
+_INFLIGHT = 6
+_ACTIVITY = 7
+_COLUMNS = 8
+# The file starts with an owner table: (key row, pid, in-flight requests) per process holding slots
+_OWNERS = 1024
+_OWNER_COLUMNS = 3
+
+
+class RateLimitError(AdmissionError):
+    """
+    `status` holds the bucket status (see RateLimiter) for the response headers.
+    """
+
+    status_code = 429
+
+    def __init__(self, message, retry_after=1, status=None):
+        super().__init__(message, retry_after)
+        self.status = status or {}
+
+
+class Limits:
+    """
+    Per-minute bucket sizes and the concurrency cap of one key. 0 disables a limit.
+    """
+
+    def __init__(self, requests=0, texts=0, tokens=0, concurrency=0):
+        self.requests = int(requests)
+        self.texts = int(texts)
+        self.tokens = int(tokens)
+        self.concurrency = int(concurrency)
+
+    @property
+    def enabled(self):
+        return bool(self.requests or self.texts or self.tokens or self.concurrency)
+
+
+def parse_overrides(value, defaults):
+    """
+    Parse per-key limits from JSON like {"<api key>": {"requests": 60, "texts": 5000}}.
+    Missing fields fall back to `defaults`.
+    """
+    if not value:
+        return {}
+    try:
+        overrides = json.loads(value)
+    except ValueError as e:
+        raise ValueError(f"RATE_LIMIT_OVERRIDES is not valid JSON: {str(e)}")
+    return {
+        key: Limits(**{
+            field: options.get(field, getattr(defaults, field))
+            for field in ("requests", "texts", "tokens", "concurrency")
+        })
+        for key, options in overrides.items()
+    }
+
+
+def _split(data):
+    """
+    Views of the owner table and the key rows of a mapped file.
+    """
+    owners = data[:_OWNERS * _OWNER_COLUMNS].reshape(_OWNERS, _OWNER_COLUMNS)
+    return owners, data[_OWNERS * _OWNER_COLUMNS:].reshape(-1, _COLUMNS)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _release_owners(owners, table, entries):
+    """
+    Give back the slots of the selected owner entries. Callers hold the file lock.
+    """
+    for entry in np.flatnonzero(entries & (owners[:, 2] > 0)):
+        key_row, _, count = owners[entry]
+        table[int(key_row), _INFLIGHT] = max(0, table[int(key_row), _INFLIGHT] - count)
+        owners[entry] = 0
+
+
+def release_process_slots(path, pid):
+    """
+    Return the concurrency slots still held by a process that exited, e.g. a worker
+    killed mid-request. Called from Gunicorn's child_exit hook in the master.
+    """
+    if not path or not os.path.exists(path):
+        return
+    fd = os.open(path, os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            floats = os.fstat(fd).st_size // 8
+            if floats <= _OWNERS * _OWNER_COLUMNS or (floats - _OWNERS * _OWNER_COLUMNS) % _COLUMNS:
+                return
+            owners, table = _split(np.memmap(path, dtype=np.float64, mode="r+", shape=(floats,)))
+            _release_owners(owners, table, owners[:, 1] == pid)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class RateLimiter:
+    def __init__(self, path, keys, defaults, overrides=None, stale_seconds=600):
+        self.path = path
+        self.rows = {key: row for row, key in enumerate(sorted(keys))}
+        self.defaults = defaults
+        self.overrides = overrides or {}
+        # Last resort for slots without an owner entry (owner table full): in-flight counts are
+        # reset after this long without activity. Slots of dead processes are reclaimed right away.
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._table = None
+        self._owners = None
+
+    def limits(self, key):
+        return self.overrides.get(key, self.defaults)
+
+    def _open(self):
+        # Opened per process: fcntl locks are not exclusive between forks sharing one descriptor
+        if self._pid == os.getpid():
+            return
+        size = (_OWNERS * _OWNER_COLUMNS + max(1, len(self.rows)) * _COLUMNS) * 8
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._owners, self._table = _split(np.memmap(self.path, dtype=np.float64, mode="r+", shape=(size // 8,)))
+        self._fd = fd
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _row(self, key):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._table[self.rows[key]]
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _take_slot(self, key_row):
+        # Callers hold the file lock
+        owners, pid = self._owners, os.getpid()
+        entries = np.flatnonzero((owners[:, 2] > 0) & (owners[:, 0] == key_row) & (owners[:, 1] == pid))
+        if not len(entries):
+            entries = np.flatnonzero(owners[:, 2] <= 0)
+            if not len(entries):
+                return  # table full: the slot is only covered by stale_seconds
+            owners[entries[0], 0], owners[entries[0], 1] = key_row, pid
+        owners[entries[0], 2] += 1
+
+    def _return_slot(self, key_row):
+        owners, pid = self._owners, os.getpid()
+        entries = np.flatnonzero((owners[:, 2] > 0) & (owners[:, 0] == key_row) & (owners[:, 1] == pid))
+        if len(entries):
+            owners[entries[0], 2] -= 1
+
+    def _reclaim_dead(self, key_row):
+        """
+        Give back the slots of `key_row` held by processes that no longer exist.
+        """
+        owners = self._owners
+        held = (owners[:, 2] > 0) & (owners[:, 0] == key_row)
+        dead = np.zeros(len(owners), dtype=bool)
+        for entry in np.flatnonzero(held):
+            dead[entry] = not _process_alive(int(owners[entry, 1]))
+        _release_owners(owners, self._table, dead)
+
+    @staticmethod
+    def _refill(row, bucket, capacity, now):
+        column = _COLUMN[bucket]
+        level, updated = row[column], row[column + 1]
+        level = capacity if updated == 0 else min(capacity, level + (now - updated) * capacity / 60)
+        row[column], row[column + 1] = level, now
+        return level
+
+    @staticmethod
+    def _wait_seconds(level, needed, capacity):
+        return (needed - level) * 60 / capacity
+
+    @staticmethod
+    def _status(limits, row, now):
+        """
+        {bucket: (limit, remaining, seconds until full)} for the enabled buckets.
+        """
+        status = {}
+        for bucket in BUCKETS:
+            capacity = getattr(limits, bucket)
+            if capacity:
+                level = min(capacity, row[_COLUMN[bucket]] + (now - row[_COLUMN[bucket] + 1]) * capacity / 60)
+                status[bucket] = (capacity, max(0, int(level)), (capacity - level) * 60 / capacity)
+        return status
+
+    def acquire(self, key):
+        """
+        Admit one request for `key`: takes a request token and a concurrency slot.
+        Returns the bucket status; raises RateLimitError when throttled.
+        """
+        limits = self.limits(key)
+        if not limits.enabled or key not in self.rows:
+            return {}
+        now = time.time()
+        with self._row(key) as row:
+            if limits.concurrency:
+                key_row = self.rows[key]
+                if now - row[_ACTIVITY] > self.stale_seconds:
+                    row[_INFLIGHT] = 0
+                    self._owners[self._owners[:, 0] == key_row] = 0
+                if row[_INFLIGHT] >= limits.concurrency:
+                    self._reclaim_dead(key_row)
+                if row[_INFLIGHT] >= limits.concurrency:
+                    raise RateLimitError(
+                        f"Too many concurrent requests for this API key (limit {limits.concurrency})",
+                        status=self._status(limits, row, now),
+                    )
+            if limits.requests:
+                level = self._refill(row, "requests", limits.requests, now)
+                if level < 1:
+                    raise RateLimitError(
+                        f"Request rate limit of {limits.requests}/min exceeded",
+                        self._wait_seconds(level, 1, limits.requests),
+                        self._status(limits, row, now),
+                    )
+            if limits.tokens:
+                # Tokens are charged after inference, so a request is admitted while the balance is positive
+                level = self._refill(row, "tokens", limits.tokens, now)
+                if level <= 0:
+                    raise RateLimitError(
+                        f"Token rate limit of {limits.tokens}/min exceeded",
+                        self._wait_seconds(level, 1, limits.tokens),
+                        self._status(limits, row, now),
+                    )
+            if limits.requests:
+                row[_COLUMN["requests"]] -= 1
+            if limits.concurrency:
+                row[_INFLIGHT] += 1
+                row[_ACTIVITY] = now
+                self._take_slot(self.rows[key])
+            return self._status(limits, row, now)
+
+    def release(self, key):
+        limits = self.limits(key)
+        if not limits.concurrency or key not in self.rows:
+            return
+        with self._row(key) as row:
+            row[_INFLIGHT] = max(0, row[_INFLIGHT] - 1)
+            row[_ACTIVITY] = time.time()
+            self._return_slot(self.rows[key])
+
+    def consume(self, key, bucket, amount, deadline=None):
+        """
+        Take `amount` from a bucket. Without a `deadline` (time.monotonic() value)
+        a short bucket raises RateLimitError; with one, waits for it to refill.
+        A request larger than the bucket is admitted once the bucket is full.
+        """
+        limits = self.limits(key)
+        capacity = getattr(limits, bucket)
+        if not capacity or key not in self.rows:
+            return {}
+        while True:
+            now = time.time()
+            with self._row(key) as row:
+                level = self._refill(row, bucket, capacity, now)
+                needed = min(amount, capacity)
+                if level >= needed:
+                    row[_COLUMN[bucket]] -= amount
+                    return self._status(limits, row, now)
+                wait = self._wait_seconds(level, needed, capacity)
+                status = self._status(limits, row, now)
+            if deadline is None or time.monotonic() + wait > deadline:
+                raise RateLimitError(f"Rate limit of {capacity} {bucket}/min exceeded", wait, status)
+            time.sleep(wait)
+
+    def record(self, key, bucket, amount):
+        """
+        Charge `amount` after the fact; the balance may go negative and throttle later requests.
+        """
+        limits = self.limits(key)
+        capacity = getattr(limits, bucket)
+        if not capacity or key not in self.rows:
+            return {}
+        now = time.time()
+        with self._row(key) as row:
+            self._refill(row, bucket, capacity, now)
+            row[_COLUMN[bucket]] -= amount
+            return self._status(limits, row, now)
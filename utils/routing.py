@@ -0,0 +1,64 @@
+import threading
+
+
+class SplitRouter:
+    """
+    Decides how many texts of a batch to embed locally and how many to send to
+    the remote endpoint so that both halves finish at about the same time.
+
+    Local cost is modelled as `n * local_seconds_per_text`; remote cost as
+    `remote_overhead_seconds + n * remote_seconds_per_text`. All three are
+    exponentially weighted moving averages updated from observed timings.
+    """
+
+    def __init__(self, local_seconds_per_text=0.01, remote_overhead_seconds=0.5,
+                 remote_seconds_per_text=0.002, smoothing=0.2):
+        self.local_seconds_per_text = float(local_seconds_per_text)
+        self.remote_overhead_seconds = float(remote_overhead_seconds)
+        self.remote_seconds_per_text = float(remote_seconds_per_text)
+        self.smoothing = float(smoothing)
+        self._lock = threading.Lock()
+
+    def split(self, count):
+        """
+        Return the number of texts (taken from the front) to embed locally.
+        """
+        with self._lock:
+            local = self.local_seconds_per_text
+            overhead = self.remote_overhead_seconds
+            remote = self.remote_seconds_per_text
+
+        # Remote round trip alone is slower than doing everything locally
+        if overhead >= count * local:
+            return count
+
+        # Solve local * k == overhead + remote * (count - k)
+        local_count = round((overhead + remote * count) / (local + remote))
+        return max(0, min(count, int(local_count)))
+
+    def record_local(self, count, seconds):
+        if count <= 0:
+            return
+        with self._lock:
+            self.local_seconds_per_text = self._ewma(self.local_seconds_per_text, seconds / count)
+
+    def record_remote(self, count, seconds):
+        if count <= 0:
+            return
+        with self._lock:
+            # Attribute the time to overhead and per-text cost in the current proportion
+            predicted = self.remote_overhead_seconds + self.remote_seconds_per_text * count
+            scale = seconds / predicted if predicted > 0 else 1.0
+            self.remote_overhead_seconds = self._ewma(self.remote_overhead_seconds, self.remote_overhead_seconds * scale)
+            self.remote_seconds_per_text = self._ewma(self.remote_seconds_per_text, self.remote_seconds_per_text * scale)
+
+    def _ewma(self, current, observed):
+        return (1 - self.smoothing) * current + self.smoothing * observed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "local_seconds_per_text": self.local_seconds_per_text,
+                "remote_overhead_seconds": self.remote_overhead_seconds,
+                "remote_seconds_per_text": self.remote_seconds_per_text,
+            }
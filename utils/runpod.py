@@ -0,0 +1,175 @@
+import base64
+import logging
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import RUNPOD_REQUEST_SECONDS, RUNPOD_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteUnavailableError(Exception):
+    """
+    Raised when the remote endpoint cannot serve a request (circuit open, deadline hit or bad response).
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and lets a single trial
+    request through once `reset_seconds` have passed.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("RunPod circuit breaker opened")
+                self._opened_at = time.monotonic()
+
+
+class RunPodClient:
+    """
+    Forwards embedding requests to RunPod using the `openai_route` payload format,
+    over a pooled keep-alive session with retries bounded by a deadline.
+    """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, url, api_key, timeout=600, max_retries=2, backoff_seconds=0.2,
+                 pool_size=8, breaker=None):
+        self.url = url
+        self.timeout = float(timeout)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_seconds = float(backoff_seconds)
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(pool_size)))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def available(self):
+        return self.breaker.allow()
+
+    def embed(self, model_name, texts, deadline=None):
+        """
+        Embed texts remotely and return numpy arrays in input order.
+        `deadline` is an absolute time.monotonic() value; defaults to now + timeout.
+        """
+        deadline = deadline or time.monotonic() + self.timeout
+        payload = {
+            "input": {
+                "openai_route": "/v1/embeddings",
+                "openai_input": {
+                    "input": texts,
+                    "model": model_name
+                }
+            }
+        }
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            started = time.monotonic()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=remaining)
+                if response.status_code in self.RETRY_STATUS_CODES:
+                    raise RemoteUnavailableError(f"RunPod returned HTTP {response.status_code}")
+                response.raise_for_status()
+                embeddings = self._parse_response(response.json(), len(texts))
+            except (requests.exceptions.RequestException, RemoteUnavailableError, ValueError,
+                    KeyError, IndexError, TypeError, AttributeError) as e:
+                # Malformed bodies count as failures too, so the circuit breaker always hears back
+                RUNPOD_REQUEST_SECONDS.labels(outcome="error").observe(time.monotonic() - started)
+                RUNPOD_ERRORS.labels(reason=type(e).__name__).inc()
+                last_error = e
+                logger.warning(f"RunPod attempt {attempt + 1} failed: {str(e)}")
+                is_client_error = isinstance(e, requests.exceptions.HTTPError) and e.response is not None \
+                    and e.response.status_code < 500
+                if is_client_error:
+                    # The endpoint answered; a rejected request (bad input, unknown model) says
+                    # nothing about its health and must not open the circuit for everyone
+                    self.breaker.record_success()
+                    raise RemoteUnavailableError(f"RunPod rejected the request: {str(e)}")
+                backoff = self.backoff_seconds * (2 ** attempt)
+                if attempt < self.max_retries and time.monotonic() + backoff < deadline:
+                    time.sleep(backoff)
+                continue
+
+            RUNPOD_REQUEST_SECONDS.labels(outcome="success").observe(time.monotonic() - started)
+            self.breaker.record_success()
+            return embeddings
+
+        self.breaker.record_failure()
+        raise RemoteUnavailableError(f"Failed to forward request to RunPod: {str(last_error or 'deadline exceeded')}")
+
+    @staticmethod
+    def _parse_response(runpod_response, expected):
+        # Periksa apakah 'output' ada dalam respons
+        if not isinstance(runpod_response, dict) or not isinstance(runpod_response.get("output"), list) \
+                or not runpod_response["output"] or not isinstance(runpod_response["output"][0], dict):
+            raise ValueError("Invalid RunPod response structure")
+
+        data = runpod_response["output"][0].get("data")
+        if not isinstance(data, list) or len(data) != expected:
+            raise ValueError("Invalid RunPod response structure")
+
+        embeddings = [None] * expected
+        for position, item in enumerate(data):
+            if not isinstance(item, dict) or "embedding" not in item:
+                raise ValueError("Invalid RunPod response structure")
+            index = item.get("index", position)
+            if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < expected \
+                    or embeddings[index] is not None:
+                raise ValueError(f"Invalid embedding index {index!r} in RunPod response")
+            vector = item["embedding"]
+            if isinstance(vector, str):
+                embeddings[index] = np.frombuffer(base64.b64decode(vector), dtype="<f4")
+            else:
+                embeddings[index] = np.asarray(vector, dtype=np.float32)
+        return embeddings
@@ -0,0 +1,106 @@
+import codecs
+import json
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _normalize_item(item, index):
+    """
+    Turn one input record into (id, text). Records are either plain strings or
+    objects with an "input" (or "text") field and an optional "id".
+    """
+    if isinstance(item, str):
+        return index, item
+    if isinstance(item, dict):
+        text = item.get("input", item.get("text"))
+        if isinstance(text, str):
+            return item.get("id", index), text
+    raise ValueError(f"Invalid record at index {index}: expected a string or an object with 'input'")
+
+
+def iter_ndjson(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield (id, text) from a newline-delimited JSON byte stream without reading it all.
+    """
+    buffer = b""
+    index = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if chunk:
+            buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop() if chunk else b""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            yield _normalize_item(json.loads(line), index)
+            index += 1
+        if not chunk:
+            return
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield (id, text) from a top-level JSON array byte stream, decoding one element at a time.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    index = 0
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == "]":
+            return
+
+        if started and position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                item = None
+            else:
+                # A number or literal ending at the buffer edge may still be incomplete
+                if end < len(buffer) or eof:
+                    yield _normalize_item(item, index)
+                    index += 1
+                    position = end
+                    continue
+
+        if eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            buffer = buffer[position:] + utf8.decode(b"", final=True)
+        else:
+            buffer = buffer[position:] + utf8.decode(chunk)
+        position = 0
+
+
+def iter_batches(items, batch_size):
+    """
+    Group an iterator into lists of at most batch_size elements.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,110 @@
+import logging
+import threading
+from pathlib import Path
+
+from utils.chunking import untruncated_copy
+from utils.utils import calculate_token_counts
+
+logger = logging.getLogger(__name__)
+
+
+def get_model_tokenizer(model):
+    """
+    Return the HuggingFace tokenizer loaded by a fastembed model, or None.
+    """
+    inner = getattr(model, "model", None)
+    return getattr(inner, "tokenizer", None)
+
+
+def load_tokenizer(model_dir):
+    """
+    Load only the tokenizer of a downloaded model, configured (truncation, padding)
+    the way fastembed configures it for inference. Returns None if it cannot be loaded.
+    """
+    from fastembed.common.preprocessor_utils import load_tokenizer as load_fastembed_tokenizer
+
+    try:
+        tokenizer, _ = load_fastembed_tokenizer(Path(model_dir))
+        return tokenizer
+    except (OSError, ValueError, KeyError, AssertionError) as e:
+        logger.warning(f"Failed to load the tokenizer in '{model_dir}': {str(e)}")
+        return None
+
+
+def token_lengths(tokenizer, texts):
+    """
+    Number of real (non-padding) tokens of each text, after truncation.
+    """
+    return [sum(encoding.attention_mask) for encoding in tokenizer.encode_batch(list(texts))]
+
+
+class TokenizerRegistry:
+    """
+    Keeps the tokenizers of loaded embedding models so usage can be counted with
+    the same tokenizer the model uses for inference, batched in Rust.
+    Models without a registered tokenizer fall back to tiktoken or a length estimate.
+    """
+
+    def __init__(self, num_threads=8):
+        self.num_threads = num_threads
+        self._tokenizers = {}
+        self._untruncated = {}  # model_name -> tokenizer copy without truncation, built on demand
+        self._lock = threading.Lock()
+
+    def register(self, model_name, model):
+        tokenizer = get_model_tokenizer(model)
+        if tokenizer is None:
+            return
+        with self._lock:
+            self._tokenizers[model_name] = tokenizer
+            self._untruncated.pop(model_name, None)
+
+    def load(self, model_name, model_dir):
+        """
+        Register the tokenizer of a model from its directory, without loading the model.
+        Returns whether the model now has a tokenizer.
+        """
+        tokenizer = load_tokenizer(model_dir)
+        if tokenizer is None:
+            return False
+        with self._lock:
+            self._tokenizers.setdefault(model_name, tokenizer)
+        return True
+
+    def unregister(self, model_name):
+        with self._lock:
+            self._tokenizers.pop(model_name, None)
+            self._untruncated.pop(model_name, None)
+
+    def get(self, model_name):
+        with self._lock:
+            return self._tokenizers.get(model_name)
+
+    def get_untruncated(self, model_name):
+        """
+        Tokenizer of the model with truncation and padding disabled, or None.
+        """
+        with self._lock:
+            tokenizer = self._untruncated.get(model_name)
+            if tokenizer is None and model_name in self._tokenizers:
+                tokenizer = self._untruncated[model_name] = untruncated_copy(self._tokenizers[model_name])
+            return tokenizer
+
+    def has_tokenizer(self, model_name):
+        return self.get(model_name) is not None
+
+    def count_tokens(self, texts, model_name, fallback="gpt-4"):
+        """
+        Count tokens for each text. Uses the model's own tokenizer when registered,
+        otherwise calculate_token_counts with `fallback` (or `model_name` if it is a GPT model).
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        tokenizer = self.get(model_name)
+        if tokenizer is not None:
+            return token_lengths(tokenizer, texts)
+
+        model = model_name if model_name.startswith("gpt-") else fallback
+        return calculate_token_counts(texts, model, num_threads=self.num_threads)
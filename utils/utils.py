@@ -1,5 +1,19 @@
+from functools import lru_cache
+
 import tiktoken
 
+# Asumsi rata-rata 4 karakter per token untuk model non-OpenAI
+AVG_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_tiktoken_encoding(model="gpt-4"):
+    """
+    Return the cached tiktoken encoding for an OpenAI model.
+    """
+    return tiktoken.encoding_for_model(model)
+
+
 def calculate_token_count(text, model="gpt-4"):
     """
     Calculate the number of tokens in a given text using the specified model.
@@ -8,16 +22,25 @@ def calculate_token_count(text, model="gpt-4"):
     :param model: The OpenAI model name (default is gpt-4).
     :return: The number of tokens.
     """
+    return calculate_token_counts([text], model)[0]
+
+
+def calculate_token_counts(texts, model="gpt-4", num_threads=8):
+    """
+    Calculate the number of tokens for each text in a batch.
+
+    :param texts: The texts to calculate tokens for.
+    :param model: The OpenAI model name (default is gpt-4).
+    :param num_threads: Threads used by tiktoken for batch encoding.
+    :return: A list of token counts, one per text.
+    """
     try:
         # Jika model adalah OpenAI model, gunakan tiktoken
         if model.startswith("gpt-"):
-            import tiktoken
-            encoding = tiktoken.encoding_for_model(model)
-            tokens = encoding.encode(text)
-            return len(tokens)
+            encoding = get_tiktoken_encoding(model)
+            return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts), num_threads=num_threads)]
 
         # Jika bukan OpenAI model, gunakan pendekatan sederhana
-        avg_chars_per_token = 4  # Asumsi rata-rata 4 karakter per token
-        return len(text) // avg_chars_per_token
+        return [len(text) // AVG_CHARS_PER_TOKEN for text in texts]
     except Exception as e:
         raise ValueError(f"Error calculating tokens: {e}")
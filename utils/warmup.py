@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "warmup"
+
+
+class ModelWarmup:
+    """
+    Loads models in a background thread and runs one dummy inference on each, so the
+    ONNX session is initialized before the first request. `get_model` should return
+    the shared instance (e.g. ModelPool.get), which requests then reuse.
+    Failed loads are retried with exponential backoff.
+    """
+
+    def __init__(self, get_model, model_names, max_backoff=60):
+        self.get_model = get_model
+        self.model_names = [name for name in model_names if name]
+        self.max_backoff = max_backoff
+        self._status = {name: {"state": "pending"} for name in self.model_names}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if not self.model_names:
+            return
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for name in self.model_names:
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    model = self.get_model(name)
+                    list(model.embed([WARMUP_TEXT]))
+                except Exception as e:
+                    attempt += 1
+                    delay = min(self.max_backoff, 2 ** attempt)
+                    logger.error(f"Warmup of model '{name}' failed, retrying in {delay}s: {str(e)}")
+                    self._set(name, {"state": "failed", "error": str(e), "attempts": attempt})
+                    time.sleep(delay)
+                    continue
+                seconds = round(time.monotonic() - started, 3)
+                self._set(name, {"state": "ready", "seconds": seconds})
+                logger.info(f"Model '{name}' is warm ({seconds}s)")
+                break
+
+    def _set(self, name, status):
+        with self._lock:
+            self._status[name] = status
+
+    def status(self):
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+    def ready(self):
+        with self._lock:
+            return all(status["state"] == "ready" for status in self._status.values())